@@ -7,6 +7,8 @@ from grader import grade_assignment
 import zipfile
 import io
 import mimetypes
+import hashlib
+import json
 
 # Set page config
 st.set_page_config(page_title="CS 101 Assignment Grader", page_icon="🎓", layout="wide")
@@ -52,6 +54,22 @@ def is_text_file(filename):
     text_extensions = {'.java', '.txt', '.csv', '.py', '.js', '.html', '.css', '.json', '.xml', '.md', '.log'}
     return any(filename.lower().endswith(ext) for ext in text_extensions)
 
+def score_gauge(score, max_points):
+    """Build the gauge chart showing a score out of max_points."""
+    fig = go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=score,
+        domain={'x': [0, 1], 'y': [0, 1]},
+        gauge={
+            'axis': {'range': [0, max_points], 'tickwidth': 1, 'tickcolor': "darkblue"},
+            'bar': {'color': "#4CAF50"},
+            'steps': [
+                {'range': [0, max_points*0.6], 'color': "lightgray"},
+                {'range': [max_points*0.6, max_points*0.8], 'color': "gray"}]
+        }))
+    fig.update_layout(height=200, margin=dict(l=20, r=20, t=30, b=20))
+    return fig
+
 def display_grading_result(result, max_points):
     # Main columns
     col1, col2, col3 = st.columns([1, 1, 1])
@@ -59,19 +77,7 @@ def display_grading_result(result, max_points):
     with col1:
         # Score
         st.subheader("Final Score")
-        fig = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=result['final_score'],
-            domain={'x': [0, 1], 'y': [0, 1]},
-            gauge={
-                'axis': {'range': [0, max_points], 'tickwidth': 1, 'tickcolor': "darkblue"},
-                'bar': {'color': "#4CAF50"},
-                'steps': [
-                    {'range': [0, max_points*0.6], 'color': "lightgray"},
-                    {'range': [max_points*0.6, max_points*0.8], 'color': "gray"}]
-            }))
-        fig.update_layout(height=200, margin=dict(l=20, r=20, t=30, b=20))
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(score_gauge(result['final_score'], max_points), use_container_width=True)
 
     with col2:
         # Overall Assessment
@@ -154,6 +160,33 @@ def display_grading_result(result, max_points):
         for suggestion in result["improvement_suggestions"]:
             st.success(suggestion)
 
+def display_scores(result, max_points):
+    """Show a scores-only result: the grade, deductions and which requirements were met."""
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.subheader("Final Score")
+        st.plotly_chart(score_gauge(result['final_score'], max_points), use_container_width=True)
+
+    with col2:
+        st.subheader("Point Deductions")
+        if result["point_deductions"]:
+            for d in result["point_deductions"]:
+                st.write(f"- {d['reason']} (-{d['points']} points)")
+        else:
+            st.success("No points deducted.")
+        if result["extra_credit"]["awarded"]:
+            st.success(f"+{result['extra_credit']['points']} points: {result['extra_credit']['reason']}")
+
+    st.header("📋 Requirements Assessment")
+    for req in result["requirements_assessment"]:
+        st.markdown(f"{'✅' if req['met'] else '❌'} **{req['requirement']}**")
+
+def inputs_key(files, guidelines, student_comment, max_points):
+    """Identify a grading request, so a saved grade is only shown for the inputs it belongs to."""
+    data = json.dumps([files, guidelines, student_comment, max_points])
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
 def main():
     st.title("🎓 CS 101 Assignment Grader")
     st.info("A comprehensive tool for grading Java assignments, providing detailed analysis, feedback, and scoring based on customizable requirements.")
@@ -175,6 +208,11 @@ def main():
     # Maximum points slider
     max_points = st.slider("Maximum Points", min_value=10, max_value=200, value=100, step=5)
 
+    scores_first = st.checkbox(
+        "Scores first (write detailed feedback on demand)",
+        help="Returns the grade much sooner; the written feedback is generated when you ask for it."
+    )
+
     if uploaded_file is not None and requirements_file is not None:
         assignment_guidelines = requirements_file.getvalue().decode("utf-8")
         files = []
@@ -200,11 +238,46 @@ def main():
         with st.expander("View Assignment Requirements"):
             st.text(assignment_guidelines)
 
+        key = inputs_key(files, assignment_guidelines, student_comment, max_points)
         if st.button("Grade Assignment"):
-            with st.spinner("Grading in progress..."):
-                grade_result = grade_assignment(files, assignment_guidelines, student_comment, max_points)
-                st.balloons()
-                display_grading_result(grade_result, max_points)
+            if scores_first:
+                with st.spinner("Scoring..."):
+                    st.session_state["graded"] = (key, grade_assignment(
+                        files, assignment_guidelines, student_comment, max_points, scores_only=True
+                    ))
+            else:
+                st.session_state.pop("graded", None)
+                # Fields stream in as the model writes them; show the score as soon as it is known
+                preview = st.empty()
+
+                def on_field(key, value):
+                    if key == "final_score":
+                        with preview.container():
+                            st.subheader("Final Score (feedback still being written...)")
+                            st.plotly_chart(score_gauge(value, max_points), use_container_width=True)
+
+                with st.spinner("Grading in progress..."):
+                    grade_result = grade_assignment(
+                        files, assignment_guidelines, student_comment, max_points, on_field=on_field
+                    )
+                    preview.empty()
+                    st.balloons()
+                    display_grading_result(grade_result, max_points)
+
+        # A scores-first grade stays on screen until its feedback is written
+        graded = st.session_state.get("graded")
+        if graded is not None and graded[0] == key:
+            result = graded[1]
+            if not result["feedback_pending"]:
+                display_grading_result(result, max_points)
+            else:
+                display_scores(result, max_points)
+                if st.button("Write detailed feedback"):
+                    with st.spinner("Writing feedback..."):
+                        st.session_state["graded"] = (key, grade_assignment(
+                            files, assignment_guidelines, student_comment, max_points, scores=result
+                        ))
+                    st.rerun()
 
 if __name__ == "__main__":
     main()
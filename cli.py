@@ -14,7 +14,18 @@ Main Features:
 
 2. Grade submissions with parallel processing
    - Support for both .zip and .java files
-   - Multi-threaded grading
+   - Multi-threaded grading, or an asyncio engine for large sections
+   - Persistent result cache so unchanged submissions are not regraded
+   - Optional run deadline; Ctrl-C or the deadline stops cleanly and keeps finished results
+   - Circuit breaker that pauses, probes, and stops the run if the API keeps failing
+   - Requests balanced across several API keys or endpoints (--endpoints, OPENAI_API_KEYS)
+   - Oversized submissions analyzed in chunks, then graded from the analyses
+   - Several small submissions graded in one request (--group-size)
+   - Guidelines compiled once into a numbered rubric (compile-rubric, --rubric)
+   - Scores first, written feedback after or on a later run (--feedback)
+   - Schema-enforced JSON responses on models that support structured outputs
+   - Logging done off the grading threads; one timing line per API call,
+     full payloads only at DEBUG or in a sampled --payload-log file
    - Detailed feedback in CSV format
    - Thread-safe operations
 
@@ -46,6 +57,7 @@ The grading process generates a CSV file with the following columns:
 6. Point Deductions
 7. Overall Assessment
 8. Areas for Improvement
+9. Status ("Graded", or "Failed: <reason>" for submissions that should be rerun)
 
 For more information on specific commands, use:
 python cli.py [command] --help
@@ -56,24 +68,41 @@ import sys
 import re
 import json
 import csv
+import asyncio
 import threading
+import time
 import zipfile
 import shutil
 from pathlib import Path
-from datetime import datetime
-from queue import Queue
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
 
 # Type hints
-from typing import Optional, List, Dict, Any, NamedTuple, Tuple
-from dataclasses import dataclass
+from typing import Optional, List, Dict, Any, Tuple
+from dataclasses import dataclass, replace
 
 # Third-party imports
 import typer
 from tqdm import tqdm  # Progress bar
-from openai import OpenAI  # OpenAI API client
 from dotenv import load_dotenv  # Environment variable management
 
+# Local imports
+from grader.batch import TERMINAL_STATES, read_batch_results, submit_batch, wait_for_batch, write_batch_file
+from grader.cache import GradeCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from grader.client import configure_client, configure_endpoints, endpoint_count, endpoint_summary, get_client, load_endpoints
+from grader.circuit import CircuitBreaker
+from grader.concurrency import AdaptiveConcurrency
+from grader.deadline import Deadline
+from grader.hedging import Hedger
+from grader.logs import configure_payload_log, enable_queue_logging, stop_queue_logging
+from grader.routing import Router, RoutingConfig
+from grader.packing import DEFAULT_GROUP_TOKENS, MAX_PROMPT_TOKENS, pack_groups
+from grader.prompt import PromptTemplate
+from grader.ratelimit import configure_rate_limit, create_completion
+from grader.retry import RetryBudget, RetryPolicy, call_with_retry
+from grader.rubric import DEFAULT_RUBRIC_DIR, Rubric, rubric_path
+from grader.schema import grading_schema, response_format
+
 # Logging setup
 import logging
 
@@ -81,24 +110,27 @@ import logging
 # Load environment variables
 load_dotenv()
 
-# Configure logging with thread information
+# Configure logging with thread information. Records are formatted and written
+# by a background thread so grading threads never wait on the stdout lock.
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(threadName)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
-    ]
+    ],
+    force=True
 )
+enable_queue_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds to let in-flight requests wind down after a deadline or Ctrl-C
+STOP_GRACE_PERIOD = 5.0
+
 app = typer.Typer(
     help="CS Assignment Grading CLI - Process and grade programming assignments with detailed feedback.",
     no_args_is_help=True
 )
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 
 @dataclass
 class SubmissionFile:
@@ -143,9 +175,12 @@ class GradingResult:
         extra_credit (Dict): Extra credit information
         overall_assessment (str): Overall evaluation
         improvement_suggestions (List[str]): Suggested improvements
+        failed (bool): True if the submission could not be graded
+        error (str): Why grading failed, if it did
+        feedback_pending (bool): True if only the grade has been written so far
     """
     student_name: str
-    final_score: int
+    final_score: Optional[int]
     max_points: int
     code_quality: str
     requirements_assessment: List[Dict[str, Any]]
@@ -153,6 +188,9 @@ class GradingResult:
     extra_credit: Dict[str, Any]
     overall_assessment: str
     improvement_suggestions: List[str]
+    failed: bool = False
+    error: str = ""
+    feedback_pending: bool = False
 
 
 @dataclass
@@ -173,6 +211,7 @@ class FormattedResult:
         point_deductions (str): Explanation of deductions
         overall_assessment (str): Overall evaluation
         areas_for_improvement (str): Improvement suggestions
+        status (str): "Graded", or "Failed: <reason>" for submissions to rerun
     """
     last_name: str
     first_name: str
@@ -183,6 +222,25 @@ class FormattedResult:
     point_deductions: str
     overall_assessment: str
     areas_for_improvement: str
+    status: str = "Graded"
+
+
+@dataclass
+class GradingRun:
+    """
+    Outcome of grading a set of submissions, possibly stopped early.
+    
+    Attributes:
+        results (List[FormattedResult]): Results for every submission that finished, in submission order
+        unfinished (List[Submission]): Submissions left ungraded because the run
+            was stopped by its deadline or Ctrl-C
+        interrupted (bool): Whether the run was stopped with Ctrl-C
+        abandoned (int): Requests still in flight when the grace period ran out
+    """
+    results: List[FormattedResult]
+    unfinished: List[Submission]
+    interrupted: bool = False
+    abandoned: int = 0
 
 
 class ThreadSafeWriter:
@@ -217,11 +275,19 @@ class SubmissionProcessor:
     
     This class is responsible for finding submissions in a directory,
     extracting student information, and processing both zip and Java files.
-    All file operations are thread-safe.
+    Files are read and decompressed on a pool of worker threads; each call
+    works only on its own file, so no lock is needed.
     """
     
-    def __init__(self):
-        self._file_lock = threading.Lock()
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Initialize the processor.
+        
+        Args:
+            workers (Optional[int]): Threads reading and decoding submissions; defaults to
+                the ThreadPoolExecutor default for the machine
+        """
+        self.workers = workers
     
     @staticmethod
     def extract_student_name(filename: str) -> str:
@@ -238,7 +304,7 @@ class SubmissionProcessor:
     
     def process_java_file(self, file_path: Path) -> List[SubmissionFile]:
         """
-        Process a single Java file with thread safety.
+        Process a single Java file.
         
         Args:
             file_path (Path): Path to the Java file
@@ -246,14 +312,13 @@ class SubmissionProcessor:
         Returns:
             List[SubmissionFile]: List containing the processed Java file
         """
-        with self._file_lock:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return [SubmissionFile(filename=file_path.name, content=content)]
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+        return [SubmissionFile(filename=file_path.name, content=content)]
     
     def process_zip_file(self, file_path: Path) -> List[SubmissionFile]:
         """
-        Process a zip file containing Java files with thread safety.
+        Process a zip file containing Java files.
         
         Args:
             file_path (Path): Path to the zip file
@@ -264,65 +329,84 @@ class SubmissionProcessor:
         files = []
         encodings = ['utf-8', 'latin1', 'cp1252', 'iso-8859-1']  # Common encodings to try
         
-        with self._file_lock:
-            with zipfile.ZipFile(file_path, 'r') as zip_ref:
-                for file_info in zip_ref.infolist():
-                    if file_info.filename.endswith('.java'):
-                        with zip_ref.open(file_info) as f:
-                            content = f.read()
-                            # Try different encodings
-                            for encoding in encodings:
-                                try:
-                                    decoded_content = content.decode(encoding)
-                                    files.append(SubmissionFile(
-                                        filename=file_info.filename,
-                                        content=decoded_content
-                                    ))
-                                    break  # Successfully decoded, move to next file
-                                except UnicodeDecodeError:
-                                    continue  # Try next encoding
-                            else:  # No encoding worked
-                                logger.warning(f"Could not decode {file_info.filename} with any supported encoding")
-                                # Use latin1 as a fallback - it can decode any byte string
-                                decoded_content = content.decode('latin1')
+        with zipfile.ZipFile(file_path, 'r') as zip_ref:
+            for file_info in zip_ref.infolist():
+                if file_info.filename.endswith('.java'):
+                    with zip_ref.open(file_info) as f:
+                        content = f.read()
+                        # Try different encodings
+                        for encoding in encodings:
+                            try:
+                                decoded_content = content.decode(encoding)
                                 files.append(SubmissionFile(
                                     filename=file_info.filename,
                                     content=decoded_content
                                 ))
+                                break  # Successfully decoded, move to next file
+                            except UnicodeDecodeError:
+                                continue  # Try next encoding
+                        else:  # No encoding worked
+                            logger.warning(f"Could not decode {file_info.filename} with any supported encoding")
+                            # Use latin1 as a fallback - it can decode any byte string
+                            decoded_content = content.decode('latin1')
+                            files.append(SubmissionFile(
+                                filename=file_info.filename,
+                                content=decoded_content
+                            ))
         return files
 
+    def load_submission(self, file_path: Path) -> Optional[Submission]:
+        """
+        Read one submission file.
+        
+        Args:
+            file_path (Path): Path to a .java or .zip submission
+            
+        Returns:
+            Optional[Submission]: The submission, or None if the file could not be read
+        """
+        try:
+            if file_path.suffix == '.zip':
+                files = self.process_zip_file(file_path)
+            else:
+                files = self.process_java_file(file_path)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {str(e)}")
+            return None
+        return Submission(
+            student_name=self.extract_student_name(file_path.name),
+            files=files,
+            original_path=file_path
+        )
+    
     def find_submissions(self, directory: Path) -> List[Submission]:
         """
         Find all valid submissions in directory.
         
+        Hidden files (e.g. macOS "._Student.zip" metadata) are ignored.
+        Entries are listed with one os.scandir pass and sorted by name, then
+        read and decompressed in parallel. Results keep the sorted order, and
+        a file that cannot be read is logged and skipped without affecting the
+        others.
+        
         Args:
             directory (Path): Directory to search for submissions
             
         Returns:
-            List[Submission]: List of found submissions
+            List[Submission]: List of found submissions, ordered by file name
         """
-        submissions = []
-        for file_path in directory.glob('*'):
-            if not (file_path.suffix in ['.java', '.zip']):
-                continue
-                
-            student_name = self.extract_student_name(file_path.name)
-            
-            try:
-                if file_path.suffix == '.zip':
-                    files = self.process_zip_file(file_path)
-                else:
-                    files = self.process_java_file(file_path)
-                
-                submissions.append(Submission(
-                    student_name=student_name,
-                    files=files,
-                    original_path=file_path
-                ))
-            except Exception as e:
-                logger.error(f"Error processing {file_path}: {str(e)}")
+        # Sorting plain names is much cheaper than sorting Path objects
+        with os.scandir(directory) as entries:
+            names = sorted(
+                entry.name for entry in entries
+                if entry.name.endswith(('.java', '.zip'))
+                and not entry.name.startswith('.')
+                and entry.is_file()
+            )
         
-        return submissions
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            loaded = list(executor.map(self.load_submission, (directory / name for name in names)))
+        return [submission for submission in loaded if submission is not None]
 
 
 class ResultFormatter:
@@ -370,7 +454,8 @@ class ResultFormatter:
             ))
         if unmet_reqs:
             result.append("Requirements not met:\n- " + "\n- ".join(
-                f"{req['requirement']}: {req['explanation']}" for req in unmet_reqs
+                f"{req['requirement']}: {req['explanation']}" if req['explanation'] else req['requirement']
+                for req in unmet_reqs
             ))
         return "\n\n".join(result)
     
@@ -388,6 +473,20 @@ class ResultFormatter:
         # Split student name into first and last
         last_name, first_name = cls.split_name(result.student_name)
         
+        if result.failed:
+            return FormattedResult(
+                last_name=last_name,
+                first_name=first_name,
+                final_score="FAILED",
+                extra_credit="",
+                code_quality="",
+                requirements_analysis="",
+                point_deductions="",
+                overall_assessment="Not graded - rerun this submission",
+                areas_for_improvement="",
+                status=f"Failed: {result.error}"
+            )
+        
         # Format point deductions
         deductions_text = "\n".join(
             f"- {d['reason']} (-{d['points']} points)" 
@@ -401,6 +500,19 @@ class ResultFormatter:
             else "No extra credit awarded"
         )
         
+        if result.feedback_pending:
+            return FormattedResult(
+                last_name=last_name,
+                first_name=first_name,
+                final_score=f"{result.final_score}/{result.max_points}",
+                extra_credit=extra_credit_text,
+                code_quality="",
+                requirements_analysis=cls.format_requirements(result.requirements_assessment),
+                point_deductions=deductions_text,
+                overall_assessment="Feedback not written yet - rerun without --feedback to write it",
+                areas_for_improvement=""
+            )
+        
         return FormattedResult(
             last_name=last_name,
             first_name=first_name,
@@ -446,7 +558,8 @@ class ResultWriter:
             'Requirements Analysis',
             'Point Deductions',
             'Overall Assessment',
-            'Areas for Improvement'
+            'Areas for Improvement',
+            'Status'
         ]
         
         rows = [
@@ -459,7 +572,8 @@ class ResultWriter:
                 'Requirements Analysis': r.requirements_analysis,
                 'Point Deductions': r.point_deductions,
                 'Overall Assessment': r.overall_assessment,
-                'Areas for Improvement': r.areas_for_improvement
+                'Areas for Improvement': r.areas_for_improvement,
+                'Status': r.status
             }
             for r in results
         ]
@@ -484,18 +598,177 @@ class Grader:
     with the grading module and error handling.
     """
     
-    def __init__(self, guidelines: str, max_points: int):
+    def __init__(
+        self,
+        guidelines: str,
+        max_points: int,
+        cache: Optional[GradeCache] = None,
+        limiter: Optional[AdaptiveConcurrency] = None,
+        retry: Optional[RetryPolicy] = None,
+        hedger: Optional[Hedger] = None,
+        stream: bool = False,
+        router: Optional[Router] = None,
+        deadline: Optional[Deadline] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        max_prompt_tokens: Optional[int] = None,
+        group_size: int = 1,
+        group_tokens: int = DEFAULT_GROUP_TOKENS,
+        rubric: Optional[Rubric] = None,
+        scores_only: bool = False
+    ):
         """
         Initialize grader with guidelines and maximum points.
         
         Args:
             guidelines (str): Assignment requirements/guidelines
             max_points (int): Maximum possible points
+            cache (Optional[GradeCache]): Persistent result cache, if enabled
+            limiter (Optional[AdaptiveConcurrency]): Adaptive limit on concurrent API calls
+            retry (Optional[RetryPolicy]): Retry policy for transient failures
+            hedger (Optional[Hedger]): Hedges calls that run past a latency percentile
+            stream (bool): Stream responses so output malformed beyond repair is retried early
+            router (Optional[Router]): Picks a fast or reasoning model per submission
+            deadline (Optional[Deadline]): Run deadline and per-request timeout
+            breaker (Optional[CircuitBreaker]): Pauses or stops grading while the API is down
+            max_prompt_tokens (Optional[int]): Prompt size above which a submission is graded in chunks
+            group_size (int): Most submissions graded in one request; 1 grades each on its own
+            group_tokens (int): Most tokens of student code in one grouped request
+            rubric (Optional[Rubric]): Compiled rubric to grade against instead of the guidelines
+            scores_only (bool): Ask only for the grade; the feedback is written by a later pass
         """
         self.guidelines = guidelines
         self.max_points = max_points
+        self.rubric = rubric
+        # The prompt's fixed part is assembled (and its tokens counted) once per run
+        self.template = PromptTemplate(guidelines, max_points, rubric)
+        self.cache = cache
+        self.limiter = limiter
+        self.retry = retry
+        self.hedger = hedger
+        self.stream = stream
+        self.router = router
+        self.deadline = deadline
+        self.breaker = breaker
+        self.max_prompt_tokens = max_prompt_tokens
+        self.group_size = group_size
+        self.group_tokens = group_tokens
+        self.group_requests = 0
+        self.grouped = 0
+        self.group_fallbacks = 0
+        self._group_lock = threading.Lock()
+        # Requirement assessments of every graded submission by path, tallied by rubric ID after the run
+        self.assessments: Dict[str, List[Dict[str, Any]]] = {}
+        self._assessments_lock = threading.Lock()
+        self.scores_only = scores_only
+        # Scores-only results awaiting feedback, by submission path
+        self.pending_feedback: Dict[str, Dict[str, Any]] = {}
+        self._feedback_lock = threading.Lock()
     
 
+    def _build_result(self, submission: Submission, result: Dict[str, Any]) -> GradingResult:
+        """
+        Convert a raw grading dictionary into a GradingResult.
+        
+        Args:
+            submission (Submission): Submission that was graded
+            result (Dict): Parsed response from the grading module
+            
+        Returns:
+            GradingResult: Grading result with feedback
+        """
+        key = str(submission.original_path)
+        if self.rubric is not None:
+            with self._assessments_lock:
+                self.assessments[key] = result['requirements_assessment']
+        with self._feedback_lock:
+            if result.get('feedback_pending'):
+                self.pending_feedback[key] = result
+            else:
+                self.pending_feedback.pop(key, None)
+        return GradingResult(
+            student_name=submission.student_name,
+            final_score=result['final_score'],
+            max_points=self.max_points,
+            code_quality=result['code_quality'],
+            requirements_assessment=result['requirements_assessment'],
+            point_deductions=result['point_deductions'],
+            extra_credit=result['extra_credit'],
+            overall_assessment=result['overall_assessment'],
+            improvement_suggestions=result['improvement_suggestions'],
+            feedback_pending=result.get('feedback_pending', False)
+        )
+    
+    def _failed_result(self, submission: Submission, error: Exception) -> GradingResult:
+        """
+        Build the result recorded when grading fails permanently.
+        
+        The result carries no score, so failed submissions stand out in the CSV
+        and can be regraded instead of being mistaken for a real zero.
+        
+        Args:
+            submission (Submission): Submission that could not be graded
+            error (Exception): The error raised while grading
+            
+        Returns:
+            GradingResult: Result marked as failed
+        """
+        logger.error(f"Error grading submission for {submission.student_name}: {str(error)}")
+        return GradingResult(
+            student_name=submission.student_name,
+            final_score=None,
+            max_points=self.max_points,
+            code_quality="",
+            requirements_assessment=[],
+            point_deductions=[],
+            extra_credit={'awarded': False, 'points': 0, 'reason': ''},
+            overall_assessment="",
+            improvement_suggestions=[],
+            failed=True,
+            error=str(error)
+        )
+
+    def _cache_key(self, submission: Submission) -> str:
+        """Compute the result cache key for a submission."""
+        from grader import MODEL, result_key
+        files = [(f.filename, f.content) for f in submission.files]
+        return result_key(files, self.guidelines, "", self.max_points, MODEL, self.rubric)
+    
+    def cached_result(self, submission: Submission) -> Optional[Dict[str, Any]]:
+        """
+        Look up a previously cached grading result for a submission.
+        
+        Args:
+            submission (Submission): Submission to look up
+            
+        Returns:
+            Optional[Dict]: Raw grading result, or None if not cached
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(submission))
+    
+    def result_from_content(self, submission: Submission, content: str) -> GradingResult:
+        """
+        Build a grading result from model output obtained outside `grade_submission`.
+        
+        Args:
+            submission (Submission): Submission the output belongs to
+            content (str): Message content returned by the model
+            
+        Returns:
+            GradingResult: Parsed result, or a failed result if it cannot be parsed
+        """
+        try:
+            from grader import parse_content
+            
+            result = parse_content(content, self.rubric)
+            graded = self._build_result(submission, result)
+            if self.cache is not None:
+                self.cache.put(self._cache_key(submission), result)
+            return graded
+        except Exception as e:
+            return self._failed_result(submission, e)
+
     def grade_submission(self, submission: Submission) -> GradingResult:
         """
         Grade a single submission.
@@ -511,40 +784,444 @@ class Grader:
             
             # Convert submission files to format expected by grader
             files = [(f.filename, f.content) for f in submission.files]
+            decision = self.router.route(files) if self.router else None
+            started = time.monotonic()
             
             # Grade the submission
             result = grade_assignment(
                 files=files,
                 guidelines=self.guidelines,
                 student_comment="",
-                max_points=self.max_points
+                max_points=self.max_points,
+                cache=self.cache,
+                limiter=self.limiter,
+                retry=self.retry,
+                hedger=self.hedger,
+                stream=self.stream,
+                model=decision.model if decision else None,
+                deadline=self.deadline,
+                breaker=self.breaker,
+                template=self.template,
+                max_prompt_tokens=self.max_prompt_tokens,
+                scores_only=self.scores_only,
+                scores=self.pending_feedback.get(str(submission.original_path))
             )
             
-            return GradingResult(
-                student_name=submission.student_name,
-                final_score=result['final_score'],
+            if decision:
+                self.router.record(decision, time.monotonic() - started)
+            return self._build_result(submission, result)
+            
+        except Exception as e:
+            return self._failed_result(submission, e)
+
+    async def grade_submission_async(self, submission: Submission) -> GradingResult:
+        """
+        Grade a single submission on the running event loop.
+        
+        Args:
+            submission (Submission): Submission to grade
+            
+        Returns:
+            GradingResult: Grading result with feedback
+        """
+        try:
+            from grader import grade_assignment_async
+            
+            files = [(f.filename, f.content) for f in submission.files]
+            decision = self.router.route(files) if self.router else None
+            started = time.monotonic()
+            
+            result = await grade_assignment_async(
+                files=files,
+                guidelines=self.guidelines,
+                student_comment="",
                 max_points=self.max_points,
-                code_quality=result['code_quality'],
-                requirements_assessment=result['requirements_assessment'],
-                point_deductions=result['point_deductions'],
-                extra_credit=result['extra_credit'],
-                overall_assessment=result['overall_assessment'],
-                improvement_suggestions=result['improvement_suggestions']
+                cache=self.cache,
+                limiter=self.limiter,
+                retry=self.retry,
+                hedger=self.hedger,
+                stream=self.stream,
+                model=decision.model if decision else None,
+                deadline=self.deadline,
+                breaker=self.breaker,
+                template=self.template,
+                max_prompt_tokens=self.max_prompt_tokens,
+                scores_only=self.scores_only,
+                scores=self.pending_feedback.get(str(submission.original_path))
             )
             
+            if decision:
+                self.router.record(decision, time.monotonic() - started)
+            return self._build_result(submission, result)
+            
         except Exception as e:
-            logger.error(f"Error grading submission for {submission.student_name}: {str(e)}")
-            return GradingResult(
-                student_name=submission.student_name,
-                final_score=0,
-                max_points=self.max_points,
-                code_quality="Error during grading",
-                requirements_assessment=[],
-                point_deductions=[],
-                extra_credit={'awarded': False, 'points': 0, 'reason': ''},
-                overall_assessment="Failed to grade submission",
-                improvement_suggestions=["Please resubmit or contact instructor"]
+            return self._failed_result(submission, e)
+
+
+    def plan_groups(self, submissions: List[Submission]) -> List[List[int]]:
+        """
+        Decide which submissions share a grading request.
+        
+        Args:
+            submissions (List[Submission]): Submissions to grade
+            
+        Returns:
+            List[List[int]]: Indices of the submissions in each request; each
+                submission gets its own unless grouping is enabled
+        """
+        if self.group_size <= 1:
+            return [[index] for index in range(len(submissions))]
+        from grader import MODEL
+        fixed = self.template.fixed_tokens(MODEL)
+        sizes = [
+            self.template.estimate_tokens([(f.filename, f.content) for f in s.files], "", MODEL) - fixed
+            for s in submissions
+        ]
+        return pack_groups(sizes, self.group_tokens, self.group_size)
+
+    def _record_group(self, graded: List[Optional[Dict[str, Any]]]) -> None:
+        """Count a grouped request and the submissions it left for individual grading."""
+        with self._group_lock:
+            self.group_requests += 1
+            self.grouped += len(graded)
+            self.group_fallbacks += sum(1 for result in graded if result is None)
+
+    def requirement_summary(self) -> str:
+        """Report how many graded students met each rubric requirement, one line per requirement."""
+        with self._assessments_lock:
+            tally = self.rubric.tally(self.assessments.values())
+        lines = [f"  {item.id}: {met}/{assessed} met - {item.description}" for item, met, assessed in tally]
+        return "Requirements met across the class:\n" + "\n".join(lines)
+
+    def group_summary(self) -> str:
+        """Return a one-line report of grouped grading."""
+        return (
+            f"Grouping: {self.grouped} submissions sent in {self.group_requests} shared requests; "
+            f"{self.group_fallbacks} left out of a response were graded on their own"
+        )
+
+    def grade_group(self, submissions: List[Submission]) -> List[GradingResult]:
+        """
+        Grade several small submissions in one request.
+        
+        Submissions the model leaves out of its response, or all of them if
+        the grouped request fails, are graded on their own.
+        
+        Args:
+            submissions (List[Submission]): Submissions sharing the request
+            
+        Returns:
+            List[GradingResult]: A result per submission, in order
+        """
+        if len(submissions) == 1:
+            return [self.grade_submission(submissions[0])]
+        from grader import grade_group
+        
+        try:
+            graded = grade_group(
+                [[(f.filename, f.content) for f in s.files] for s in submissions],
+                self.guidelines,
+                self.max_points,
+                cache=self.cache,
+                limiter=self.limiter,
+                retry=self.retry,
+                hedger=self.hedger,
+                deadline=self.deadline,
+                breaker=self.breaker,
+                template=self.template
             )
+        except Exception as e:
+            logger.warning(f"Grouped request for {len(submissions)} submissions failed ({e}); grading them one at a time")
+            graded = [None] * len(submissions)
+        self._record_group(graded)
+        return [
+            self._build_result(submission, result) if result is not None else self.grade_submission(submission)
+            for submission, result in zip(submissions, graded)
+        ]
+
+    async def grade_group_async(self, submissions: List[Submission]) -> List[GradingResult]:
+        """
+        Grade several small submissions in one request on the running event loop.
+        
+        Args:
+            submissions (List[Submission]): Submissions sharing the request
+            
+        Returns:
+            List[GradingResult]: A result per submission, in order
+        """
+        if len(submissions) == 1:
+            return [await self.grade_submission_async(submissions[0])]
+        from grader import grade_group_async
+        
+        try:
+            graded = await grade_group_async(
+                [[(f.filename, f.content) for f in s.files] for s in submissions],
+                self.guidelines,
+                self.max_points,
+                cache=self.cache,
+                limiter=self.limiter,
+                retry=self.retry,
+                hedger=self.hedger,
+                deadline=self.deadline,
+                breaker=self.breaker,
+                template=self.template
+            )
+        except Exception as e:
+            logger.warning(f"Grouped request for {len(submissions)} submissions failed ({e}); grading them one at a time")
+            graded = [None] * len(submissions)
+        self._record_group(graded)
+        
+        async def finish(submission: Submission, result: Optional[Dict[str, Any]]) -> GradingResult:
+            if result is not None:
+                return self._build_result(submission, result)
+            return await self.grade_submission_async(submission)
+        
+        return list(await asyncio.gather(*(finish(s, r) for s, r in zip(submissions, graded))))
+
+
+def submit_grading_batch(grader: Grader, submissions: List[Submission], batch_path: Path) -> Optional[str]:
+    """
+    Write every uncached submission to a Batch API input file and submit it.
+    
+    Args:
+        grader (Grader): Grader configured for the assignment
+        submissions (List[Submission]): Submissions to grade
+        batch_path (Path): Where to write the JSONL input file
+        
+    Returns:
+        Optional[str]: ID of the submitted batch, or None if every submission was cached
+    """
+    from grader import MODEL
+    client = get_client(balance=False)
+    
+    requests = []
+    for submission in submissions:
+        if grader.cached_result(submission) is not None:
+            continue
+        files = [(f.filename, f.content) for f in submission.files]
+        messages = grader.template.render(files)
+        requests.append((submission.original_path.name, messages))
+    
+    if not requests:
+        return None
+    
+    ids = (grader.rubric.ids, grader.rubric.deduction_ids) if grader.rubric is not None else (None, None)
+    write_batch_file(requests, MODEL, batch_path, response_format(MODEL, "grading_result", grading_schema(*ids)))
+    return submit_batch(client, batch_path, metadata={"max_points": str(grader.max_points)})
+
+
+def collect_grading_batch(
+    grader: Grader,
+    submissions: List[Submission],
+    batch_id: str,
+    wait: bool,
+    poll_interval: float
+) -> Optional[List[FormattedResult]]:
+    """
+    Fetch a batch's results and turn them into formatted results.
+    
+    Submissions served from the cache are included as-is, and newly collected
+    results are added to the cache so later runs reuse them.
+    
+    Args:
+        grader (Grader): Grader configured for the assignment
+        submissions (List[Submission]): Submissions that were batched
+        batch_id (str): ID printed by `grade --batch`
+        wait (bool): Poll until the batch finishes instead of checking once
+        poll_interval (float): Seconds between status checks when waiting
+        
+    Returns:
+        Optional[List[FormattedResult]]: Formatted results, or None if the batch
+            has not finished yet
+    """
+    client = get_client(balance=False)
+    
+    batch = wait_for_batch(client, batch_id, poll_interval, timeout=None if wait else 0)
+    if batch.status not in TERMINAL_STATES:
+        return None
+    
+    outputs = read_batch_results(client, batch)
+    results = []
+    for submission in submissions:
+        cached = grader.cached_result(submission)
+        output = outputs.get(submission.original_path.name)
+        if cached is not None:
+            result = grader._build_result(submission, cached)
+        elif output is None:
+            result = grader._failed_result(submission, RuntimeError(f"No result in batch {batch_id} ({batch.status})"))
+        elif isinstance(output, Exception):
+            result = grader._failed_result(submission, output)
+        else:
+            result = grader.result_from_content(submission, output)
+        results.append(ResultFormatter.format_result(result))
+    return results
+
+
+def grade_with_threads(
+    grader: Grader,
+    submissions: List[Submission],
+    threads: int,
+    progress_bar: tqdm
+) -> GradingRun:
+    """
+    Grade submissions on a pool of worker threads.
+    
+    When the grader's deadline passes or Ctrl-C is pressed, queued submissions
+    are dropped and in-flight requests are given `STOP_GRACE_PERIOD` seconds
+    to stop; their per-request timeouts are already bounded by the deadline.
+    
+    Args:
+        grader (Grader): Grader configured for the assignment
+        submissions (List[Submission]): Submissions to grade
+        threads (int): Number of worker threads
+        progress_bar (tqdm): Progress bar updated as submissions finish
+        
+    Returns:
+        GradingRun: Finished results and the submissions left unfinished
+    """
+    deadline = grader.deadline or Deadline()
+    finished: Dict[int, FormattedResult] = {}
+    results_lock = threading.Lock()
+    
+    def process_group(indices: List[int]):
+        """Process the submissions sharing one request, with progress tracking."""
+        if deadline.expired():
+            return
+        group = [submissions[index] for index in indices]
+        try:
+            for index, result in zip(indices, grader.grade_group(group)):
+                # A failure caused by stopping the run is unfinished work, not a result
+                if result.failed and deadline.expired():
+                    continue
+                formatted_result = ResultFormatter.format_result(result)
+                with results_lock:
+                    finished[index] = formatted_result
+        except Exception as e:
+            logger.error(f"Error processing {', '.join(s.student_name for s in group)}: {str(e)}")
+        finally:
+            with results_lock:
+                progress_bar.update(len(indices))
+    
+    executor = ThreadPoolExecutor(max_workers=threads)
+    futures = [executor.submit(process_group, indices) for indices in grader.plan_groups(submissions)]
+    
+    interrupted = False
+    try:
+        _, pending = wait(futures, timeout=deadline.remaining())
+    except KeyboardInterrupt:
+        interrupted = True
+        pending = [f for f in futures if not f.done()]
+    
+    abandoned = 0
+    if pending:
+        logger.warning("Interrupted; stopping grading" if interrupted else "Deadline reached; stopping grading")
+        deadline.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+        # Queued futures are now cancelled; wait only for the ones already running
+        try:
+            wait([f for f in futures if not f.done()], timeout=STOP_GRACE_PERIOD)
+        except KeyboardInterrupt:
+            interrupted = True
+        abandoned = sum(1 for f in futures if not f.done())
+    else:
+        executor.shutdown()
+    
+    with results_lock:
+        results = [finished[i] for i in sorted(finished)]
+        unfinished = [s for i, s in enumerate(submissions) if i not in finished]
+    return GradingRun(results, unfinished, interrupted, abandoned)
+
+
+async def grade_with_asyncio(
+    grader: Grader,
+    submissions: List[Submission],
+    concurrency: int,
+    progress_bar: tqdm
+) -> GradingRun:
+    """
+    Grade submissions concurrently on a single event loop.
+    
+    A semaphore bounds the number of requests in flight, so hundreds of
+    API calls can be outstanding without a thread per call. When the grader's
+    deadline passes or Ctrl-C is pressed, every remaining task is cancelled,
+    which aborts its HTTP request.
+    
+    Args:
+        grader (Grader): Grader configured for the assignment
+        submissions (List[Submission]): Submissions to grade
+        concurrency (int): Maximum number of requests in flight
+        progress_bar (tqdm): Progress bar updated as submissions finish
+        
+    Returns:
+        GradingRun: Finished results and the submissions left unfinished
+    """
+    deadline = grader.deadline or Deadline()
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def process_group(indices: List[int]) -> List[Optional[FormattedResult]]:
+        """Process the submissions sharing one request, with progress tracking."""
+        group = [submissions[index] for index in indices]
+        try:
+            async with semaphore:
+                results = await grader.grade_group_async(group)
+            return [
+                None if result.failed and deadline.expired() else ResultFormatter.format_result(result)
+                for result in results
+            ]
+        except Exception as e:
+            logger.error(f"Error processing {', '.join(s.student_name for s in group)}: {str(e)}")
+            return [None] * len(indices)
+        finally:
+            progress_bar.update(len(indices))
+    
+    groups = grader.plan_groups(submissions)
+    tasks = [asyncio.ensure_future(process_group(indices)) for indices in groups]
+    interrupted = False
+    try:
+        await asyncio.wait(tasks, timeout=deadline.remaining())
+    except asyncio.CancelledError:
+        # asyncio.run cancels the main task on Ctrl-C
+        interrupted = True
+    
+    pending = [t for t in tasks if not t.done()]
+    if pending:
+        logger.warning("Interrupted; stopping grading" if interrupted else "Deadline reached; stopping grading")
+        deadline.cancel()
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    
+    finished: Dict[int, FormattedResult] = {}
+    for indices, task in zip(groups, tasks):
+        if task.cancelled():
+            continue
+        for index, result in zip(indices, task.result()):
+            if result is not None:
+                finished[index] = result
+    
+    results, unfinished = [], []
+    for index, submission in enumerate(submissions):
+        if index in finished:
+            results.append(finished[index])
+        else:
+            unfinished.append(submission)
+    return GradingRun(results, unfinished, interrupted)
+
+
+def results_by_path(submissions: List[Submission], run: GradingRun) -> Dict[str, FormattedResult]:
+    """
+    Pair the results of a run with the submissions they belong to.
+    
+    Args:
+        submissions (List[Submission]): Submissions the run was given
+        run (GradingRun): Outcome of the run
+        
+    Returns:
+        Dict[str, FormattedResult]: Result of every finished submission, by its path
+    """
+    unfinished = {id(s) for s in run.unfinished}
+    finished = [s for s in submissions if id(s) not in unfinished]
+    return {str(s.original_path): result for s, result in zip(finished, run.results)}
 
 
 @app.command()
@@ -693,12 +1370,17 @@ def analyze_filename(filename: str) -> Tuple[str | None, str | None]:
     {{"first_name": "string", "last_name": "string"}}
     """
     
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
-        response_format={"type": "json_object"}
+    response = call_with_retry(
+        lambda: create_completion(
+            get_client(),
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            expected_output_tokens=50,
+            response_format={"type": "json_object"}
+        ),
+        RetryPolicy(max_attempts=3)
     )
     
     if response.choices and response.choices[0].message:
@@ -830,6 +1512,42 @@ def rename(
     typer.echo("\nRename operations completed!")
 
 
+def parse_deadline(value: str) -> float:
+    """
+    Convert a --deadline value into seconds from now.
+    
+    Accepts a duration ("900", "90s", "45m", "2h"), a clock time ("17:30",
+    tomorrow if that time has already passed today) or an ISO datetime
+    ("2024-12-01T17:30").
+    
+    Args:
+        value (str): Deadline as given on the command line
+        
+    Returns:
+        float: Seconds until the deadline
+        
+    Raises:
+        ValueError: If the value cannot be parsed
+    """
+    value = value.strip()
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smh]?)", value)
+    if match:
+        return float(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    
+    now = datetime.now()
+    try:
+        if re.fullmatch(r"\d{1,2}:\d{2}", value):
+            hour, minute = map(int, value.split(":"))
+            target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+            if target <= now:
+                target += timedelta(days=1)
+        else:
+            target = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid deadline '{value}'; use e.g. 45m, 2h, 17:30 or 2024-12-01T17:30")
+    return (target - now).total_seconds()
+
+
 @app.command()
 def grade(
     submissions_dir: str = typer.Argument(
@@ -852,10 +1570,228 @@ def grade(
         help="Number of threads to use for parallel grading",
         show_default=True
     ),
+    engine: str = typer.Option(
+        "threads",
+        help="Grading engine: 'threads' (one blocking request per thread) or 'async' (one event loop)",
+        show_default=True
+    ),
+    concurrency: int = typer.Option(
+        100,
+        help="Maximum number of requests in flight when using the async engine",
+        show_default=True
+    ),
+    adaptive: bool = typer.Option(
+        False,
+        "--adaptive",
+        help="Adjust concurrency automatically: grow while latency is healthy, back off on 429s and timeouts",
+        show_default=True
+    ),
+    min_concurrency: int = typer.Option(
+        1,
+        help="Lower bound on concurrent requests when --adaptive is set",
+        show_default=True
+    ),
+    max_concurrency: int = typer.Option(
+        64,
+        help="Upper bound on concurrent requests when --adaptive is set",
+        show_default=True
+    ),
+    batch: bool = typer.Option(
+        False,
+        "--batch",
+        help="Submit all submissions as one offline Batch API job instead of grading interactively",
+        show_default=True
+    ),
+    collect_batch: Optional[str] = typer.Option(
+        None,
+        help="Collect results of a batch submitted with --batch and write the CSV",
+        show_default=False
+    ),
+    wait: bool = typer.Option(
+        True,
+        "--wait/--no-wait",
+        help="With --collect-batch, poll until the batch finishes instead of checking once",
+        show_default=True
+    ),
+    poll_interval: float = typer.Option(
+        30.0,
+        help="Seconds between batch status checks",
+        show_default=True
+    ),
+    max_attempts: int = typer.Option(
+        4,
+        help="Attempts per submission (including the first) before it is marked as failed",
+        show_default=True
+    ),
+    retry_budget: Optional[int] = typer.Option(
+        None,
+        help="Total retries allowed across the run. Defaults to one per submission",
+        show_default=False
+    ),
+    stream: bool = typer.Option(
+        False,
+        "--stream",
+        help="Stream responses and parse them incrementally, retrying as soon as output turns out malformed beyond repair",
+        show_default=True
+    ),
+    route: bool = typer.Option(
+        False,
+        "--route",
+        help="Send simple submissions (small, parseable or close to the starter code) to a fast model",
+        show_default=True
+    ),
+    fast_model: str = typer.Option(
+        RoutingConfig.simple_model,
+        help="Model used for simple submissions when --route is set",
+        show_default=True
+    ),
+    simple_max_lines: int = typer.Option(
+        RoutingConfig.simple_max_lines,
+        help="Most non-blank lines a submission may have to count as simple",
+        show_default=True
+    ),
+    simple_max_files: int = typer.Option(
+        RoutingConfig.simple_max_files,
+        help="Most files a submission may have to count as simple",
+        show_default=True
+    ),
+    starter_code: Optional[str] = typer.Option(
+        None,
+        help="Path to the starter code handed out with the assignment",
+        show_default=False
+    ),
+    starter_similarity: float = typer.Option(
+        RoutingConfig.starter_similarity,
+        help="Similarity to the starter code (0-1) at or above which a submission counts as simple",
+        show_default=True
+    ),
+    base_url: Optional[str] = typer.Option(
+        None,
+        help="OpenAI-compatible API endpoint to use instead of OPENAI_BASE_URL / api.openai.com",
+        show_default=False
+    ),
+    endpoints: Optional[str] = typer.Option(
+        None,
+        help="JSON file listing API keys and base URLs to balance requests across (defaults to OPENAI_API_KEYS, comma-separated)",
+        show_default=False
+    ),
+    connect_timeout: float = typer.Option(
+        10.0,
+        help="Seconds allowed to connect to the API",
+        show_default=True
+    ),
+    read_timeout: float = typer.Option(
+        600.0,
+        help="Seconds allowed to wait for data from the API",
+        show_default=True
+    ),
+    breaker_threshold: int = typer.Option(
+        5,
+        help="Consecutive systemic API failures (quota, auth, outages) that pause grading; 0 disables the circuit breaker",
+        show_default=True
+    ),
+    breaker_cooldown: float = typer.Option(
+        30.0,
+        help="Seconds to pause before probing the API again after the circuit breaker trips",
+        show_default=True
+    ),
+    breaker_probes: int = typer.Option(
+        3,
+        help="Failed probes in a row after which the run is stopped",
+        show_default=True
+    ),
+    deadline: Optional[str] = typer.Option(
+        None,
+        help="Stop grading at this time (17:30, 2024-12-01T17:30) or after this long (45m, 2h); finished results are still written",
+        show_default=False
+    ),
+    request_timeout: Optional[float] = typer.Option(
+        None,
+        help="Seconds allowed for any single grading request before it is aborted and retried",
+        show_default=False
+    ),
+    max_prompt_tokens: int = typer.Option(
+        MAX_PROMPT_TOKENS,
+        help="Prompt tokens above which a submission is analyzed in chunks and graded from the analyses",
+        show_default=True
+    ),
+    group_size: int = typer.Option(
+        1,
+        help="Grade up to this many small submissions in one request (1 grades each on its own; not used with --batch)",
+        show_default=True
+    ),
+    group_tokens: int = typer.Option(
+        DEFAULT_GROUP_TOKENS,
+        help="Most tokens of student code in one request when --group-size is above 1",
+        show_default=True
+    ),
+    rubric: bool = typer.Option(
+        False,
+        "--rubric",
+        help="Grade against a numbered rubric compiled once from the guidelines (see compile-rubric)",
+        show_default=True
+    ),
+    rubric_dir: str = typer.Option(
+        str(DEFAULT_RUBRIC_DIR),
+        help="Directory where compiled rubrics are cached",
+        show_default=True
+    ),
+    feedback: str = typer.Option(
+        "full",
+        help="When to write the prose feedback: 'full' grades in one pass, 'background' writes a scores-only CSV "
+             "first and fills in feedback after, 'later' writes scores only (rerun with 'full' for the feedback)",
+        show_default=True
+    ),
+    hedge_percentile: Optional[float] = typer.Option(
+        None,
+        help="Send a duplicate request when a call runs past this percentile (e.g. 95) of recent latencies",
+        show_default=False
+    ),
+    max_hedge_ratio: float = typer.Option(
+        0.1,
+        help="Maximum share of requests that may be hedged",
+        show_default=True
+    ),
+    rpm: Optional[int] = typer.Option(
+        None,
+        help="Requests-per-minute limit per API key for the grading model (defaults to O1_PREVIEW_RPM or the built-in tier)",
+        show_default=False
+    ),
+    tpm: Optional[int] = typer.Option(
+        None,
+        help="Tokens-per-minute limit per API key for the grading model (defaults to O1_PREVIEW_TPM or the built-in tier)",
+        show_default=False
+    ),
     output: Optional[str] = typer.Option(
         None,
         help="Output CSV file path. If not provided, saves as grading_results.csv in the submissions directory",
         show_default=False
+    ),
+    payload_log: Optional[str] = typer.Option(
+        None,
+        help="File to write full API responses and parsed results to (they are only logged at DEBUG otherwise)",
+        show_default=False
+    ),
+    payload_sample_rate: float = typer.Option(
+        1.0,
+        help="Share of payloads (0-1) written to --payload-log",
+        show_default=True
+    ),
+    use_cache: bool = typer.Option(
+        True,
+        "--cache/--no-cache",
+        help="Reuse results for submissions that have not changed since a previous run",
+        show_default=True
+    ),
+    cache_path: str = typer.Option(
+        str(DEFAULT_CACHE_PATH),
+        help="Path to the SQLite result cache",
+        show_default=True
+    ),
+    cache_size: int = typer.Option(
+        DEFAULT_MAX_ENTRIES,
+        help="Maximum number of cached results before least recently used entries are evicted",
+        show_default=True
     )
 ):
     """
@@ -868,6 +1804,22 @@ def grade(
     Example:
         # Grade submissions with 4 threads and 150 maximum points
         python cli.py grade submissions requirements.txt --threads 4 --max-points 150
+        
+        # Grade a large section on one event loop with up to 200 requests in flight
+        python cli.py grade submissions requirements.txt --engine async --concurrency 200
+        
+        # Stop at 17:30 and write whatever has been graded by then
+        python cli.py grade submissions requirements.txt --threads 8 --deadline 17:30 --request-timeout 300
+        
+        # Let concurrency find the rate limit on its own, between 2 and 48 requests
+        python cli.py grade submissions requirements.txt --adaptive --min-concurrency 2 --max-concurrency 48
+        
+        # Write the scores in a quick first pass, then fill in the written feedback
+        python cli.py grade submissions requirements.txt --feedback background
+        
+        # Grade offline with the Batch API, then collect the results later
+        python cli.py grade submissions requirements.txt --batch
+        python cli.py grade submissions requirements.txt --collect-batch batch_abc123
     
     The command will:
     1. Find all Java submissions in the directory
@@ -880,7 +1832,9 @@ def grade(
        - Areas for improvement
     4. Save results to a CSV file
     
-    The grading process is thread-safe and shows real-time progress.
+    The grading process is thread-safe and shows real-time progress. Results are
+    cached by a hash of each submission's contents, the guidelines and the prompt,
+    so rerunning on an unchanged class makes no API calls.
     """
     # Validate inputs
     submissions_path = Path(submissions_dir)
@@ -900,6 +1854,107 @@ def grade(
     if threads <= 0:
         typer.echo("Error: threads must be positive")
         raise typer.Exit(1)
+
+    if engine not in ("threads", "async"):
+        typer.echo("Error: engine must be 'threads' or 'async'")
+        raise typer.Exit(1)
+
+    if concurrency <= 0:
+        typer.echo("Error: concurrency must be positive")
+        raise typer.Exit(1)
+
+    if cache_size <= 0:
+        typer.echo("Error: cache_size must be positive")
+        raise typer.Exit(1)
+
+    if max_prompt_tokens <= 0:
+        typer.echo("Error: max_prompt_tokens must be positive")
+        raise typer.Exit(1)
+
+    if group_size <= 0 or group_tokens <= 0:
+        typer.echo("Error: group_size and group_tokens must be positive")
+        raise typer.Exit(1)
+
+    if group_size > 1 and route:
+        typer.echo("Error: --group-size cannot be combined with --route, which picks a model per submission")
+        raise typer.Exit(1)
+
+    if feedback not in ("full", "background", "later"):
+        typer.echo("Error: feedback must be 'full', 'background' or 'later'")
+        raise typer.Exit(1)
+
+    if feedback != "full" and (group_size > 1 or batch or collect_batch):
+        typer.echo("Error: --feedback background/later grades one submission per request; it cannot be combined with --group-size or --batch")
+        raise typer.Exit(1)
+
+    if feedback == "later" and not use_cache:
+        typer.echo("Error: --feedback later keeps the scores in the cache until the feedback is written; it needs the cache")
+        raise typer.Exit(1)
+
+    if not 0 <= payload_sample_rate <= 1:
+        typer.echo("Error: payload_sample_rate must be between 0 and 1")
+        raise typer.Exit(1)
+
+    if batch and collect_batch:
+        typer.echo("Error: use either --batch or --collect-batch, not both")
+        raise typer.Exit(1)
+
+    if max_attempts <= 0:
+        typer.echo("Error: max_attempts must be positive")
+        raise typer.Exit(1)
+
+    if retry_budget is not None and retry_budget < 0:
+        typer.echo("Error: retry_budget cannot be negative")
+        raise typer.Exit(1)
+
+    if starter_code is not None and not Path(starter_code).is_file():
+        typer.echo(f"Error: {starter_code} is not a valid file")
+        raise typer.Exit(1)
+
+    deadline_seconds = None
+    if deadline is not None:
+        try:
+            deadline_seconds = parse_deadline(deadline)
+        except ValueError as e:
+            typer.echo(f"Error: {e}")
+            raise typer.Exit(1)
+        if deadline_seconds <= 0:
+            typer.echo("Error: deadline is in the past")
+            raise typer.Exit(1)
+
+    if breaker_threshold < 0 or breaker_cooldown < 0 or breaker_probes <= 0:
+        typer.echo("Error: breaker_threshold and breaker_cooldown cannot be negative, and breaker_probes must be positive")
+        raise typer.Exit(1)
+
+    if request_timeout is not None and request_timeout <= 0:
+        typer.echo("Error: request_timeout must be positive")
+        raise typer.Exit(1)
+
+    if hedge_percentile is not None and not 0 < hedge_percentile < 100:
+        typer.echo("Error: hedge_percentile must be between 0 and 100")
+        raise typer.Exit(1)
+
+    if not 0 <= max_hedge_ratio <= 1:
+        typer.echo("Error: max_hedge_ratio must be between 0 and 1")
+        raise typer.Exit(1)
+
+    if (rpm is not None and rpm <= 0) or (tpm is not None and tpm <= 0):
+        typer.echo("Error: rpm and tpm must be positive")
+        raise typer.Exit(1)
+
+    if adaptive and not 1 <= min_concurrency <= max_concurrency:
+        typer.echo("Error: concurrency bounds must satisfy 1 <= min_concurrency <= max_concurrency")
+        raise typer.Exit(1)
+    
+    if endpoints is not None and not Path(endpoints).is_file():
+        typer.echo(f"Error: {endpoints} is not a valid file")
+        raise typer.Exit(1)
+
+    try:
+        endpoint_pool = load_endpoints(endpoints)
+    except ValueError as e:
+        typer.echo(f"Error: {e}")
+        raise typer.Exit(1)
     
     # Set default output path if not provided
     output_path = Path(output) if output else submissions_path.parent / 'grading_results.csv'
@@ -918,49 +1973,134 @@ def grade(
         raise typer.Exit(1)
     
     # Create grader and result writer
-    grader = Grader(guidelines, max_points)
-    writer = ResultWriter()
-    
-    # Create result queue for thread safety
-    result_queue = Queue()
-    
-    # Create progress bar
-    progress_bar = tqdm(total=len(submissions), desc="Grading")
-    progress_lock = threading.Lock()
+    cache = GradeCache(Path(cache_path), cache_size) if use_cache else None
+    # Rate limits are per key, so the pool must be known before they are configured
+    if endpoint_pool:
+        configure_endpoints(endpoint_pool)
+    if rpm is not None or tpm is not None:
+        from grader import MODEL
+        configure_rate_limit(MODEL, rpm, tpm)
+    
+    limiter = None
+    if adaptive:
+        # The pool is sized for the upper bound; the limiter decides how much of it is used
+        initial = concurrency if engine == "async" else threads
+        limiter = AdaptiveConcurrency(initial, min_concurrency, max_concurrency)
+        threads = concurrency = max_concurrency
+    budget = RetryBudget(retry_budget if retry_budget is not None else len(submissions))
+    retry = RetryPolicy(max_attempts=max_attempts, budget=budget)
+    
+    if payload_log:
+        configure_payload_log(payload_log, payload_sample_rate)
+    
+    # Size the connection pool for the requests that can be in flight at once
+    pool_size = concurrency if engine == "async" else threads
+    if hedge_percentile is not None:
+        pool_size *= 2
+    configure_client(
+        max_connections=pool_size,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        base_url=base_url
+    )
     
-    def process_submission(submission: Submission):
-        """Process a single submission with progress tracking."""
+    compiled_rubric = None
+    if rubric:
+        from grader import compile_rubric
+        typer.echo("Compiling rubric...")
         try:
-            result = grader.grade_submission(submission)
-            formatted_result = ResultFormatter.format_result(result)
-            result_queue.put(formatted_result)
+            compiled_rubric = compile_rubric(guidelines, max_points, directory=rubric_dir)
         except Exception as e:
-            logger.error(f"Error processing {submission.student_name}: {str(e)}")
-        finally:
-            with progress_lock:
-                progress_bar.update(1)
+            typer.echo(f"Error: could not compile a rubric from {guidelines_path}: {e}")
+            raise typer.Exit(1)
+
+    hedger = None
+    if hedge_percentile is not None:
+        hedger = Hedger(hedge_percentile, max_hedge_ratio, max_workers=2 * max(threads, concurrency))
+    router = None
+    if route:
+        from grader import MODEL
+        router = Router(RoutingConfig(
+            simple_model=fast_model,
+            complex_model=MODEL,
+            simple_max_lines=simple_max_lines,
+            simple_max_files=simple_max_files,
+            starter_similarity=starter_similarity,
+            starter_code=Path(starter_code).read_text(encoding='utf-8') if starter_code else ""
+        ))
+    # The deadline clock starts once submissions have been found
+    run_deadline = Deadline(deadline_seconds, request_timeout)
+    breaker = None
+    if breaker_threshold:
+        # When the breaker gives up, stop the run the same way a deadline would
+        breaker = CircuitBreaker(
+            failure_threshold=breaker_threshold,
+            cooldown=breaker_cooldown,
+            max_probes=breaker_probes,
+            on_stop=run_deadline.cancel
+        )
+    grader = Grader(guidelines, max_points, cache, limiter, retry, hedger, stream, router, run_deadline, breaker,
+                    max_prompt_tokens, group_size, group_tokens, compiled_rubric, scores_only=feedback != "full")
+    writer = ResultWriter()
     
-    # Grade submissions using thread pool
-    typer.echo(f"Grading submissions using {threads} threads...")
+    if batch:
+        batch_path = output_path.with_suffix('.batch.jsonl')
+        batch_id = submit_grading_batch(grader, submissions, batch_path)
+        if batch_id is None:
+            typer.echo("Every submission is already cached; run without --batch to write the CSV.")
+        else:
+            typer.echo(f"Submitted batch {batch_id} (requests written to {batch_path}).")
+            typer.echo(f"Collect it later with:\n  python cli.py grade {submissions_dir} {guidelines_path} --collect-batch {batch_id}")
+        raise typer.Exit(0)
     
-    with ThreadPoolExecutor(max_workers=threads) as executor:
-        # Submit all grading tasks
-        futures = [
-            executor.submit(process_submission, submission)
-            for submission in submissions
-        ]
+    run = None
+    if collect_batch:
+        typer.echo(f"Collecting batch {collect_batch}...")
+        results = collect_grading_batch(grader, submissions, collect_batch, wait, poll_interval)
+        if results is None:
+            typer.echo("Batch has not finished yet; try again later.")
+            raise typer.Exit(0)
+    else:
+        if adaptive:
+            typer.echo(f"Grading submissions with concurrency adapting between {min_concurrency} and {max_concurrency}...")
+        elif engine == "async":
+            typer.echo(f"Grading submissions with up to {concurrency} concurrent requests...")
+        else:
+            typer.echo(f"Grading submissions using {threads} threads...")
         
-        # Wait for all tasks to complete
-        for future in futures:
-            future.result()  # This ensures we catch any exceptions
-    
-    # Close progress bar
-    progress_bar.close()
-    
-    # Collect all results from queue
-    results = []
-    while not result_queue.empty():
-        results.append(result_queue.get())
+        def run_engine(pending: List[Submission], desc: str) -> GradingRun:
+            """Grade submissions on the selected engine with a progress bar."""
+            progress_bar = tqdm(total=len(pending), desc=desc)
+            try:
+                if engine == "async":
+                    return asyncio.run(grade_with_asyncio(grader, pending, concurrency, progress_bar))
+                return grade_with_threads(grader, pending, threads, progress_bar)
+            finally:
+                progress_bar.close()
+        
+        run = run_engine(submissions, "Grading" if feedback == "full" else "Scoring")
+        results = run.results
+        
+        if feedback == "background" and grader.pending_feedback and not (run.interrupted or run_deadline.expired()):
+            # Scores are usable right away; the feedback pass then rewrites the CSV
+            writer.write_results(sorted(results, key=lambda x: x.last_name), output_path)
+            typer.echo(f"Scores saved to: {output_path}; writing feedback...")
+            grader.scores_only = False
+            pending = [s for s in submissions if str(s.original_path) in grader.pending_feedback]
+            feedback_run = run_engine(pending, "Feedback")
+            merged = results_by_path(submissions, run)
+            for path, row in results_by_path(pending, feedback_run).items():
+                if row.status == "Graded":
+                    merged[path] = row
+                else:
+                    # The scores stand; only their feedback could not be written
+                    error = row.status.removeprefix("Failed: ")
+                    merged[path] = replace(
+                        merged[path],
+                        overall_assessment=f"Feedback unavailable ({error}) - rerun without --feedback to write it"
+                    )
+            results = [merged[str(s.original_path)] for s in submissions if str(s.original_path) in merged]
+            run.interrupted = run.interrupted or feedback_run.interrupted
     
     # Sort results by student name for consistency
     results.sort(key=lambda x: x.last_name)
@@ -970,6 +2110,134 @@ def grade(
     writer.write_results(results, output_path)
     typer.echo(f"Grading completed! Results saved to: {output_path}")
 
+    failed = [r for r in results if r.status != "Graded"]
+    if failed:
+        typer.echo(f"\n{len(failed)} submissions could not be graded (Status column starts with 'Failed'):")
+        for r in failed:
+            typer.echo(f"  {r.first_name} {r.last_name}".rstrip())
+        typer.echo("Rerun the same command to regrade them; graded submissions are served from the cache.")
+
+    if run is not None and run.unfinished:
+        if run.interrupted:
+            typer.echo(f"\nGrading was interrupted; {len(run.unfinished)} submissions were not graded:")
+        elif breaker is not None and breaker.stopped:
+            typer.echo(f"\nThe API kept failing ({breaker.last_error}); grading stopped and {len(run.unfinished)} submissions were not graded:")
+        elif run_deadline.expired():
+            typer.echo(f"\nDeadline reached; {len(run.unfinished)} submissions were not graded:")
+        else:
+            typer.echo(f"\n{len(run.unfinished)} submissions were not graded:")
+        for submission in run.unfinished:
+            typer.echo(f"  {submission.student_name}")
+        typer.echo("Rerun the same command to grade them; finished submissions are served from the cache.")
+
+    if grader.pending_feedback:
+        typer.echo(f"\n{len(grader.pending_feedback)} submissions have a score but no written feedback yet.")
+        if cache is not None:
+            typer.echo("Rerun without --feedback to write it; the scores are served from the cache, not regraded.")
+        else:
+            typer.echo("Rerun without --feedback to write it.")
+
+    if cache is not None:
+        typer.echo(cache.stats())
+        cache.close()
+
+    if limiter is not None:
+        typer.echo(limiter.summary())
+
+    if hedger is not None:
+        typer.echo(hedger.summary())
+
+    if router is not None:
+        typer.echo(router.summary())
+
+    if grader.group_requests:
+        typer.echo(grader.group_summary())
+
+    if compiled_rubric is not None and grader.assessments:
+        typer.echo(grader.requirement_summary())
+
+    if endpoint_count() > 1:
+        typer.echo(endpoint_summary())
+
+    if breaker is not None and breaker.trips:
+        typer.echo(breaker.summary())
+
+    from grader import request_coalescer, usage_stats
+    if usage_stats.requests:
+        typer.echo(usage_stats.summary())
+    if request_coalescer.coalesced:
+        typer.echo(f"Coalesced {request_coalescer.coalesced} duplicate submissions into shared requests")
+
+    if run is not None and run.abandoned:
+        # Blocking requests cannot be interrupted; exit without waiting for their threads
+        typer.echo(f"Abandoning {run.abandoned} requests still in flight.")
+        stop_queue_logging()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(130 if run.interrupted else 1)
+    if run is not None and run.interrupted:
+        raise typer.Exit(130)
+
+
+@app.command(name="compile-rubric")
+def compile_rubric_command(
+    guidelines_path: str = typer.Argument(
+        ...,
+        help="Path to the assignment requirements file",
+        show_default=False
+    ),
+    max_points: int = typer.Option(
+        100,
+        help="Maximum points possible for the assignment",
+        show_default=True
+    ),
+    rubric_dir: str = typer.Option(
+        str(DEFAULT_RUBRIC_DIR),
+        help="Directory where compiled rubrics are cached",
+        show_default=True
+    ),
+    refresh: bool = typer.Option(
+        False,
+        "--refresh",
+        help="Recompile even if a rubric for these guidelines is already cached",
+        show_default=True
+    )
+):
+    """
+    Compile the assignment guidelines into a numbered rubric.
+
+    The model turns the guidelines into a list of requirements (R1, R2, ...)
+    with their points, and a list of standard deductions (D1, D2, ...). The
+    rubric is cached under a hash of the guidelines, so this runs once per
+    assignment; `grade --rubric` then sends the compact rubric instead of the
+    guidelines, and each student's requirements and common deductions are
+    answered by ID, so the wording is identical across the class.
+
+    The cached file can be reviewed and edited before grading.
+
+    Example:
+        python cli.py compile-rubric requirements.txt --max-points 150
+    """
+    guidelines_path = Path(guidelines_path)
+    if not guidelines_path.is_file():
+        typer.echo(f"Error: {guidelines_path} is not a valid file")
+        raise typer.Exit(1)
+    if max_points <= 0:
+        typer.echo("Error: max_points must be positive")
+        raise typer.Exit(1)
+
+    with open(guidelines_path, 'r', encoding='utf-8') as f:
+        guidelines = f.read()
+    try:
+        from grader import compile_rubric
+        compiled = compile_rubric(guidelines, max_points, directory=rubric_dir, refresh=refresh)
+    except Exception as e:
+        typer.echo(f"Error: could not compile a rubric: {e}")
+        raise typer.Exit(1)
+
+    typer.echo(compiled.render())
+    typer.echo(f"\nRubric file (edit to adjust before grading): {rubric_path(guidelines, max_points, rubric_dir)}")
+
 
 if __name__ == "__main__":
     app()
@@ -1,10 +1,28 @@
 """Module for grading Java assignments."""
-import json
+import asyncio
 import logging
-import re
-from openai import OpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from functools import partial
 from dotenv import load_dotenv
-import os
+
+from grader.cache import cache_key
+from grader.client import get_async_client, get_client
+from grader.ratelimit import create_completion, create_completion_async
+from grader.streaming import stream_completion, stream_completion_async
+from grader.singleflight import SingleFlight, request_key
+from grader.usage import UsageStats
+from grader.prompt import PromptTemplate, build_rubric_messages
+from grader.rubric import DEFAULT_RUBRIC_DIR, RUBRIC_VERSION, Rubric, guidelines_hash, rubric_path
+from grader.packing import MAX_PROMPT_TOKENS, plan_submission
+from grader.jsonrepair import load_object
+from grader.logs import payload_logger, timed
+from grader.schema import (ANALYSIS_SCHEMA, FEEDBACK_SCHEMA, REQUIRED_FIELDS, RUBRIC_SCHEMA, GradeResult,
+                           ResultValidationError, grading_schema, group_schema, merge_feedback, response_format,
+                           scores_schema)
+from grader.tokens import count_tokens
+from grader.retry import RetryPolicy, call_with_retry, call_with_retry_async
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -12,33 +30,56 @@ logging.basicConfig(level=logging.INFO)
 # Load environment variables
 load_dotenv()
 
-# Set up OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Model used for grading and the version of the grading prompt below.
+# Bump PROMPT_VERSION whenever the prompt changes so cached results are invalidated.
+MODEL = "o1-preview"
+PROMPT_VERSION = "3"
+
+# Output tokens (including reasoning tokens) reserved against the TPM limit per grading call
+EXPECTED_OUTPUT_TOKENS = 8_000
+
+# Top-level keys every grading result must contain
+REQUIRED_KEYS = REQUIRED_FIELDS
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+# Shared by every grading call in the process
+request_coalescer = SingleFlight()
+usage_stats = UsageStats()
 
 def extract_json(text):
     """
     Extract JSON content from a string, ignoring any text before or after the JSON,
     including markdown code block markers.
     
+    The object is located with a single brace- and string-aware pass, and
+    common defects (trailing commas, output cut off by the token limit) are
+    repaired; see `grader.jsonrepair.load_object`.
+    
     Args:
     text (str): The string containing JSON content.
     
     Returns:
     str: The extracted JSON string.
     """
-    # Remove markdown code block markers if present
-    text = re.sub(r'```json\s*|\s*```', '', text)
-    
-    # Find the JSON object
-    json_match = re.search(r'(\{.*\})', text, re.DOTALL)
-    if json_match:
-        return json_match.group(1)
-    else:
-        raise ValueError("No valid JSON found in the response")
+    return load_object(text).text
 
-def grade_assignment(files, guidelines, student_comment, max_points):
+def _load_json(content):
+    """Decode the JSON object in a response, logging any repairs that were needed."""
+    parsed = load_object(content)
+    if parsed.repairs:
+        recovered = f"; recovered fields: {', '.join(parsed.recovered_fields)}" if parsed.recovered_fields else ""
+        logging.warning(f"Repaired malformed JSON in API response ({'; '.join(parsed.repairs)}){recovered}")
+    return parsed.value
+
+def build_messages(files, guidelines, student_comment, max_points):
     """
-    Grade a Java assignment based on the provided files, guidelines, and student comment.
+    Build the chat messages for grading a Java assignment.
+    
+    The prompt is laid out as a stable prefix (instructions, schema, guidelines
+    and maximum points) followed by the student-specific code and comment, so
+    the prefix is identical across a class and eligible for prompt caching.
+    When grading many submissions, compile a `PromptTemplate` once instead.
     
     Args:
     files (list): A list of tuples containing file names and their contents.
@@ -46,142 +87,591 @@ def grade_assignment(files, guidelines, student_comment, max_points):
     student_comment (str): Any comments provided by the student.
     max_points (int): The maximum number of points for the assignment.
     
+    Returns:
+    list: The messages to send to the chat completions API.
+    """
+    return PromptTemplate(guidelines, max_points).render(files, student_comment)
+
+def parse_content(content, rubric=None):
+    """
+    Parse the grading result out of the model's message text and validate it.
+    
+    Malformed or truncated JSON is repaired where possible, and the result is
+    checked field by field against `GradeResult`, so a missing key or a wrong
+    type is reported here (and retried) rather than surfacing later as a KeyError.
+    
+    Args:
+    content (str): The message content returned by the model.
+    rubric (Rubric, optional): Rubric the submission was graded against; requirement IDs are expanded from it.
+    
     Returns:
     dict: A dictionary containing the grading results.
     """
-    files_str = "\n\n".join([f"File name: {file_name}\n{content}" for file_name, content in files])
-    prompt = f"""
-    Assignment Guidelines:
-    {guidelines}
-
-    Student's Java Code:
-    {files_str}
-
-    Student's Comment:
-    {student_comment}
-
-    Maximum Points: {max_points}
-
-    Please grade the above Java code based on the given assignment guidelines. Keep in mind that this is likely the first CS class for most of these students, so be forgiving and lenient with deductions. Follow these steps:
-
-    1. Syntax Check:
-       - Analyze the code for any syntax errors as if you were a Java compiler.
-       - List any syntax errors found, including line numbers and descriptions.
-       - Be forgiving of minor syntax errors that don't significantly impact the code's functionality.
-       - Consider the file name when evaluating class name consistency.
-
-    2. Compilation Test:
-       - Assuming syntax is correct, check if the code would compile successfully.
-       - Identify any potential compilation errors, such as undefined variables or type mismatches.
-       - Consider partial credit for code that's close to compiling but has minor issues.
-       - Ignore errors that the file name doesn't match the class name as files have been renamed. 
-
-    3. Logical Error Detection:
-       - Analyze the code for logical errors or flaws in the implementation.
-       - Identify any discrepancies between the code's logic and the assignment requirements.
-       - Focus on major logical errors and be lenient with minor logical inconsistencies.
-
-    4. Runtime Behavior Simulation:
-       - Simulate running the program with various inputs.
-       - Provide a summary of the runtime behavior in the following format:
-         {{
-           "status": "success" or "warning" or "error",
-           "summary": "A brief summary of the runtime behavior",
-           "details": "More detailed explanation of the runtime behavior, including any potential issues or unexpected results"
-         }}
-       - Be forgiving of extreme edge cases or minor unexpected behaviors that don't detract from assignment requirements.
-
-    5. Requirements Assessment:
-       - List all requirements from the assignment guidelines.
-       - For each requirement, state whether it is met (true) or not met (false).
-       - If a requirement is partially met, mark it as false and explain the partial completion in the explanation.
-       - Provide a brief explanation for each requirement's assessment.
-
-    6. Code Quality and Style:
-       - Evaluate the code's readability, organization, and adherence to Java best practices.
-       - Focus on major style issues and be lenient with minor style inconsistencies.
-
-    7. Point Deductions:
-       - Start with {max_points} points.
-       - Deduct points sparingly for syntax errors, compilation errors, logical errors, unmet requirements, and poor code quality.
-       - Be very forgiving and deduct minimal points for minor issues.
-       - Provide a clear reason for each deduction, focusing on learning opportunities rather than punishment.
-
-    8. Extra Credit:
-       - Extra credit should only be awarded for exceptional effort that clearly goes beyond the basic requirements of the assignment.
-       - Do not award extra credit simply for meeting all requirements or for code that works properly, as this is expected for the assignment.
-       - Look for innovative approaches, additional features, or exceptional code quality that demonstrates a deep understanding and significant extra effort.
-       - If extra credit is warranted, award up to 5 points and provide a clear explanation of why the work deserves extra credit. Most extra credit should be between 2-3 points, unless the work is truly exceptional.
-
-    9. Final Evaluation:
-       - Summarize the overall assessment of the code, highlighting the positive aspects.
-       - Provide constructive suggestions for improvement, focusing on the most important areas for growth.
-
-    Format your response as a JSON object with the following structure:
-    {{
-        "syntax_check": [
-            {{"line": number, "error": "string"}}
-        ],
-        "compilation_test": {{
-            "compiles": boolean,
-            "errors": [
-                "string"
-            ]
-        }},
-        "logical_errors": [
-            "string"
-        ],
-        "runtime_simulation": {{
-            "status": "string",
-            "summary": "string",
-            "details": "string"
-        }},
-        "requirements_assessment": [
-            {{"requirement": "string", "met": boolean, "explanation": "string"}}
-        ],
-        "code_quality": "string",
-        "point_deductions": [
-            {{"reason": "string", "points": number}}
-        ],
-        "extra_credit": {{
-            "awarded": boolean,
-            "points": number,
-            "reason": "string"
-        }},
-        "final_score": number,
-        "overall_assessment": "string",
-        "improvement_suggestions": [
-            "string"
-        ],
-        "comment_consideration": "string"
-    }}
-
-    Ensure that your response is a valid JSON object, and all values are JSON-parsable and of the correct type.
-    """
-
-    response = client.chat.completions.create(
-        model="o1-preview",
-        messages=[
-            {"role": "user", "content": f"You are an experienced Java programming instructor and compiler expert tasked with grading student assignments.\n\n{prompt}"},
-        ]
-    )
+    try:
+        data = _load_json(content)
+        if rubric is not None:
+            data = rubric.expand(data)
+        result = GradeResult.from_dict(data).to_dict()
+        payload_logger.debug("Parsed result: %s", result)
+        return result
+    except Exception as e:
+        logging.error(f"Error processing API response: {e}")
+        raise
+
+def parse_scores(content, rubric=None):
+    """
+    Parse a scores-only result, from the first phase of two-phase grading.
     
-    logging.info(f"OpenAI API response: {response}")
+    Args:
+    content (str): The message content returned by the model.
+    rubric (Rubric, optional): Rubric the submission was graded against.
     
-    if response.choices and response.choices[0].message:
+    Returns:
+    dict: The grading result with empty prose fields and feedback_pending set.
+    """
+    data = _load_json(content)
+    if rubric is not None:
+        data = rubric.expand(data)
+    return GradeResult.from_scores(data).to_dict()
+
+def parse_feedback(content, scores):
+    """
+    Parse the feedback written for a scores-only result and merge it in.
+    
+    Args:
+    content (str): The message content returned by the model.
+    scores (dict): The scores-only result the feedback was written for.
+    
+    Returns:
+    dict: The complete grading result.
+    """
+    return merge_feedback(scores, _load_json(content))
+
+def parse_analysis(content):
+    """
+    Parse the per-file analyses out of an analysis call's message text.
+    
+    Args:
+    content (str): The message content returned by the model.
+    
+    Returns:
+    list: One analysis dictionary per file.
+    """
+    result = _load_json(content)
+    if not isinstance(result.get("files"), list):
+        raise ValueError("Analysis result is missing the files list")
+    return result["files"]
+
+def parse_group(content, ids, rubric=None):
+    """
+    Parse the per-submission results out of a grouped grading response.
+    
+    Results that are invalid, or whose ID was not asked for, are dropped with a
+    warning so their submissions can be graded on their own.
+    
+    Args:
+    content (str): The message content returned by the model.
+    ids (list): The submission IDs sent in the request.
+    rubric (Rubric, optional): Rubric the submissions were graded against.
+    
+    Returns:
+    dict: Grading result dictionaries keyed by submission ID.
+    """
+    items = _load_json(content).get("results")
+    if not isinstance(items, list):
+        raise ValueError("Grouped grading result is missing the results list")
+    results = {}
+    for item in items:
+        submission_id = item.pop("submission_id", None) if isinstance(item, dict) else None
+        if submission_id not in ids or submission_id in results:
+            logging.warning(f"Ignoring grouped result with unexpected submission ID {submission_id!r}")
+            continue
         try:
-            json_str = extract_json(response.choices[0].message.content)
-            logging.info(f"Extracted JSON string: {json_str}")
-            result = json.loads(json_str)
-            logging.info(f"Parsed result: {result}")
-            return result
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON decode error: {e}")
-            logging.error(f"Problematic JSON string: {json_str}")
-            raise ValueError(f"Invalid JSON in API response: {e}")
-        except Exception as e:
-            logging.error(f"Error processing API response: {e}")
-            raise
+            if rubric is not None:
+                item = rubric.expand(item)
+            results[submission_id] = GradeResult.from_dict(item).to_dict()
+        except ResultValidationError as e:
+            logging.warning(f"Ignoring invalid grouped result for {submission_id}: {e}")
+    if not results:
+        raise ValueError("Grouped grading result contains no valid results")
+    return results
+
+def parse_response(response, parse=parse_content):
+    """
+    Parse the grading result out of a chat completion response.
+    
+    Args:
+    response: The chat completion returned by the OpenAI API.
+    parse (callable): Parser for the message content; defaults to parse_content.
+    
+    Returns:
+    dict: A dictionary containing the grading results.
+    """
+    payload_logger.debug("OpenAI API response: %s", response)
+    
+    if response.choices and response.choices[0].message:
+        message = response.choices[0].message
+        if getattr(message, "refusal", None):
+            raise ValueError(f"Model refused to grade: {message.refusal}")
+        return parse(message.content)
     else:
         logging.error("No valid response from OpenAI API")
         raise ValueError("No valid response from OpenAI API")
+
+def parse_rubric(content, guidelines, max_points):
+    """
+    Parse a compiled rubric out of the model's message text.
+    
+    Args:
+    content (str): The message content returned by the model.
+    guidelines (str): The guidelines the rubric was compiled from.
+    max_points (int): The maximum number of points for the assignment.
+    
+    Returns:
+    Rubric: The numbered rubric.
+    """
+    data = _load_json(content)
+    items = data.get("requirements")
+    if not isinstance(items, list):
+        raise ValueError("Rubric is missing the requirements list")
+    deductions = data.get("deductions")
+    return Rubric.from_items(items, guidelines, max_points, deductions if isinstance(deductions, list) else ())
+
+def compile_rubric(guidelines, max_points, model=None, directory=DEFAULT_RUBRIC_DIR, refresh=False,
+                   retry=None, deadline=None):
+    """
+    Compile the guidelines into a numbered rubric, or load it if already compiled.
+    
+    Rubrics are cached as JSON files named by a hash of the guidelines, so the
+    model is asked once per assignment, and a TA can review or edit the file
+    before grading.
+    
+    Args:
+    guidelines (str): The assignment guidelines.
+    max_points (int): The maximum number of points for the assignment.
+    model (str, optional): Model to compile with; defaults to MODEL.
+    directory (Path, optional): Directory holding compiled rubrics; defaults to DEFAULT_RUBRIC_DIR.
+    refresh (bool): Recompile even if a rubric for these guidelines is cached.
+    retry (RetryPolicy, optional): Retry policy for transient failures; defaults to DEFAULT_RETRY_POLICY.
+    deadline (Deadline, optional): Bounds the request's timeout.
+    
+    Returns:
+    Rubric: The compiled rubric.
+    
+    Raises:
+    GradingFailed: If the rubric could not be compiled after all retries.
+    """
+    model = model or MODEL
+    path = rubric_path(guidelines, max_points, directory)
+    if not refresh and path.exists():
+        rubric = Rubric.load(path)
+        if rubric.version == RUBRIC_VERSION and rubric.guidelines_hash == guidelines_hash(guidelines):
+            logging.info(f"Using compiled rubric {path}")
+            return rubric
+    rubric = _call_model(
+        build_rubric_messages(guidelines, max_points),
+        None,
+        response_format(model, "grading_rubric", RUBRIC_SCHEMA),
+        partial(parse_rubric, guidelines=guidelines, max_points=max_points),
+        model=model, limiter=None, retry=retry, hedger=None, stream=False, on_field=None,
+        deadline=deadline, breaker=None
+    )
+    rubric.save(path)
+    logging.info(f"Compiled a rubric of {len(rubric.requirements)} requirements and "
+                 f"{len(rubric.deductions)} standard deductions to {path}")
+    return rubric
+
+def result_key(files, guidelines, student_comment, max_points, model, rubric=None, scores_only=False):
+    """
+    Return the cache key of a grading request.
+    
+    A rubric replaces the guidelines it was compiled from, and scores-only
+    results are kept apart from complete ones.
+    """
+    criteria = guidelines if rubric is None else rubric.render()
+    version = f"{PROMPT_VERSION}-scores" if scores_only else PROMPT_VERSION
+    return cache_key(files, criteria, student_comment, max_points, model, version)
+
+def _cache_lookup(cache, files, guidelines, student_comment, max_points, model, rubric=None,
+                  scores_only=False, record_miss=True):
+    """Return the cache key and any cached result for a grading request."""
+    if cache is None:
+        return None, None
+    key = result_key(files, guidelines, student_comment, max_points, model, rubric, scores_only)
+    cached = cache.get(key, record_miss)
+    if cached is not None:
+        logging.info("Cache hit, grade reused" if scores_only else "Cache hit, skipping API call")
+    return key, cached
+
+def _request_options(deadline):
+    """Return extra API arguments bounding a request by the run deadline."""
+    if deadline is None:
+        return {}
+    timeout = deadline.timeout()
+    return {} if timeout is None else {"timeout": timeout}
+
+def _rubric_ids(rubric):
+    """Return the requirement and standard deduction IDs a response may name, or Nones without a rubric."""
+    if rubric is None:
+        return None, None
+    return rubric.ids, rubric.deduction_ids
+
+def _grading_format(model, rubric):
+    """Return the response_format for a grading call, answering requirements and deductions by ID with a rubric."""
+    return response_format(model, "grading_result", grading_schema(*_rubric_ids(rubric)))
+
+def _single_call(template, files, student_comment, model, rubric, scores_only, scores):
+    """
+    Return the messages, response format and parser for grading a submission in one call.
+    
+    The call asks for the grade alone (`scores_only`), for the feedback on a
+    grade already given (`scores`), or for the complete result.
+    """
+    if scores_only:
+        return (template.render_scores(files, student_comment),
+                response_format(model, "grading_scores", scores_schema(*_rubric_ids(rubric))),
+                partial(parse_scores, rubric=rubric))
+    if scores is not None:
+        return (template.render_feedback(files, student_comment, scores),
+                response_format(model, "grading_feedback", FEEDBACK_SCHEMA),
+                partial(parse_feedback, scores=scores))
+    return template.render(files, student_comment), _grading_format(model, rubric), partial(parse_content, rubric=rubric)
+
+def _plan(files, student_comment, template, model, max_prompt_tokens):
+    """Decide whether a submission is graded in one call or split into analysis chunks."""
+    comment_tokens = count_tokens(student_comment, model)
+    plan = plan_submission(
+        files,
+        max_prompt_tokens or MAX_PROMPT_TOKENS,
+        template.fixed_tokens(model) + comment_tokens,
+        template.analysis_fixed_tokens(model),
+        model
+    )
+    if plan.map_reduce:
+        logging.info(
+            f"Submission has {plan.total_tokens} tokens of code; grading it in "
+            f"{len(plan.chunks)} analysis chunks plus an aggregation call"
+        )
+    return plan, comment_tokens
+
+def _completion_request(messages, prompt_tokens, output_format, model, stream, on_field, deadline,
+                        expected_output_tokens):
+    """Return whether a request is streamed, and its arguments for `stream_completion` or `create_completion`."""
+    streamed = stream or on_field is not None
+    request = _request_options(deadline)
+    if output_format is not None:
+        request["response_format"] = output_format
+    if streamed:
+        request["on_field"] = on_field
+    request.update(model=model, messages=messages, expected_output_tokens=expected_output_tokens,
+                   prompt_tokens=prompt_tokens)
+    return streamed, request
+
+@contextmanager
+def _recorded_call(model, streamed):
+    """Time one API call and add the usage it stores in timing["usage"] to the run's totals."""
+    started = time.monotonic()
+    with timed("api_call", model=model, stream=streamed) as timing:
+        yield timing
+    usage_stats.record(timing["usage"], time.monotonic() - started)
+
+def _parse_reply(reply, streamed, parse):
+    """Parse the text of a streamed reply, or the message of a completion response."""
+    # A response cut off mid-object comes back whole; parse() repairs it
+    return parse(reply) if streamed else parse_response(reply, parse)
+
+def _call_model(messages, prompt_tokens, output_format, parse, model, limiter, retry, hedger, stream,
+                on_field, deadline, breaker, expected_output_tokens=EXPECTED_OUTPUT_TOKENS):
+    """
+    Send one request through the shared limits, retries and hedging, and parse the reply.
+    
+    Identical prompts in flight at the same time (e.g. byte-identical group
+    submissions) share a single API call.
+    """
+    def attempt():
+        with breaker.guard() if breaker is not None else nullcontext(), \
+                limiter.slot() if limiter is not None else nullcontext():
+            streamed, request = _completion_request(messages, prompt_tokens, output_format, model, stream,
+                                                    on_field, deadline, expected_output_tokens)
+            with _recorded_call(model, streamed) as timing:
+                if streamed:
+                    reply, timing["usage"] = stream_completion(get_client(), **request)
+                else:
+                    reply = create_completion(get_client(), **request)
+                    timing["usage"] = reply.usage
+        return _parse_reply(reply, streamed, parse)
+    
+    return request_coalescer.do(
+        request_key(model, messages),
+        lambda: call_with_retry(
+            attempt if hedger is None else lambda: hedger.run(attempt),
+            retry or DEFAULT_RETRY_POLICY,
+            deadline
+        )
+    )
+
+async def _call_model_async(messages, prompt_tokens, output_format, parse, model, limiter, retry, hedger, stream,
+                            on_field, deadline, breaker, expected_output_tokens=EXPECTED_OUTPUT_TOKENS):
+    """Asynchronous version of `_call_model` using the AsyncOpenAI client."""
+    async def attempt():
+        async with breaker.async_guard() if breaker is not None else nullcontext(), \
+                limiter.async_slot() if limiter is not None else nullcontext():
+            streamed, request = _completion_request(messages, prompt_tokens, output_format, model, stream,
+                                                    on_field, deadline, expected_output_tokens)
+            with _recorded_call(model, streamed) as timing:
+                if streamed:
+                    reply, timing["usage"] = await stream_completion_async(get_async_client(), **request)
+                else:
+                    reply = await create_completion_async(get_async_client(), **request)
+                    timing["usage"] = reply.usage
+        return _parse_reply(reply, streamed, parse)
+    
+    return await request_coalescer.do_async(
+        request_key(model, messages),
+        lambda: call_with_retry_async(
+            attempt if hedger is None else lambda: hedger.run_async(attempt),
+            retry or DEFAULT_RETRY_POLICY,
+            deadline
+        )
+    )
+
+class _Grading:
+    """
+    The cache lookups and calls of one `grade_assignment` request.
+    
+    `result` is set when the request is answered without calling the API;
+    otherwise the caller sends `single_call()`, or the `analysis_calls()` and
+    then `summary_call()`, and hands the result to `save()`.
+    """
+
+    def __init__(self, files, guidelines, student_comment, max_points, cache, model, template,
+                 max_prompt_tokens, rubric, scores_only, scores):
+        self.result = None
+        if scores is not None and not scores.get("feedback_pending"):
+            self.result = scores
+            return
+        self.model = model or MODEL
+        self.rubric = rubric or (template.rubric if template is not None else None)
+        self.cache = cache
+        # One hit or miss is counted per call: a cached grade without feedback is still a hit
+        self.key, self.result = _cache_lookup(cache, files, guidelines, student_comment, max_points, self.model,
+                                              self.rubric, record_miss=False)
+        if self.result is not None:
+            return
+        self.scores_key, cached_scores = _cache_lookup(cache, files, guidelines, student_comment, max_points,
+                                                       self.model, self.rubric, scores_only=True)
+        if scores_only and cached_scores is not None:
+            self.result = cached_scores
+            return
+        self.student_comment = student_comment
+        self.scores_only = scores_only
+        # A grade from an earlier scores-only call is kept; only its feedback is written now
+        self.scores = None if scores_only else scores or cached_scores
+        self.template = template or PromptTemplate(guidelines, max_points, self.rubric)
+        self.plan, self.comment_tokens = _plan(files, student_comment, self.template, self.model, max_prompt_tokens)
+
+    def single_call(self):
+        """Return the `_call_model` arguments grading the submission in one call."""
+        messages, output_format, parse = _single_call(self.template, self.plan.chunks[0], self.student_comment,
+                                                      self.model, self.rubric, self.scores_only, self.scores)
+        prompt_tokens = self.template.fixed_tokens(self.model) + self.comment_tokens + self.plan.total_tokens
+        return dict(messages=messages, prompt_tokens=prompt_tokens, output_format=output_format, parse=parse)
+
+    def analysis_calls(self):
+        """Return the `_call_model` arguments analyzing each chunk of an oversized submission."""
+        analysis_format = response_format(self.model, "file_analysis", ANALYSIS_SCHEMA)
+        return [dict(messages=self.template.render_analysis(chunk), prompt_tokens=None,
+                     output_format=analysis_format, parse=parse_analysis)
+                for chunk in self.plan.chunks]
+
+    def summary_call(self, analyses):
+        """Return the `_call_model` arguments grading an oversized submission from its chunk analyses."""
+        messages = self.template.render_summaries([a for chunk in analyses for a in chunk], self.plan.omitted,
+                                                  self.student_comment)
+        return dict(messages=messages, prompt_tokens=None, output_format=_grading_format(self.model, self.rubric),
+                    parse=partial(parse_content, rubric=self.rubric))
+
+    def save(self, result):
+        """Cache a result under its complete or scores-only key, and return it."""
+        if self.cache is not None:
+            self.cache.put(self.scores_key if result["feedback_pending"] else self.key, result)
+        return result
+
+def grade_assignment(files, guidelines, student_comment, max_points, cache=None,
+                     limiter=None, retry=None, hedger=None, stream=False, on_field=None,
+                     model=None, deadline=None, breaker=None, template=None,
+                     max_prompt_tokens=None, rubric=None, scores_only=False, scores=None):
+    """
+    Grade a Java assignment based on the provided files, guidelines, and student comment.
+    
+    Submissions too large for one request are graded map-reduce style: their
+    files are analyzed in parallel chunks, and a final call grades the project
+    from those analyses (see grader.packing for which files are included).
+
+    Grading can also be split in two phases. With `scores_only`, the model
+    returns just the grade (score, deductions, extra credit and which
+    requirements are met), which is much faster. A later call with `scores`,
+    or any later call once the scores are cached, writes the prose feedback
+    for that grade without regrading. Oversized submissions are always graded
+    in full.
+    
+    Args:
+    files (list): A list of tuples containing file names and their contents.
+    guidelines (str): The assignment guidelines.
+    student_comment (str): Any comments provided by the student.
+    max_points (int): The maximum number of points for the assignment.
+    cache (GradeCache, optional): Result cache to consult before calling the API.
+    limiter (AdaptiveConcurrency, optional): Concurrency controller gating the API call.
+    retry (RetryPolicy, optional): Retry policy for transient failures; defaults to DEFAULT_RETRY_POLICY.
+    hedger (Hedger, optional): Sends a duplicate request when a call runs unusually long.
+    stream (bool): Stream the response, parsing it as it arrives and aborting early if it is malformed beyond repair.
+    on_field (callable, optional): Called with each top-level result field as soon as it is complete; implies stream.
+    model (str, optional): Model to grade with; defaults to MODEL.
+    deadline (Deadline, optional): Run deadline; bounds each request's timeout and stops retries once it passes.
+    breaker (CircuitBreaker, optional): Pauses calls while the API keeps failing for every submission.
+    template (PromptTemplate, optional): Prompt compiled for these guidelines and max_points; built per call if omitted.
+    max_prompt_tokens (int, optional): Prompt size above which a submission is split; defaults to MAX_PROMPT_TOKENS.
+    rubric (Rubric, optional): Compiled rubric sent in place of the guidelines; taken from template if omitted.
+    scores_only (bool): Return only the grade, with empty prose fields and feedback_pending set.
+    scores (dict, optional): A scores-only result to write the feedback for; the cached one is used if omitted.
+    
+    Returns:
+    dict: A dictionary containing the grading results.
+    
+    Raises:
+    GradingFailed: If the submission could not be graded after all retries.
+    """
+    grading = _Grading(files, guidelines, student_comment, max_points, cache, model, template,
+                       max_prompt_tokens, rubric, scores_only, scores)
+    if grading.result is not None:
+        return grading.result
+    call = partial(_call_model, model=grading.model, limiter=limiter, retry=retry, hedger=hedger,
+                   stream=stream, deadline=deadline, breaker=breaker)
+    if not grading.plan.map_reduce:
+        return grading.save(call(**grading.single_call(), on_field=on_field))
+    requests = grading.analysis_calls()
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        analyses = list(executor.map(lambda request: call(**request, on_field=None), requests))
+    return grading.save(call(**grading.summary_call(analyses), on_field=on_field))
+
+async def grade_assignment_async(files, guidelines, student_comment, max_points, cache=None,
+                                 limiter=None, retry=None, hedger=None, stream=False, on_field=None,
+                                 model=None, deadline=None, breaker=None, template=None,
+                                 max_prompt_tokens=None, rubric=None, scores_only=False, scores=None):
+    """
+    Asynchronous version of `grade_assignment` using the AsyncOpenAI client; takes the same arguments.
+    
+    Many calls can be awaited concurrently on a single event loop; the caller
+    is responsible for bounding how many are in flight.
+    """
+    grading = _Grading(files, guidelines, student_comment, max_points, cache, model, template,
+                       max_prompt_tokens, rubric, scores_only, scores)
+    if grading.result is not None:
+        return grading.result
+    call = partial(_call_model_async, model=grading.model, limiter=limiter, retry=retry, hedger=hedger,
+                   stream=stream, deadline=deadline, breaker=breaker)
+    if not grading.plan.map_reduce:
+        return grading.save(await call(**grading.single_call(), on_field=on_field))
+    analyses = await asyncio.gather(*(call(**request, on_field=None) for request in grading.analysis_calls()))
+    return grading.save(await call(**grading.summary_call(analyses), on_field=on_field))
+
+def _group_ids(count):
+    """Opaque IDs for the submissions in a grouped request."""
+    return [f"S{i + 1}" for i in range(count)]
+
+def _group_lookup(file_sets, guidelines, max_points, cache, model, rubric):
+    """Split a group into cached results and the submissions still to grade."""
+    results = [None] * len(file_sets)
+    pending = []
+    for index, files in enumerate(file_sets):
+        key, cached = _cache_lookup(cache, files, guidelines, "", max_points, model, rubric)
+        if cached is not None:
+            results[index] = cached
+        else:
+            pending.append((index, files, key))
+    return results, pending
+
+def _group_results(results, pending, graded, cache):
+    """Place a grouped response's results by submission, caching each one."""
+    for (index, _, key), submission_id in zip(pending, _group_ids(len(pending))):
+        result = graded.get(submission_id)
+        if result is not None:
+            results[index] = result
+            if cache is not None:
+                cache.put(key, result)
+    missing = sum(1 for r in results if r is None)
+    if missing:
+        logging.warning(f"Grouped response left out {missing} of {len(pending)} submissions")
+    return results
+
+def _group_request(file_sets, guidelines, max_points, cache, model, template, rubric):
+    """
+    Look up a group in the cache and build the request grading the rest of it.
+    
+    Returns the results so far, the submissions still to grade, and the
+    `_call_model` arguments for them, or None if every result was cached.
+    """
+    model = model or MODEL
+    rubric = rubric or (template.rubric if template is not None else None)
+    results, pending = _group_lookup(file_sets, guidelines, max_points, cache, model, rubric)
+    if not pending:
+        return results, pending, None
+
+    template = template or PromptTemplate(guidelines, max_points, rubric)
+    ids = _group_ids(len(pending))
+    request = dict(
+        messages=template.render_group(list(zip(ids, (files for _, files, _ in pending)))),
+        prompt_tokens=None,
+        output_format=response_format(model, "grading_results", group_schema(*_rubric_ids(rubric))),
+        parse=partial(parse_group, ids=ids, rubric=rubric),
+        model=model, stream=False, on_field=None,
+        expected_output_tokens=EXPECTED_OUTPUT_TOKENS * len(pending)
+    )
+    return results, pending, request
+
+def grade_group(file_sets, guidelines, max_points, cache=None, limiter=None, retry=None, hedger=None,
+                model=None, deadline=None, breaker=None, template=None, rubric=None):
+    """
+    Grade several small submissions in a single request.
+    
+    The guidelines and instructions are sent once for the whole group, and
+    each submission is tagged with an opaque ID rather than a student name.
+    Each result is cached on its own, as if the submission had been graded
+    alone.
+    
+    Args:
+    file_sets (list): For each submission, a list of (file name, contents) tuples.
+    guidelines (str): The assignment guidelines.
+    max_points (int): The maximum number of points for the assignment.
+    cache (GradeCache, optional): Result cache to consult before calling the API.
+    limiter (AdaptiveConcurrency, optional): Concurrency controller gating the API call.
+    retry (RetryPolicy, optional): Retry policy for transient failures; defaults to DEFAULT_RETRY_POLICY.
+    hedger (Hedger, optional): Sends a duplicate request when a call runs unusually long.
+    model (str, optional): Model to grade with; defaults to MODEL.
+    deadline (Deadline, optional): Run deadline; bounds each request's timeout and stops retries once it passes.
+    breaker (CircuitBreaker, optional): Pauses calls while the API keeps failing for every submission.
+    template (PromptTemplate, optional): Prompt compiled for these guidelines and max_points; built per call if omitted.
+    rubric (Rubric, optional): Compiled rubric sent in place of the guidelines; taken from template if omitted.
+    
+    Returns:
+    list: A grading result dictionary per submission, or None for submissions
+    the model left out of its response, which should be graded on their own.
+    
+    Raises:
+    GradingFailed: If the request failed after all retries.
+    """
+    results, pending, request = _group_request(file_sets, guidelines, max_points, cache, model, template, rubric)
+    if request is None:
+        return results
+    graded = _call_model(**request, limiter=limiter, retry=retry, hedger=hedger, deadline=deadline, breaker=breaker)
+    return _group_results(results, pending, graded, cache)
+
+async def grade_group_async(file_sets, guidelines, max_points, cache=None, limiter=None, retry=None, hedger=None,
+                            model=None, deadline=None, breaker=None, template=None, rubric=None):
+    """Asynchronous version of `grade_group` using the AsyncOpenAI client; takes the same arguments."""
+    results, pending, request = _group_request(file_sets, guidelines, max_points, cache, model, template, rubric)
+    if request is None:
+        return results
+    graded = await _call_model_async(**request, limiter=limiter, retry=retry, hedger=hedger, deadline=deadline,
+                                     breaker=breaker)
+    return _group_results(results, pending, graded, cache)
@@ -0,0 +1,127 @@
+"""Offline grading through the OpenAI Batch API."""
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+
+# Batch states after which no more progress will be made
+TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def write_batch_file(requests: List[Tuple[str, List[Dict[str, str]]]], model: str, path: Path,
+                     response_format: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Write chat completion requests to a Batch API input file.
+
+    Args:
+        requests (List[Tuple[str, List[Dict]]]): (custom_id, messages) pairs
+        model (str): Model to grade with
+        path (Path): Where to write the JSONL file
+        response_format (Optional[Dict]): Structured output format to request, if any
+
+    Returns:
+        int: Number of requests written
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, messages in requests:
+            body = {"model": model, "messages": messages}
+            if response_format is not None:
+                body["response_format"] = response_format
+            f.write(json.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": body,
+            }) + "\n")
+    return len(requests)
+
+
+def submit_batch(client, path: Path, metadata: Dict[str, str] = None) -> str:
+    """
+    Upload a batch input file and start the batch job.
+
+    Args:
+        client (OpenAI): Client used to upload and create the batch
+        path (Path): JSONL file produced by `write_batch_file`
+        metadata (Dict[str, str]): Optional metadata stored with the batch
+
+    Returns:
+        str: ID of the created batch
+    """
+    with open(path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=ENDPOINT,
+        completion_window=COMPLETION_WINDOW,
+        metadata=metadata,
+    )
+    logger.info(f"Submitted batch {batch.id} from {path}")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id: str, poll_interval: float = 30.0, timeout: float = None):
+    """
+    Poll a batch until it reaches a terminal state.
+
+    Args:
+        client (OpenAI): Client used to query the batch
+        batch_id (str): ID of the batch
+        poll_interval (float): Seconds between status checks
+        timeout (float): Give up after this many seconds; None waits indefinitely
+
+    Returns:
+        The batch object in its latest state, which may not be terminal if
+        the timeout was reached
+    """
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        logger.info(
+            f"Batch {batch_id}: {batch.status}"
+            + (f" ({counts.completed}/{counts.total} done, {counts.failed} failed)" if counts else "")
+        )
+        if batch.status in TERMINAL_STATES:
+            return batch
+        if timeout is not None and time.monotonic() - started >= timeout:
+            return batch
+        time.sleep(poll_interval)
+
+
+def read_batch_results(client, batch) -> Dict[str, Union[str, Exception]]:
+    """
+    Download a finished batch's output and error files.
+
+    Args:
+        client (OpenAI): Client used to download the files
+        batch: Batch object in a terminal state
+
+    Returns:
+        Dict[str, Union[str, Exception]]: Message content per custom_id, or the
+            error for requests that failed
+    """
+    results: Dict[str, Union[str, Exception]] = {}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record["custom_id"]
+            response = record.get("response") or {}
+            if record.get("error"):
+                results[custom_id] = RuntimeError(record["error"].get("message", str(record["error"])))
+            elif response.get("status_code") != 200:
+                message = response.get("body", {}).get("error", {}).get("message", "request failed")
+                results[custom_id] = RuntimeError(f"HTTP {response.get('status_code')}: {message}")
+            else:
+                results[custom_id] = response["body"]["choices"][0]["message"]["content"]
+    return results
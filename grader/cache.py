@@ -0,0 +1,145 @@
+"""Persistent, content-addressed cache for grading results."""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path(".grader_cache.sqlite")
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def cache_key(
+    files: List[Tuple[str, str]],
+    guidelines: str,
+    student_comment: str,
+    max_points: int,
+    model: str,
+    prompt_version: str,
+) -> str:
+    """
+    Compute a content hash identifying a grading request.
+
+    Every input that can change the model's answer goes into the hash, so
+    editing a student's file, the guidelines or the prompt invalidates the entry.
+
+    Args:
+    files (list): A list of tuples containing file names and their contents.
+    guidelines (str): The assignment guidelines.
+    student_comment (str): Any comments provided by the student.
+    max_points (int): The maximum number of points for the assignment.
+    model (str): The model used for grading.
+    prompt_version (str): Version of the grading prompt template.
+
+    Returns:
+    str: Hex SHA-256 digest of the request.
+    """
+    payload = json.dumps(
+        {
+            "files": [[name, content] for name, content in files],
+            "guidelines": guidelines,
+            "student_comment": student_comment,
+            "max_points": max_points,
+            "model": model,
+            "prompt_version": prompt_version,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class GradeCache:
+    """
+    SQLite-backed cache of parsed grading results with LRU eviction.
+
+    The cache is safe to share between grading threads. Hit and miss counts
+    are kept for the lifetime of the instance so a run can report them.
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """
+        Open (or create) the cache database.
+
+        Args:
+            path (Path): Location of the SQLite file
+            max_entries (int): Maximum number of results kept before evicting
+                the least recently used ones
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON results (last_used)")
+        self._conn.commit()
+
+    def get(self, key: str, record_miss: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result and mark it as recently used.
+
+        Args:
+            key (str): Key produced by `cache_key`
+            record_miss (bool): Count a miss in the statistics; hits are always counted
+
+        Returns:
+            Optional[Dict]: The cached result, or None on a miss
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                if record_miss:
+                    self.misses += 1
+                return None
+            self._conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """
+        Store a result, evicting the least recently used entries if over capacity.
+
+        Args:
+            key (str): Key produced by `cache_key`
+            result (Dict): Parsed grading result
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(result), time.time()),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> str:
+        """Return a one-line summary of cache hits and misses."""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"Cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate)"
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
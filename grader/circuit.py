@@ -0,0 +1,241 @@
+"""Circuit breaker that pauses grading while the API is failing for everyone."""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
+
+import openai
+
+from grader.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+STOPPED = "stopped"
+
+# How often callers waiting on an open circuit re-check its state
+_POLL_INTERVAL = 0.5
+
+
+class CircuitOpenError(Exception):
+    """Raised when the circuit breaker has given up on the API."""
+
+
+def is_systemic(error: BaseException) -> bool:
+    """
+    Check whether an error says the API is unusable rather than this one request being bad.
+
+    Exhausted quota, bad credentials, an unknown model, server errors and
+    connection failures are systemic. Ordinary rate limits and unparseable
+    model output are not.
+
+    Args:
+        error (BaseException): Error raised by a grading attempt
+
+    Returns:
+        bool: True if the error should count against the circuit
+    """
+    if isinstance(error, openai.RateLimitError):
+        return getattr(error, "code", None) == "insufficient_quota"
+    if isinstance(error, (openai.APIConnectionError, openai.AuthenticationError,
+                          openai.PermissionDeniedError, openai.NotFoundError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    """
+    Stops dispatching API calls after repeated systemic failures.
+
+    The circuit opens after `failure_threshold` consecutive systemic failures,
+    or when at least `failure_ratio` of the last `window` calls failed. While
+    open, callers wait. After `cooldown` seconds a single caller is let through
+    as a half-open probe: if it succeeds the circuit closes and everyone
+    resumes; if it fails the circuit reopens. After `max_probes` failed probes
+    in a row the breaker stops for good, `on_stop` is called, and every waiting
+    and later caller gets `CircuitOpenError`.
+
+    The breaker is shared by all grading threads and tasks.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        window: int = 20,
+        failure_ratio: float = 0.5,
+        cooldown: float = 30.0,
+        max_probes: int = 3,
+        on_stop: Optional[Callable[[], None]] = None,
+    ):
+        """
+        Initialize the breaker.
+
+        Args:
+            failure_threshold (int): Consecutive systemic failures that open the circuit
+            window (int): Number of recent calls considered for the failure ratio
+            failure_ratio (float): Share of failed calls in a full window that opens the circuit
+            cooldown (float): Seconds to wait before sending a probe
+            max_probes (int): Failed probes in a row before the run is stopped
+            on_stop (Optional[Callable]): Called once when the breaker gives up
+        """
+        self.failure_threshold = failure_threshold
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.max_probes = max_probes
+        self.on_stop = on_stop
+
+        self.state = CLOSED
+        self.trips = 0
+        self.last_error: Optional[str] = None
+        self._consecutive = 0
+        self._failed_probes = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    @property
+    def stopped(self) -> bool:
+        """True once the breaker has given up on the API."""
+        return self.state == STOPPED
+
+    def _admit(self) -> Optional[float]:
+        """
+        Decide whether a caller may proceed; must hold the lock.
+
+        Returns:
+            Optional[float]: None to proceed, otherwise seconds to wait before
+                asking again. A caller let through an open circuit is the probe.
+
+        Raises:
+            CircuitOpenError: If the breaker has stopped
+        """
+        if self.state == STOPPED:
+            raise CircuitOpenError(f"API circuit breaker stopped grading after repeated failures ({self.last_error})")
+        if self.state == CLOSED:
+            return None
+        if self.state == OPEN and not self._probing:
+            wait = self._opened_at + self.cooldown - time.monotonic()
+            if wait <= 0:
+                self.state = HALF_OPEN
+                self._probing = True
+                logger.info("Circuit half-open; sending a probe request")
+                return None
+            return wait
+        return _POLL_INTERVAL
+
+    def _record(self, error: Optional[BaseException], probe: bool) -> None:
+        """Record the outcome of a call; must hold the lock."""
+        if probe:
+            self._probing = False
+
+        if error is None or not is_systemic(error):
+            self._consecutive = 0
+            self._outcomes.append(True)
+            if self.state in (OPEN, HALF_OPEN):
+                logger.info("Circuit closed; API calls are succeeding again")
+                self.state = CLOSED
+                self._failed_probes = 0
+                self._outcomes.clear()
+            self._changed.notify_all()
+            return
+
+        self.last_error = f"{type(error).__name__}: {error}"
+        self._consecutive += 1
+        self._outcomes.append(False)
+
+        if probe:
+            self._failed_probes += 1
+            if self._failed_probes >= self.max_probes:
+                self._stop()
+            else:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                logger.warning(
+                    f"Probe failed ({self.last_error}); retrying in {self.cooldown:.0f}s "
+                    f"({self._failed_probes}/{self.max_probes})"
+                )
+        elif self.state == CLOSED and self._should_trip():
+            self.state = OPEN
+            self.trips += 1
+            self._opened_at = time.monotonic()
+            logger.warning(f"Circuit opened after repeated API failures ({self.last_error}); pausing {self.cooldown:.0f}s")
+        self._changed.notify_all()
+
+    def _should_trip(self) -> bool:
+        if self._consecutive >= self.failure_threshold:
+            return True
+        outcomes = self._outcomes
+        return len(outcomes) == outcomes.maxlen and outcomes.count(False) >= self.failure_ratio * len(outcomes)
+
+    def _stop(self) -> None:
+        self.state = STOPPED
+        logger.error(f"Circuit breaker stopped grading: the API is still failing ({self.last_error})")
+        if self.on_stop is not None:
+            self.on_stop()
+
+    def _release(self, probe: bool, error: Optional[Exception]) -> None:
+        """Record how a guarded call ended."""
+        with self._lock:
+            if isinstance(error, (DeadlineExceeded, CircuitOpenError, asyncio.CancelledError)):
+                # The call never reached the API; it says nothing about its health
+                if probe:
+                    self._probing = False
+                    if self.state == HALF_OPEN:
+                        self.state = OPEN
+                    self._changed.notify_all()
+            else:
+                self._record(error, probe)
+
+    @contextmanager
+    def guard(self):
+        """
+        Wrap one API call: wait while the circuit is open, then record the outcome.
+
+        Raises:
+            CircuitOpenError: If the breaker has stopped
+        """
+        with self._changed:
+            while True:
+                wait = self._admit()
+                if wait is None:
+                    break
+                self._changed.wait(wait)
+            probe = self.state == HALF_OPEN
+        try:
+            yield
+        except Exception as e:
+            self._release(probe, e)
+            raise
+        self._release(probe, None)
+
+    @asynccontextmanager
+    async def async_guard(self):
+        """Asynchronous version of `guard` for use on an event loop."""
+        while True:
+            with self._lock:
+                wait = self._admit()
+                probe = self.state == HALF_OPEN
+            if wait is None:
+                break
+            await asyncio.sleep(min(wait, _POLL_INTERVAL))
+        try:
+            yield
+        except (Exception, asyncio.CancelledError) as e:
+            self._release(probe, e)
+            raise
+        self._release(probe, None)
+
+    def summary(self) -> str:
+        """Return a one-line report of the breaker's activity."""
+        if self.state == STOPPED:
+            return f"Circuit breaker: stopped the run after {self.trips} trips ({self.last_error})"
+        return f"Circuit breaker: tripped {self.trips} times, currently {self.state}"
@@ -0,0 +1,446 @@
+"""Shared, lazily created OpenAI clients, balanced across a pool of API keys and endpoints."""
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, replace
+from typing import List, Optional
+
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+# Use the HTTP library the installed SDK is built on: newer openai releases
+# moved from httpx to its httpx2 fork, and transports must match the client
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Seconds an endpoint is kept out of rotation after its first error; doubles per
+# consecutive error up to MAX_COOLDOWN
+BASE_COOLDOWN = 5.0
+MAX_COOLDOWN = 300.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+@dataclass(frozen=True)
+class ClientConfig:
+    """
+    Connection settings shared by the sync and async clients.
+
+    Attributes:
+        max_connections (int): Connection pool size per endpoint; should follow
+            the configured grading concurrency
+        keepalive_expiry (float): Seconds an idle pooled connection is kept open
+        connect_timeout (float): Seconds allowed to establish a connection
+        read_timeout (float): Seconds allowed between bytes of a response;
+            reasoning models can think for minutes before the first byte
+        base_url (Optional[str]): Alternative endpoint, e.g. an
+            OpenAI-compatible local server; defaults to OPENAI_BASE_URL
+        api_key (Optional[str]): API key; defaults to OPENAI_API_KEY
+        max_retries (int): Retries done by the SDK itself. Grading calls are
+            retried by grader.retry, so this is 0 by default
+    """
+    max_connections: int = 32
+    keepalive_expiry: float = 60.0
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    base_url: Optional[str] = None
+    api_key: Optional[str] = None
+    max_retries: int = 0
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+
+
+@dataclass(frozen=True)
+class EndpointConfig:
+    """
+    One API key and base URL in the pool.
+
+    Attributes:
+        api_key (Optional[str]): API key; defaults to the client config's key
+        base_url (Optional[str]): Base URL; defaults to the client config's URL
+        name (Optional[str]): Label used in logs and summaries
+    """
+    api_key: Optional[str] = None
+    base_url: Optional[str] = None
+    name: Optional[str] = None
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse a rate-limit reset duration such as "1s", "20ms" or "6m0s".
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        Optional[float]: Seconds, or None if the value is not a duration
+    """
+    parts = _DURATION_PART.findall(value or "")
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class Endpoint:
+    """
+    A pooled endpoint: its clients, its reported rate-limit headroom and its health.
+
+    Every response updates the headroom from the x-ratelimit-* headers; 429s,
+    5xx, auth failures and connection errors take the endpoint out of rotation
+    for a cooldown that grows while the errors continue.
+    """
+
+    def __init__(self, config: EndpointConfig, client_config: ClientConfig):
+        self.api_key = config.api_key or client_config.api_key or os.getenv("OPENAI_API_KEY")
+        self.base_url = config.base_url or client_config.base_url or os.getenv("OPENAI_BASE_URL") or None
+        self.name = config.name or self.base_url or "api.openai.com"
+        self._client_config = client_config
+        self._client: Optional[OpenAI] = None
+        self._async_client: Optional[AsyncOpenAI] = None
+        # The async client's connection pool belongs to the loop it was created on
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self._consecutive_errors = 0
+        self.unhealthy_until = 0.0
+        self._limit_requests: Optional[int] = None
+        self._remaining_requests: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._limit_tokens: Optional[int] = None
+        self._remaining_tokens: Optional[int] = None
+        self._tokens_reset_at = 0.0
+        self._lock = threading.Lock()
+
+    def _client_kwargs(self):
+        return {
+            "api_key": self.api_key,
+            "base_url": self.base_url,
+            "timeout": self._client_config._timeout(),
+            "max_retries": self._client_config.max_retries,
+        }
+
+    def client(self) -> OpenAI:
+        """Return this endpoint's OpenAI client, creating it on first use."""
+        with self._lock:
+            if self._client is None:
+                transport = _TrackingTransport(self, limits=self._client_config._limits())
+                self._client = OpenAI(
+                    http_client=DefaultHttpxClient(transport=transport, timeout=self._client_config._timeout()),
+                    **self._client_kwargs(),
+                )
+            return self._client
+
+    def async_client(self) -> AsyncOpenAI:
+        """
+        Return this endpoint's AsyncOpenAI client for the running event loop.
+
+        The client is created on first use and rebuilt when called from a
+        different loop (e.g. a second `asyncio.run`), since its pooled
+        keep-alive connections cannot outlive the loop that opened them.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._async_client is None or self._async_loop is not loop:
+                self._async_loop = loop
+                transport = _AsyncTrackingTransport(self, limits=self._client_config._limits())
+                self._async_client = AsyncOpenAI(
+                    http_client=DefaultAsyncHttpxClient(transport=transport, timeout=self._client_config._timeout()),
+                    **self._client_kwargs(),
+                )
+            return self._async_client
+
+    def headroom(self, now: float) -> float:
+        """
+        Share of this endpoint's rate limit still available (0-1), net of requests in flight.
+
+        Limits whose reset time has passed, or that were never reported, count as full.
+        """
+        with self._lock:
+            fractions = []
+            for remaining, limit, reset_at in (
+                (self._remaining_requests, self._limit_requests, self._requests_reset_at),
+                (self._remaining_tokens, self._limit_tokens, self._tokens_reset_at),
+            ):
+                if remaining is not None and limit and now < reset_at:
+                    fractions.append(remaining / limit)
+            headroom = min(fractions) if fractions else 1.0
+            if self._limit_requests:
+                headroom -= self.in_flight / self._limit_requests
+            return headroom
+
+    def available(self, now: float) -> bool:
+        """Whether the endpoint is in rotation."""
+        return now >= self.unhealthy_until
+
+    def _started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def _finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_response(self, response: httpx.Response) -> None:
+        """Update headroom and health from a response."""
+        headers = response.headers
+        now = time.monotonic()
+        with self._lock:
+            for kind in ("requests", "tokens"):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}", ""))
+                if remaining is None or not remaining.isdigit():
+                    continue
+                setattr(self, f"_remaining_{kind}", int(remaining))
+                if limit is not None and limit.isdigit():
+                    setattr(self, f"_limit_{kind}", int(limit))
+                setattr(self, f"_{kind}_reset_at", now + (reset if reset is not None else 60.0))
+
+        status = response.status_code
+        if status == 429:
+            try:
+                retry_after = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = None
+            self.record_error("HTTP 429", cooldown=retry_after)
+        elif status >= 500 or status in (401, 403):
+            self.record_error(f"HTTP {status}")
+        elif status < 400:
+            with self._lock:
+                self._consecutive_errors = 0
+
+    def record_error(self, reason: str, cooldown: Optional[float] = None) -> None:
+        """
+        Take the endpoint out of rotation after an error.
+
+        Args:
+            reason (str): What went wrong, for the log
+            cooldown (Optional[float]): Seconds out of rotation; defaults to an
+                exponential backoff on consecutive errors
+        """
+        with self._lock:
+            self.errors += 1
+            self._consecutive_errors += 1
+            if cooldown is None:
+                cooldown = min(MAX_COOLDOWN, BASE_COOLDOWN * 2 ** (self._consecutive_errors - 1))
+            self.unhealthy_until = max(self.unhealthy_until, time.monotonic() + cooldown)
+        logger.warning(f"Endpoint {self.name} out of rotation for {cooldown:.1f}s ({reason})")
+
+
+class _TrackingTransport(httpx.BaseTransport):
+    """HTTP transport that reports every request's outcome to its endpoint."""
+
+    def __init__(self, endpoint: Endpoint, **kwargs):
+        self._endpoint = endpoint
+        self._inner = httpx.HTTPTransport(**kwargs)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self._endpoint._started()
+        try:
+            response = self._inner.handle_request(request)
+        except httpx.TransportError as e:
+            self._endpoint.record_error(type(e).__name__)
+            raise
+        finally:
+            self._endpoint._finished()
+        self._endpoint.record_response(response)
+        return response
+
+    def close(self) -> None:
+        self._inner.close()
+
+
+class _AsyncTrackingTransport(httpx.AsyncBaseTransport):
+    """Asynchronous version of `_TrackingTransport`."""
+
+    def __init__(self, endpoint: Endpoint, **kwargs):
+        self._endpoint = endpoint
+        self._inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._endpoint._started()
+        try:
+            response = await self._inner.handle_async_request(request)
+        except httpx.TransportError as e:
+            self._endpoint.record_error(type(e).__name__)
+            raise
+        finally:
+            self._endpoint._finished()
+        self._endpoint.record_response(response)
+        return response
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+_config = ClientConfig()
+# None until first use, then OPENAI_API_KEYS or the single default endpoint
+_endpoint_configs: Optional[List[EndpointConfig]] = None
+_endpoints: Optional[List[Endpoint]] = None
+_lock = threading.Lock()
+
+
+def configure_client(**settings) -> ClientConfig:
+    """
+    Change the client settings; clients are rebuilt on next use.
+
+    Call this before grading starts, e.g. to size the pool for `--threads`.
+
+    Args:
+        **settings: Any `ClientConfig` field
+
+    Returns:
+        ClientConfig: The new settings
+    """
+    global _config, _endpoints
+    with _lock:
+        _config = replace(_config, **settings)
+        _endpoints = None
+        return _config
+
+
+def configure_endpoints(endpoints: List[EndpointConfig]) -> None:
+    """
+    Replace the pool of API keys and base URLs that requests are balanced across.
+
+    Args:
+        endpoints (List[EndpointConfig]): At least one endpoint
+    """
+    global _endpoint_configs, _endpoints
+    if not endpoints:
+        raise ValueError("At least one endpoint is required")
+    with _lock:
+        _endpoint_configs = list(endpoints)
+        _endpoints = None
+
+
+def load_endpoints(path: Optional[str] = None) -> List[EndpointConfig]:
+    """
+    Read the endpoint pool from a JSON file or the OPENAI_API_KEYS variable.
+
+    The file holds a list of objects with optional "name", "base_url",
+    "api_key" and "api_key_env" (the name of a variable holding the key, so
+    keys need not be written to the file). OPENAI_API_KEYS is a
+    comma-separated list of keys for the default base URL.
+
+    Args:
+        path (Optional[str]): JSON file, or None to use OPENAI_API_KEYS
+
+    Returns:
+        List[EndpointConfig]: The configured endpoints; empty if none are configured
+
+    Raises:
+        ValueError: If the file is malformed or names a missing variable
+    """
+    if path is None:
+        keys = [k.strip() for k in os.getenv("OPENAI_API_KEYS", "").split(",") if k.strip()]
+        return [EndpointConfig(api_key=key, name=f"key {i + 1}") for i, key in enumerate(keys)]
+
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError(f"{path} must contain a JSON list of endpoint objects")
+
+    endpoints = []
+    for i, entry in enumerate(entries):
+        api_key = entry.get("api_key")
+        if entry.get("api_key_env"):
+            api_key = os.getenv(entry["api_key_env"])
+            if not api_key:
+                raise ValueError(f"Environment variable {entry['api_key_env']} is not set")
+        endpoints.append(EndpointConfig(
+            api_key=api_key,
+            base_url=entry.get("base_url"),
+            name=entry.get("name") or f"endpoint {i + 1}",
+        ))
+    return endpoints
+
+
+def _configs() -> List[EndpointConfig]:
+    """Return the endpoint configs, reading OPENAI_API_KEYS on first use; must hold the lock."""
+    global _endpoint_configs
+    if _endpoint_configs is None:
+        _endpoint_configs = load_endpoints() or [EndpointConfig()]
+    return _endpoint_configs
+
+
+def _get_endpoints() -> List[Endpoint]:
+    global _endpoints
+    with _lock:
+        if _endpoints is None:
+            _endpoints = [Endpoint(config, _config) for config in _configs()]
+        return _endpoints
+
+
+def pick_endpoint() -> Endpoint:
+    """
+    Choose the endpoint with the most rate-limit headroom.
+
+    Endpoints out of rotation are skipped; if every endpoint is, the one that
+    comes back soonest is used. Ties go to the endpoint with the fewest
+    requests in flight, then the fewest sent.
+
+    Returns:
+        Endpoint: The endpoint for the next request
+    """
+    endpoints = _get_endpoints()
+    if len(endpoints) == 1:
+        return endpoints[0]
+    now = time.monotonic()
+    healthy = [e for e in endpoints if e.available(now)]
+    if not healthy:
+        return min(endpoints, key=lambda e: e.unhealthy_until)
+    return max(healthy, key=lambda e: (e.headroom(now), -e.in_flight, -e.requests))
+
+
+def get_client(balance: bool = True) -> OpenAI:
+    """
+    Return a shared OpenAI client, creating it on first use.
+
+    Args:
+        balance (bool): Pick the endpoint with the most capacity. Pass False
+            for calls that must always reach the same key, such as Batch API
+            jobs, which only exist under the key that created them
+
+    Returns:
+        OpenAI: Client bound to the chosen endpoint
+    """
+    return (pick_endpoint() if balance else _get_endpoints()[0]).client()
+
+
+def get_async_client(balance: bool = True) -> AsyncOpenAI:
+    """Return a shared AsyncOpenAI client; see `get_client`."""
+    return (pick_endpoint() if balance else _get_endpoints()[0]).async_client()
+
+
+def endpoint_count() -> int:
+    """Return the number of endpoints requests are balanced across."""
+    with _lock:
+        return len(_configs())
+
+
+def endpoint_summary() -> str:
+    """Return a report of how requests were spread over the endpoint pool."""
+    lines = ["Endpoints:"]
+    for endpoint in _get_endpoints():
+        lines.append(f"  {endpoint.name}: {endpoint.requests} requests, {endpoint.errors} errors")
+    return "\n".join(lines)
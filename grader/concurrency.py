@@ -0,0 +1,195 @@
+"""Adaptive concurrency control for grading API calls."""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Deque, List, Tuple
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """
+    Check whether an error means the API is overloaded or rate limiting us.
+
+    Args:
+        error (BaseException): Error raised by an API call
+
+    Returns:
+        bool: True for 429s and timeouts, which should shrink concurrency
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) == 429
+
+
+class AdaptiveConcurrency:
+    """
+    AIMD (additive increase, multiplicative decrease) limit on in-flight requests.
+
+    The limit grows by roughly one slot per "window" of successful calls while
+    latency stays close to the best observed and the error rate is low. A 429 or
+    a timeout multiplies the limit by `backoff`, at most once per cooldown so a
+    burst of failures from the same overload only counts once. Every change of
+    the integer limit is logged and kept in `history`.
+
+    The same instance can gate worker threads (`slot`) or coroutines on a single
+    event loop (`async_slot`).
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        error_rate_threshold: float = 0.2,
+        window: int = 20,
+        cooldown: float = 5.0,
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            initial (int): Starting concurrency limit
+            minimum (int): Lowest the limit may drop to
+            maximum (int): Highest the limit may grow to
+            backoff (float): Multiplier applied to the limit on overload
+            latency_tolerance (float): Latency above this multiple of the best
+                observed latency stops the limit from growing
+            error_rate_threshold (float): Share of failed calls in the recent
+                window above which the limit backs off
+            window (int): Number of recent calls used for the error rate
+            cooldown (float): Seconds after a backoff during which further
+                overload errors do not shrink the limit again
+        """
+        if not 1 <= minimum <= maximum:
+            raise ValueError("Concurrency limits must satisfy 1 <= minimum <= maximum")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown = cooldown
+        self.history: List[Tuple[float, int]] = []
+
+        self._limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._best_latency = None
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._last_backoff = 0.0
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        # The asyncio condition belongs to one event loop; each asyncio.run gets its own
+        self._async_condition = None
+        self._async_loop = None
+        self._record()
+
+    @property
+    def limit(self) -> int:
+        """Current whole-number concurrency limit."""
+        return int(self._limit)
+
+    def _record(self) -> None:
+        """Append the current limit to the history, logging it if it changed."""
+        limit = self.limit
+        if self.history and self.history[-1][1] == limit:
+            return
+        elapsed = time.monotonic() - self._start
+        self.history.append((elapsed, limit))
+        logger.info(f"Concurrency limit set to {limit} at {elapsed:.1f}s ({self._in_flight} in flight)")
+
+    def _on_success(self, latency: float) -> None:
+        """Update the limit after a successful call. Caller holds the lock."""
+        self._outcomes.append(True)
+        if self._best_latency is None or latency < self._best_latency:
+            self._best_latency = latency
+        healthy = latency <= self._best_latency * self.latency_tolerance
+        # Only grow while the pool is actually saturated; otherwise the limit is not the bottleneck
+        if healthy and self._in_flight + 1 >= self.limit:
+            self._limit = min(self.maximum, self._limit + 1 / self._limit)
+
+    def _on_failure(self, error: BaseException) -> None:
+        """Update the limit after a failed call. Caller holds the lock."""
+        self._outcomes.append(False)
+        failures = self._outcomes.count(False)
+        too_many_errors = (
+            len(self._outcomes) == self._outcomes.maxlen
+            and failures / len(self._outcomes) > self.error_rate_threshold
+        )
+        now = time.monotonic()
+        if (is_overload_error(error) or too_many_errors) and now - self._last_backoff >= self.cooldown:
+            self._limit = max(self.minimum, self._limit * self.backoff)
+            self._last_backoff = now
+            logger.warning(f"Backing off concurrency after {type(error).__name__}")
+
+    def _finish(self, started: float, error: BaseException = None) -> None:
+        """Release a slot and feed the outcome to the controller. Caller holds the lock."""
+        self._in_flight -= 1
+        if error is None:
+            self._on_success(time.monotonic() - started)
+        else:
+            self._on_failure(error)
+        self._record()
+
+    @contextmanager
+    def slot(self):
+        """Block the calling thread until a slot is free, then hold it for the call."""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            with self._condition:
+                self._finish(started, e)
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._finish(started)
+            self._condition.notify_all()
+
+    def _loop_condition(self) -> asyncio.Condition:
+        """The asyncio condition for the running event loop, rebuilt when the loop changes."""
+        loop = asyncio.get_running_loop()
+        if self._async_loop is not loop:
+            self._async_condition = asyncio.Condition()
+            self._async_loop = loop
+        return self._async_condition
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Wait on the event loop until a slot is free, then hold it for the call."""
+        condition = self._loop_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.limit)
+            with self._lock:
+                self._in_flight += 1
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            with self._lock:
+                self._finish(started, error)
+            async with condition:
+                condition.notify_all()
+
+    def summary(self) -> str:
+        """Return a one-line description of how the limit moved during the run."""
+        limits = [limit for _, limit in self.history]
+        return (
+            f"Concurrency: started at {limits[0]}, ended at {limits[-1]}, "
+            f"ranged {min(limits)}-{max(limits)} over {len(limits) - 1} adjustments"
+        )
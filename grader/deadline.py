@@ -0,0 +1,74 @@
+"""Run-level deadlines and cooperative cancellation of grading calls."""
+import threading
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when grading is cancelled or its deadline has passed."""
+
+
+class Deadline:
+    """
+    A wall-clock limit for a run, plus a cancellation flag shared by all workers.
+
+    Grading calls check it before each attempt and bound each request's timeout
+    by the time left, so in-flight work winds down on its own once the deadline
+    passes. `cancel()` (e.g. on Ctrl-C) has the same effect immediately.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, request_timeout: Optional[float] = None):
+        """
+        Initialize the deadline.
+
+        Args:
+            seconds (Optional[float]): Seconds from now until the run must stop,
+                or None for no deadline
+            request_timeout (Optional[float]): Upper bound on any single request
+        """
+        self.expires_at = time.monotonic() + seconds if seconds is not None else None
+        self.request_timeout = request_timeout
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Stop the run now."""
+        self._cancelled.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None if there is no deadline."""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        """True once the run has been cancelled or its deadline has passed."""
+        return self._cancelled.is_set() or self.remaining() == 0.0
+
+    def check(self) -> None:
+        """Raise `DeadlineExceeded` if the run should stop."""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded("Grading was cancelled")
+        if self.remaining() == 0.0:
+            raise DeadlineExceeded("Grading deadline passed")
+
+    def timeout(self) -> Optional[float]:
+        """
+        Timeout to use for the next request.
+
+        Returns:
+            Optional[float]: The smaller of the per-request timeout and the time
+                left, or None if neither applies
+
+        Raises:
+            DeadlineExceeded: If the run should stop
+        """
+        self.check()
+        limits = [t for t in (self.request_timeout, self.remaining()) if t is not None]
+        return min(limits) if limits else None
+
+    def sleep(self, seconds: float) -> None:
+        """Sleep for up to `seconds`, waking early if the run is cancelled or expires."""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._cancelled.wait(seconds)
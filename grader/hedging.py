@@ -0,0 +1,162 @@
+"""Hedged requests to cut tail latency on slow grading calls."""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """
+    Sends a duplicate of a request that runs past a latency percentile.
+
+    Once enough latencies have been observed, a call still running after the
+    `percentile`-th recent latency gets a second, identical call. Whichever
+    returns a valid result first wins and the other is cancelled (on the event
+    loop) or abandoned (on threads, where a blocking call cannot be interrupted).
+    At most `max_ratio` of calls are ever hedged, which bounds the extra cost.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        max_ratio: float = 0.1,
+        window: int = 200,
+        min_samples: int = 20,
+        max_workers: int = 64,
+    ):
+        """
+        Initialize the hedger.
+
+        Args:
+            percentile (float): Latency percentile (0-100) after which to hedge
+            max_ratio (float): Maximum share of calls that may be hedged
+            window (int): Number of recent latencies the percentile is taken over
+            min_samples (int): Latencies needed before any call is hedged
+            max_workers (int): Threads available to run calls and their hedges
+        """
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+
+    def record(self, latency: float) -> None:
+        """Add the latency of a successful call to the recent window."""
+        with self._lock:
+            self._latencies.append(latency)
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call should be hedged, or None if too few samples."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def _start_call(self) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def _try_hedge(self) -> bool:
+        """Reserve a hedge if that keeps the hedged share under `max_ratio`."""
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def _timed(self, fn: Callable[[], Any]) -> Callable[[], Any]:
+        def run():
+            started = time.monotonic()
+            result = fn()
+            self.record(time.monotonic() - started)
+            return result
+        return run
+
+    def run(self, fn: Callable[[], Any]) -> Any:
+        """
+        Call `fn`, hedging it with a duplicate if it runs too long.
+
+        Args:
+            fn (Callable): Zero-argument function making one complete attempt;
+                it should raise if the response is not valid
+
+        Returns:
+            The result of whichever call succeeded first
+
+        Raises:
+            Exception: The primary call's error if every call failed
+        """
+        self._start_call()
+        primary = self._executor.submit(self._timed(fn))
+        delay = self.hedge_delay()
+        if delay is None or wait([primary], timeout=delay).done or not self._try_hedge():
+            return primary.result()
+
+        logger.info(f"Hedging request still running after {delay:.1f}s")
+        hedge = self._executor.submit(self._timed(fn))
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return future.result()
+        return primary.result()
+
+    async def run_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Asynchronous version of `run`; the losing call is cancelled."""
+        self._start_call()
+        primary = asyncio.ensure_future(self._timed_async(fn))
+        hedge = None
+        # Whatever ends this call, including the caller being cancelled while
+        # waiting out the hedge delay, no request is left running behind it
+        try:
+            delay = self.hedge_delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self._try_hedge():
+                return await primary
+
+            logger.info(f"Hedging request still running after {delay:.1f}s")
+            hedge = asyncio.ensure_future(self._timed_async(fn))
+            pending = {primary, hedge}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _timed_async(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await fn()
+        self.record(time.monotonic() - started)
+        return result
+
+    def summary(self) -> str:
+        """Return a one-line report of how many calls were hedged."""
+        return f"Hedging: {self.hedged} of {self.calls} requests hedged, {self.hedge_wins} won by the hedge"
@@ -0,0 +1,205 @@
+"""Locate and repair the JSON object in model output in a single pass."""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+# Characters that change the scanner's state outside strings, and inside them
+_STRUCTURE = re.compile(r'[{}\[\]",]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+_WHITESPACE = re.compile(r"\s*")
+_CLOSERS = {"{": "}", "[": "]"}
+# Literals that are complete even though the text ends right after them
+_LITERALS = ("true", "false", "null")
+
+# Accepts raw control characters (e.g. newlines) inside strings, which models emit
+_decoder = json.JSONDecoder(strict=False)
+
+
+@dataclass
+class ParsedJSON:
+    """
+    A JSON object decoded from model output.
+
+    Attributes:
+        value (Dict[str, Any]): The decoded object
+        text (str): The JSON text that was decoded, after any repairs
+        repairs (List[str]): Defects that were fixed, empty for well-formed output
+        recovered_fields (List[str]): Top-level fields whose values were cut
+            off and closed by the repair, so may be incomplete
+    """
+    value: Dict[str, Any]
+    text: str
+    repairs: List[str] = field(default_factory=list)
+    recovered_fields: List[str] = field(default_factory=list)
+
+
+def _looks_like_object(text: str, start: int) -> bool:
+    """Check whether the "{" at `start` opens a JSON object rather than a brace in prose."""
+    m = _WHITESPACE.match(text, start + 1)
+    return text[m.end():m.end() + 1] in ('"', "}")
+
+
+def _scan(text: str, start: int) -> Tuple[str, List[str], Optional[str], bool]:
+    """
+    Walk the object starting at `start`, fixing what can be fixed on the way.
+
+    Returns:
+        Tuple: The repaired text, the repairs made, the last top-level key seen,
+            and whether the text had to be cut back to the last complete value
+    """
+    stack: List[str] = []
+    cuts: List[int] = []          # trailing commas to drop
+    comma: Optional[int] = None   # a comma not yet followed by a value
+    safe = (start + 1, ("}",))    # last point the object could be cut and closed
+    expect_key = True
+    top_key: Optional[str] = None
+    open_string: Optional[int] = None
+    pos = start
+
+    while True:
+        m = _STRUCTURE.search(text, pos)
+        if m is None:
+            break
+        i = m.start()
+        ch = text[i]
+        if comma is not None and pos < i and not text[pos:i].isspace():
+            comma = None
+
+        if ch == '"':
+            j = i + 1
+            while True:
+                special = _STRING_SPECIAL.search(text, j)
+                if special is None:
+                    open_string = i
+                    break
+                if text[special.start()] == "\\":
+                    j = special.start() + 2
+                    continue
+                j = special.start() + 1
+                break
+            if open_string is not None:
+                if len(stack) == 1 and expect_key:
+                    top_key = text[i + 1:]
+                break
+            if len(stack) == 1 and expect_key:
+                top_key = text[i + 1:j - 1]
+                expect_key = False
+            comma = None
+            pos = j
+            continue
+
+        if ch in _CLOSERS:
+            comma = None
+            stack.append(_CLOSERS[ch])
+            safe = (i + 1, tuple(stack))
+        elif ch in "}]":
+            if comma is not None:
+                cuts.append(comma)
+                comma = None
+            if not stack or stack[-1] != ch:
+                raise ValueError(f"Mismatched {ch!r} at offset {i}")
+            stack.pop()
+            if not stack:
+                return _splice(text, start, i + 1, cuts), _comma_repairs(cuts), top_key, False
+        else:
+            comma = i
+            safe = (i, tuple(stack))
+            if len(stack) == 1:
+                expect_key = True
+        pos = i + 1
+
+    # The text ended inside the object: close whatever is still open
+    repairs = _comma_repairs(cuts)
+    body = _splice(text, start, len(text), cuts)
+    if open_string is not None:
+        body += '"'
+        repairs.append(f"closed string left open at offset {open_string}")
+    # A bare value at the very end (a number, "tru") may have been cut short:
+    # "8" could be the start of "85", so it is never taken as complete
+    tail = text[pos:].strip().lstrip(":").strip() if open_string is None else ""
+    if not tail or tail in _LITERALS:
+        closed = _close(body, stack)
+        try:
+            _decoder.decode(closed)
+            repairs.append(f"closed {len(stack)} unclosed brackets")
+            return closed, repairs, top_key, False
+        except json.JSONDecodeError:
+            pass
+
+    # The last value itself was cut short (a key, a number, "tru"): drop it
+    cut, open_at_cut = safe
+    cuts = [c for c in cuts if c < cut]
+    repairs = _comma_repairs(cuts) + [f"dropped incomplete value after offset {cut}"]
+    return _close(_splice(text, start, cut, cuts), list(open_at_cut)), repairs, top_key, True
+
+
+def _comma_repairs(cuts: List[int]) -> List[str]:
+    """Describe the trailing commas that were dropped."""
+    return [f"removed {len(cuts)} trailing commas"] if cuts else []
+
+
+def _splice(text: str, start: int, end: int, cuts: List[int]) -> str:
+    """Return text[start:end] without the characters at `cuts`."""
+    parts = []
+    for cut in cuts:
+        parts.append(text[start:cut])
+        start = cut + 1
+    parts.append(text[start:end])
+    return "".join(parts)
+
+
+def _close(body: str, stack: List[str]) -> str:
+    """Close the open containers in `stack`, dropping a dangling comma first."""
+    body = body.rstrip()
+    if body.endswith(","):
+        body = body[:-1]
+    return body + "".join(reversed(stack))
+
+
+def load_object(text: str) -> ParsedJSON:
+    """
+    Find and decode the outermost JSON object in model output.
+
+    Prose, markdown fences and stray braces around the object are skipped.
+    Well-formed objects are decoded straight from the original text. Otherwise
+    the object is scanned once, in linear time, to drop trailing commas and to
+    close an unterminated final string and any unclosed brackets, as happens
+    when a response is cut off by the token limit. A value that cannot be
+    completed (a half-written key or literal) is dropped, and so is a number
+    at the very end, which may have lost digits.
+
+    Args:
+        text (str): The model's message content
+
+    Returns:
+        ParsedJSON: The decoded object, with the repairs made and fields recovered
+
+    Raises:
+        ValueError: If the text contains no object that can be decoded or repaired
+    """
+    start = text.find("{")
+    while start != -1 and not _looks_like_object(text, start):
+        start = text.find("{", start + 1)
+    if start == -1:
+        raise ValueError("No valid JSON found in the response")
+
+    try:
+        value, end = _decoder.raw_decode(text, start)
+        return ParsedJSON(value, text[start:end])
+    except json.JSONDecodeError:
+        pass
+
+    repaired, repairs, top_key, dropped = _scan(text, start)
+    try:
+        value = _decoder.decode(repaired)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in API response: {e}")
+    truncated = any(r.startswith(("closed", "dropped")) for r in repairs)
+    recovered = []
+    if truncated and value:
+        last = next(reversed(value))
+        # After a cut the last remaining field is whole unless the cut was inside it
+        if not dropped or last == top_key:
+            recovered.append(last)
+    return ParsedJSON(value, repaired, repairs, recovered)
@@ -0,0 +1,141 @@
+"""Off-thread log handling, sampled payload logging and one-line timing records."""
+import atexit
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from queue import SimpleQueue
+from typing import Any, Dict, List, Optional, Union
+
+# Full requests and responses, logged at DEBUG; off unless enabled or given a sink
+payload_logger = logging.getLogger("grader.payload")
+
+# One structured line per API call
+timing_logger = logging.getLogger("grader.timing")
+
+_listeners: List[QueueListener] = []
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Queues records without formatting them.
+
+    The stock QueueHandler merges a record's arguments into its message on the
+    calling thread. Here that is left to the listener, so grading threads only
+    pay for creating the record and a queue put. Arguments must therefore not
+    be mutated after they are logged.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _SampleFilter(logging.Filter):
+    """Lets through a random share of records."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate >= 1 or random.random() < self.rate
+
+
+def enable_queue_logging(logger: Optional[logging.Logger] = None) -> QueueListener:
+    """
+    Move a logger's handlers behind a queue served by a background thread.
+
+    Formatting and I/O then happen on the listener thread instead of under
+    each handler's lock on the grading threads. Listeners are stopped, and
+    their queues drained, at interpreter exit or by `stop_queue_logging`.
+
+    Args:
+        logger (Optional[logging.Logger]): Logger whose handlers to move; the root logger by default
+
+    Returns:
+        QueueListener: The running listener
+    """
+    logger = logger or logging.getLogger()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    queue = SimpleQueue()
+    logger.addHandler(_DeferredQueueHandler(queue))
+    listener = QueueListener(queue, *handlers, respect_handler_level=True)
+    listener.start()
+    if not _listeners:
+        atexit.register(stop_queue_logging)
+    _listeners.append(listener)
+    return listener
+
+
+def stop_queue_logging() -> None:
+    """Write out everything still queued and stop the listener threads."""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def configure_payload_log(path: Union[str, Path], sample_rate: float = 1.0) -> QueueListener:
+    """
+    Write API payloads to their own file instead of the main log.
+
+    Args:
+        path (Union[str, Path]): File to append payloads to
+        sample_rate (float): Share of payload records to keep, from 0 to 1
+
+    Returns:
+        QueueListener: The listener writing the file
+    """
+    handler = logging.FileHandler(path, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+    payload_logger.setLevel(logging.DEBUG)
+    payload_logger.propagate = False
+    payload_logger.addFilter(_SampleFilter(sample_rate))
+    payload_logger.addHandler(handler)
+    return enable_queue_logging(payload_logger)
+
+
+class _TimingRecord:
+    """A timing record rendered as one line of JSON when (and if) it is written."""
+
+    def __init__(self, event: str, fields: Dict[str, Any]):
+        self.event = event
+        self.fields = dict(fields)
+
+    def __str__(self) -> str:
+        fields = dict(self.fields)
+        usage = fields.pop("usage", None)
+        if usage is not None:
+            fields["prompt_tokens"] = getattr(usage, "prompt_tokens", None)
+            fields["completion_tokens"] = getattr(usage, "completion_tokens", None)
+        return json.dumps({"event": self.event, **fields}, separators=(",", ":"), default=str)
+
+
+@contextmanager
+def timed(event: str, **fields):
+    """
+    Log how long a block took as one structured line on `grader.timing`.
+
+    The block can add fields (e.g. `usage`, the API's usage report) to the
+    dictionary it is given. Failures are logged with the exception type and
+    re-raised.
+
+    Args:
+        event (str): Name of the event
+        **fields: Fields to include in the record
+    """
+    started = time.monotonic()
+    fields["status"] = "ok"
+    try:
+        yield fields
+    except BaseException as e:
+        fields["status"] = "error"
+        fields["error"] = type(e).__name__
+        raise
+    finally:
+        fields["seconds"] = round(time.monotonic() - started, 3)
+        if timing_logger.isEnabledFor(logging.INFO):
+            timing_logger.info("%s", _TimingRecord(event, fields))
@@ -0,0 +1,485 @@
+"""
+Local stand-in for the parts of the OpenAI API used by the grader.
+
+Serves chat completions, file uploads and batches with canned grading results,
+so the CLI can be exercised end to end without an API key or cost:
+
+    python -m grader.mock_server --port 8000
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=test \\
+        python cli.py grade students requirements.txt --batch
+
+Completion latency can be made long-tailed (--latency, --latency-sigma,
+--tail-probability, --tail-multiplier) to exercise hedging and timeouts, and
+each API key can be given its own request limit (--rpm, --rate-window), sent
+back in x-ratelimit-* headers, to exercise load balancing across keys.
+Grouped grading requests can have submissions left out of the response
+(--group-drop) to exercise the fallback to grading them one at a time.
+Rubric compilation and grading against a rubric are answered too, as are
+the scores-only and feedback-only halves of two-phase grading. Latency can
+grow with the length of the answer (--token-latency), as it does for a real
+model, to show what asking for less output saves.
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+FAKE_RESULT = {
+    "syntax_check": [],
+    "compilation_test": {"compiles": True, "errors": []},
+    "logical_errors": [],
+    "runtime_simulation": {"status": "success", "summary": "Runs as expected.", "details": "Mock run."},
+    "requirements_assessment": [
+        {"requirement": "Program compiles and runs", "met": True, "explanation": "Mock assessment."}
+    ],
+    "code_quality": "Readable and well organized.",
+    "point_deductions": [{"reason": "Missing comments", "points": 5}],
+    "extra_credit": {"awarded": False, "points": 0, "reason": ""},
+    "final_score": 95,
+    "overall_assessment": "Solid submission.",
+    "improvement_suggestions": ["Add comments explaining the main loop."],
+    "comment_consideration": "No comment provided.",
+}
+
+# Per-file analysis requests (map-reduce grading) ask for this key instead
+_ANALYSIS_MARKER = '"files": ['
+_FILE_NAME = re.compile(r"^\s*File name: (.+)$", re.MULTILINE)
+
+# Grouped grading requests tag each submission with one of these lines
+_SUBMISSION_ID = re.compile(r"^\s*=== Submission (\S+) ===$", re.MULTILINE)
+
+# Rubric compilation requests ask for this key; grading against a rubric lists its IDs
+_RUBRIC_MARKER = '"requirements": ['
+_GUIDELINES = re.compile(r"Assignment Guidelines:\n(.*?)\n\s*Maximum Points: (\d+)", re.DOTALL)
+_RUBRIC_ID = re.compile(r"^\s*(R\d+) \(", re.MULTILINE)
+_DEDUCTION_ID = re.compile(r"^\s*(D\d+) \(-", re.MULTILINE)
+_STANDARD_DEDUCTIONS = [
+    {"reason": "Missing comments explaining the main logic of the program", "points": 5},
+    {"reason": "Output format does not exactly match the assignment's specification", "points": 3},
+]
+_EXPLANATION = "Mock explanation of how the submission meets or misses this requirement."
+
+# Two-phase grading asks for the grade and the written feedback under these headings
+_SCORES_MARKER = "Grade Only:"
+_FEEDBACK_MARKER = "Written Feedback:"
+_SCORE_FIELDS = ("requirements_assessment", "point_deductions", "extra_credit", "final_score")
+
+
+def _guideline_lines(prompt: str) -> List[str]:
+    """The non-empty lines of the guidelines quoted in a prompt."""
+    match = _GUIDELINES.search(prompt)
+    return [line.strip() for line in match.group(1).splitlines() if line.strip()] if match else []
+
+
+def fake_rubric(prompt: str) -> Dict[str, Any]:
+    """Build a rubric with one requirement per non-empty line of the guidelines."""
+    match = _GUIDELINES.search(prompt)
+    lines = _guideline_lines(prompt) or ["Program compiles and runs"]
+    max_points = int(match.group(2)) if match else 100
+    points = [max_points // len(lines)] * len(lines)
+    points[0] += max_points - sum(points)
+    return {
+        "requirements": [{"description": line, "points": p} for line, p in zip(lines, points)],
+        "deductions": _STANDARD_DEDUCTIONS,
+    }
+
+
+def fake_result(prompt: str) -> Dict[str, Any]:
+    """
+    A canned grading result for the guidelines in the prompt.
+
+    Requirements are restated and every one explained, and deductions give
+    their reasons in full, unless the prompt has a rubric; then both are
+    answered by ID and only unmet requirements are explained.
+    """
+    rubric_ids = _RUBRIC_ID.findall(prompt)
+    deduction_ids = _DEDUCTION_ID.findall(prompt)
+    if not rubric_ids:
+        lines = _guideline_lines(prompt)
+        if not lines:
+            return FAKE_RESULT
+        assessment = [
+            {"requirement": line, "met": random.random() < 0.8, "explanation": _EXPLANATION} for line in lines
+        ]
+        return {**FAKE_RESULT, "requirements_assessment": assessment, "point_deductions": _STANDARD_DEDUCTIONS}
+    assessment = [
+        {"id": rid, "met": met, "explanation": "" if met else _EXPLANATION}
+        for rid, met in ((rid, random.random() < 0.8) for rid in rubric_ids)
+    ]
+    deductions = [
+        {"id": did, "points": d["points"], "reason": ""} for did, d in zip(deduction_ids, _STANDARD_DEDUCTIONS)
+    ]
+    return {**FAKE_RESULT, "requirements_assessment": assessment, "point_deductions": deductions}
+
+
+def fake_scores(prompt: str) -> Dict[str, Any]:
+    """The grade alone, without feedback or requirement explanations."""
+    result = fake_result(prompt)
+    scores = {field: result[field] for field in _SCORE_FIELDS}
+    scores["requirements_assessment"] = [
+        {k: v for k, v in req.items() if k != "explanation"} for req in result["requirements_assessment"]
+    ]
+    return scores
+
+
+def fake_feedback(prompt: str) -> Dict[str, Any]:
+    """The written feedback for the grade quoted in the prompt, one explanation per requirement."""
+    grade = prompt.split(_FEEDBACK_MARKER, 1)[1]
+    feedback = {k: v for k, v in FAKE_RESULT.items() if k not in _SCORE_FIELDS}
+    feedback["requirement_explanations"] = ["Mock explanation."] * grade.count('"met":')
+    return feedback
+
+
+def fake_analysis(prompt: str) -> Dict[str, Any]:
+    """Build a canned per-file analysis for every file named in the prompt."""
+    return {"files": [
+        {
+            "file": name,
+            "summary": "Mock summary.",
+            "syntax_errors": [],
+            "compilation_issues": [],
+            "logical_errors": [],
+            "requirements_evidence": ["Mock evidence."],
+            "code_quality": "Readable.",
+        }
+        for name in _FILE_NAME.findall(prompt)
+    ]}
+
+
+class MockState:
+    """In-memory files and batches shared by all request handlers."""
+
+    def __init__(self, latency: float = 0.0, latency_sigma: float = 0.0,
+                 tail_probability: float = 0.0, tail_multiplier: float = 10.0,
+                 batch_delay: float = 0.0, rpm: int = 0, rate_window: float = 60.0,
+                 group_drop: float = 0.0, token_latency: float = 0.0):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.tail_probability = tail_probability
+        self.tail_multiplier = tail_multiplier
+        self.batch_delay = batch_delay
+        self.rpm = rpm
+        self.rate_window = rate_window
+        self.group_drop = group_drop
+        self.token_latency = token_latency
+        self.windows: Dict[str, Dict[str, float]] = {}
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.contents: Dict[str, bytes] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix: str) -> str:
+        with self.lock:
+            return f"{prefix}-mock{next(self.ids)}"
+
+    def take_request(self, api_key: str) -> Dict[str, str]:
+        """
+        Count a completion against the key's request limit.
+
+        Returns:
+            Dict[str, str]: Rate-limit headers to send, including "retry-after"
+                if the request is over the limit
+        """
+        if not self.rpm:
+            return {}
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(api_key)
+            if window is None or now - window["start"] >= self.rate_window:
+                window = self.windows[api_key] = {"start": now, "count": 0}
+            reset = window["start"] + self.rate_window - now
+            headers = {
+                "x-ratelimit-limit-requests": str(self.rpm),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+            if window["count"] >= self.rpm:
+                headers.update({"x-ratelimit-remaining-requests": "0", "retry-after": f"{reset:.3f}"})
+            else:
+                window["count"] += 1
+                headers["x-ratelimit-remaining-requests"] = str(self.rpm - window["count"])
+        return headers
+
+    def sample_latency(self) -> float:
+        """Draw a long-tailed latency: lognormal around `latency`, with occasional stragglers."""
+        latency = self.latency * random.lognormvariate(0, self.latency_sigma) if self.latency_sigma else self.latency
+        if random.random() < self.tail_probability:
+            latency *= self.tail_multiplier
+        return latency
+
+    def response_latency(self, completion: Dict[str, Any]) -> float:
+        """Latency of a completion: the sampled base plus the time to generate its tokens."""
+        return self.sample_latency() + self.token_latency * completion["usage"]["completion_tokens"]
+
+    def completion(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a chat completion for a request body."""
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []))
+        submission_ids = _SUBMISSION_ID.findall(prompt)
+        if submission_ids:
+            content = json.dumps({"results": [
+                {"submission_id": sid, **fake_result(prompt)}
+                for sid in submission_ids if random.random() >= self.group_drop
+            ]})
+        elif _ANALYSIS_MARKER in prompt:
+            content = json.dumps(fake_analysis(prompt))
+        elif _FEEDBACK_MARKER in prompt:
+            content = json.dumps(fake_feedback(prompt))
+        elif _SCORES_MARKER in prompt:
+            content = json.dumps(fake_scores(prompt))
+        elif _RUBRIC_MARKER in prompt:
+            content = json.dumps(fake_rubric(prompt))
+        else:
+            content = json.dumps(fake_result(prompt))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": self.new_id("chatcmpl"),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def add_file(self, filename: str, data: bytes, purpose: str) -> Dict[str, Any]:
+        file_id = self.new_id("file")
+        record = {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(data),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+        with self.lock:
+            self.files[file_id] = record
+            self.contents[file_id] = data
+        return record
+
+    def run_batch(self, batch: Dict[str, Any]) -> None:
+        """Answer every request in a batch's input file and mark it completed."""
+        lines = self.contents[batch["input_file_id"]].decode("utf-8").splitlines()
+        output = []
+        for line in filter(None, (l.strip() for l in lines)):
+            request = json.loads(line)
+            output.append(json.dumps({
+                "id": self.new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": "mock", "body": self.completion(request["body"])},
+                "error": None,
+            }))
+        out_file = self.add_file("batch_output.jsonl", ("\n".join(output) + "\n").encode("utf-8"), "batch_output")
+        batch.update(
+            status="completed",
+            output_file_id=out_file["id"],
+            completed_at=int(time.time()),
+            request_counts={"total": len(output), "completed": len(output), "failed": 0},
+        )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Routes the subset of API endpoints the grader uses."""
+
+    # Keep connections alive between requests, as the real API does, so client
+    # connection pools are exercised
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body: Dict[str, Any], headers: Dict[str, str], pieces: int = 20) -> None:
+        """Answer a streaming completion as server-sent events, spread over the sampled latency."""
+        completion = self.state.completion(body)
+        content = completion["choices"][0]["message"]["content"]
+        step = max(1, -(-len(content) // pieces))
+        delay = self.state.response_latency(completion) / pieces
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/event-stream")
+        # The event stream has no length, so it ends when the connection closes
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def event(choices, usage=None):
+            chunk = {
+                "id": completion["id"],
+                "object": "chat.completion.chunk",
+                "created": completion["created"],
+                "model": completion["model"],
+                "choices": choices,
+                "usage": usage,
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for i in range(0, len(content), step):
+            time.sleep(delay)
+            event([{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            event([], completion["usage"])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            body = json.loads(self._read_body())
+            api_key = self.headers.get("Authorization", "").removeprefix("Bearer ")
+            headers = self.state.take_request(api_key)
+            if "retry-after" in headers:
+                error = {"message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"}
+                self._send_json({"error": error}, 429, headers)
+                return
+            if body.get("stream"):
+                self._send_stream(body, headers)
+                return
+            completion = self.state.completion(body)
+            time.sleep(self.state.response_latency(completion))
+            self._send_json(completion, headers=headers)
+        elif path.endswith("/files"):
+            message = BytesParser(policy=default_policy).parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + self._read_body()
+            )
+            fields, filename, data = {}, "upload.jsonl", b""
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                if name == "file":
+                    filename = part.get_filename() or filename
+                    data = part.get_payload(decode=True)
+                else:
+                    fields[name] = part.get_content().strip()
+            self._send_json(self.state.add_file(filename, data, fields.get("purpose", "batch")))
+        elif path.endswith("/batches"):
+            body = json.loads(self._read_body())
+            if body.get("input_file_id") not in self.state.contents:
+                self._send_json({"error": {"message": "No such file", "type": "invalid_request_error"}}, 404)
+                return
+            batch = {
+                "id": self.state.new_id("batch"),
+                "object": "batch",
+                "endpoint": body["endpoint"],
+                "errors": None,
+                "input_file_id": body["input_file_id"],
+                "completion_window": body["completion_window"],
+                "status": "in_progress",
+                "output_file_id": None,
+                "error_file_id": None,
+                "created_at": int(time.time()),
+                "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                "metadata": body.get("metadata"),
+            }
+            with self.state.lock:
+                self.state.batches[batch["id"]] = batch
+            self._send_json(batch)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {path}"}}, 404)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+        if "batches" in parts and parts[-1] != "batches":
+            batch = self.state.batches.get(parts[-1])
+            if batch is None:
+                self._send_json({"error": {"message": "No such batch"}}, 404)
+                return
+            if batch["status"] == "in_progress" and time.time() - batch["created_at"] >= self.state.batch_delay:
+                self.state.run_batch(batch)
+            self._send_json(batch)
+        elif len(parts) >= 3 and parts[-1] == "content" and parts[-3] == "files":
+            data = self.state.contents.get(parts[-2])
+            if data is None:
+                self._send_json({"error": {"message": "No such file"}}, 404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json({"error": {"message": f"Unknown path {path}"}}, 404)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, **state_options) -> ThreadingHTTPServer:
+    """
+    Create a mock API server; call `serve_forever()` on the result to run it.
+
+    Args:
+        host (str): Interface to bind
+        port (int): Port to bind (0 picks a free port)
+        **state_options: Options passed to MockState
+
+    Returns:
+        ThreadingHTTPServer: The bound server
+    """
+    handler = type("BoundMockHandler", (MockHandler,), {"state": MockState(**state_options)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Median seconds to wait before answering a completion")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="Lognormal spread of completion latency")
+    parser.add_argument("--tail-probability", type=float, default=0.0, help="Chance a completion is a slow straggler")
+    parser.add_argument("--tail-multiplier", type=float, default=10.0, help="How much slower stragglers are")
+    parser.add_argument("--rpm", type=int, default=0, help="Completions allowed per API key per window (0 for unlimited)")
+    parser.add_argument("--rate-window", type=float, default=60.0, help="Length of the --rpm window in seconds")
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="Seconds before a batch reports completion")
+    parser.add_argument("--group-drop", type=float, default=0.0, help="Chance each submission is left out of a grouped response")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Extra seconds per completion token")
+    args = parser.parse_args()
+    server = serve(
+        args.host, args.port,
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        tail_probability=args.tail_probability,
+        tail_multiplier=args.tail_multiplier,
+        batch_delay=args.batch_delay,
+        rpm=args.rpm,
+        rate_window=args.rate_window,
+        group_drop=args.group_drop,
+        token_latency=args.token_latency,
+    )
+    print(f"Mock OpenAI API listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Token-aware planning of oversized submissions into chunks for map-reduce grading."""
+import re
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import List, Tuple
+
+from grader.tokens import count_tokens
+
+# Prompt tokens a single grading request may use. o1-preview has a 128k context
+# window and needs room for up to 32k output tokens.
+MAX_PROMPT_TOKENS = 90_000
+
+# Most analysis calls a single submission may fan out to
+MAX_CHUNKS = 8
+
+# Tokens of student code one grouped request may carry. Kept well below the
+# context limit, since each submission adds a full result to the response.
+DEFAULT_GROUP_TOKENS = 12_000
+
+# Directories holding third-party or generated code rather than the student's own
+VENDORED_DIRS = {
+    "lib", "libs", "vendor", "third_party", "thirdparty", "external", "deps",
+    "target", "build", "out", "bin", "dist", "node_modules", "generated",
+    ".git", ".idea", ".vscode", ".gradle", ".settings", "__macosx",
+}
+
+_MAIN_METHOD = re.compile(r"\bstatic\s+void\s+main\s*\(")
+
+
+def is_vendored(name: str) -> bool:
+    """Check whether a file lives in a vendored, build or IDE directory."""
+    return any(part.lower() in VENDORED_DIRS for part in PurePosixPath(name.replace("\\", "/")).parts[:-1])
+
+
+def file_priority(name: str, content: str) -> Tuple:
+    """
+    Sort key putting the files that matter most for grading first.
+
+    The policy, in order: the student's own files before vendored or generated
+    ones; Java sources before other text files; files with a main method
+    first; files nearer the root of the project first; then by name.
+
+    Args:
+        name (str): File name, possibly with a path inside the zip
+        content (str): File contents
+
+    Returns:
+        Tuple: Sort key; lower sorts first
+    """
+    path = PurePosixPath(name.replace("\\", "/"))
+    return (
+        is_vendored(name),
+        path.suffix.lower() != ".java",
+        not _MAIN_METHOD.search(content),
+        len(path.parts),
+        name,
+    )
+
+
+def truncate_to_tokens(content: str, tokens: int, budget: int) -> str:
+    """
+    Cut a file down to roughly `budget` tokens, keeping whole lines from the top.
+
+    Args:
+        content (str): File contents
+        tokens (int): Tokens in the full contents
+        budget (int): Tokens the result may use
+
+    Returns:
+        str: The head of the file with a marker saying how much was cut
+    """
+    keep = content[:int(len(content) * budget / tokens * 0.95)]
+    keep = keep[:keep.rfind("\n") + 1] or keep
+    dropped = content.count("\n") - keep.count("\n")
+    return f"{keep}// ... truncated {dropped} more lines to fit the request size\n"
+
+
+@dataclass
+class SubmissionPlan:
+    """
+    How a submission will be sent to the model.
+
+    Attributes:
+        chunks (List[List[Tuple[str, str]]]): Files for each request
+        map_reduce (bool): False if the single chunk is graded directly; True
+            if each chunk gets an analysis call followed by a grading call
+        omitted (List[str]): Files left out or truncated, with the reason
+        total_tokens (int): Tokens in all files as submitted
+    """
+    chunks: List[List[Tuple[str, str]]]
+    map_reduce: bool = False
+    omitted: List[str] = field(default_factory=list)
+    total_tokens: int = 0
+
+
+def plan_submission(
+    files: List[Tuple[str, str]],
+    budget: int,
+    grading_overhead: int,
+    analysis_overhead: int,
+    model: str,
+    max_chunks: int = MAX_CHUNKS,
+) -> SubmissionPlan:
+    """
+    Decide whether a submission can be graded in one request, and if not, how to split it.
+
+    Submissions that fit are sent whole, in their original order. Otherwise
+    vendored files are left out (unless there is nothing else), and if the rest
+    fits it is graded directly. If it still does not fit, the files are taken
+    in `file_priority` order and packed first-fit into at most `max_chunks`
+    chunks for per-file analysis. A file too large for any chunk is truncated,
+    and files that do not fit once every chunk is full are left out.
+
+    Args:
+        files (List[Tuple[str, str]]): File names and contents
+        budget (int): Prompt tokens allowed per request
+        grading_overhead (int): Tokens the grading prompt uses besides the files
+        analysis_overhead (int): Tokens an analysis prompt uses besides the files
+        model (str): Model whose tokenizer should be used
+        max_chunks (int): Most analysis requests to make
+
+    Returns:
+        SubmissionPlan: The chunks to send and the files left out
+    """
+    sized = [(name, content, count_tokens(f"File name: {name}\n{content}", model)) for name, content in files]
+    total = sum(tokens for _, _, tokens in sized)
+    if grading_overhead + total <= budget:
+        return SubmissionPlan([list(files)], total_tokens=total)
+
+    omitted = []
+    if any(not is_vendored(name) for name, _, _ in sized):
+        omitted = [f"{name}: skipped as vendored or generated code ({tokens} tokens)"
+                   for name, _, tokens in sized if is_vendored(name)]
+        sized = [f for f in sized if not is_vendored(f[0])]
+    if grading_overhead + sum(tokens for _, _, tokens in sized) <= budget:
+        return SubmissionPlan([[(name, content) for name, content, _ in sized]], False, omitted, total)
+
+    capacity = max(1, budget - analysis_overhead)
+    chunks: List[List[Tuple[str, str]]] = []
+    used: List[int] = []
+    for name, content, tokens in sorted(sized, key=lambda f: file_priority(f[0], f[1])):
+        if tokens > capacity:
+            content = truncate_to_tokens(content, tokens, capacity)
+            omitted.append(f"{name}: truncated from {tokens} tokens")
+            tokens = capacity
+        for i, chunk_tokens in enumerate(used):
+            if chunk_tokens + tokens <= capacity:
+                chunks[i].append((name, content))
+                used[i] += tokens
+                break
+        else:
+            if len(chunks) < max_chunks:
+                chunks.append([(name, content)])
+                used.append(tokens)
+            else:
+                omitted.append(f"{name}: left out, the submission exceeds {max_chunks} requests")
+    return SubmissionPlan(chunks, True, omitted, total)
+
+
+def pack_groups(sizes: List[int], budget: int, max_size: int) -> List[List[int]]:
+    """
+    Pack submissions into shared grading requests.
+
+    Submissions are taken in order and placed first-fit into groups of at
+    most `max_size` whose code together fits in `budget` tokens. A submission
+    too large to share a request is left in a group of its own.
+
+    Args:
+        sizes (List[int]): Tokens of code in each submission
+        budget (int): Tokens of student code allowed per request
+        max_size (int): Most submissions per request
+
+    Returns:
+        List[List[int]]: Indices into `sizes` for each request, in order
+    """
+    groups: List[List[int]] = []
+    used: List[int] = []
+    for index, tokens in enumerate(sizes):
+        for i, group in enumerate(groups):
+            if len(group) < max_size and used[i] + tokens <= budget:
+                group.append(index)
+                used[i] += tokens
+                break
+        else:
+            groups.append([index])
+            used.append(tokens)
+    return groups
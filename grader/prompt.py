@@ -0,0 +1,445 @@
+"""The grading prompt, compiled once per assignment and filled in per submission."""
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from grader.rubric import Rubric
+from grader.tokens import TOKENS_PER_MESSAGE, count_tokens
+
+# Fixed grading instructions and response schema. They open every prompt so that,
+# together with the assignment guidelines, they form a prefix shared by every
+# student in a class and can be served from the provider's prompt cache.
+GRADING_INSTRUCTIONS = """You are an experienced Java programming instructor and compiler expert tasked with grading student assignments.
+
+    Please grade the student's Java code, given at the end of this prompt, based on the assignment guidelines that follow these instructions. Keep in mind that this is likely the first CS class for most of these students, so be forgiving and lenient with deductions. Follow these steps:
+
+    1. Syntax Check:
+       - Analyze the code for any syntax errors as if you were a Java compiler.
+       - List any syntax errors found, including line numbers and descriptions.
+       - Be forgiving of minor syntax errors that don't significantly impact the code's functionality.
+       - Consider the file name when evaluating class name consistency.
+
+    2. Compilation Test:
+       - Assuming syntax is correct, check if the code would compile successfully.
+       - Identify any potential compilation errors, such as undefined variables or type mismatches.
+       - Consider partial credit for code that's close to compiling but has minor issues.
+       - Ignore errors that the file name doesn't match the class name as files have been renamed. 
+
+    3. Logical Error Detection:
+       - Analyze the code for logical errors or flaws in the implementation.
+       - Identify any discrepancies between the code's logic and the assignment requirements.
+       - Focus on major logical errors and be lenient with minor logical inconsistencies.
+
+    4. Runtime Behavior Simulation:
+       - Simulate running the program with various inputs.
+       - Provide a summary of the runtime behavior in the following format:
+         {
+           "status": "success" or "warning" or "error",
+           "summary": "A brief summary of the runtime behavior",
+           "details": "More detailed explanation of the runtime behavior, including any potential issues or unexpected results"
+         }
+       - Be forgiving of extreme edge cases or minor unexpected behaviors that don't detract from assignment requirements.
+
+    5. Requirements Assessment:
+       - List all requirements from the assignment guidelines.
+       - For each requirement, state whether it is met (true) or not met (false).
+       - If a requirement is partially met, mark it as false and explain the partial completion in the explanation.
+       - Provide a brief explanation for each requirement's assessment.
+
+    6. Code Quality and Style:
+       - Evaluate the code's readability, organization, and adherence to Java best practices.
+       - Focus on major style issues and be lenient with minor style inconsistencies.
+
+    7. Point Deductions:
+       - Start with the Maximum Points given with the assignment guidelines.
+       - Deduct points sparingly for syntax errors, compilation errors, logical errors, unmet requirements, and poor code quality.
+       - Be very forgiving and deduct minimal points for minor issues.
+       - Provide a clear reason for each deduction, focusing on learning opportunities rather than punishment.
+
+    8. Extra Credit:
+       - Extra credit should only be awarded for exceptional effort that clearly goes beyond the basic requirements of the assignment.
+       - Do not award extra credit simply for meeting all requirements or for code that works properly, as this is expected for the assignment.
+       - Look for innovative approaches, additional features, or exceptional code quality that demonstrates a deep understanding and significant extra effort.
+       - If extra credit is warranted, award up to 5 points and provide a clear explanation of why the work deserves extra credit. Most extra credit should be between 2-3 points, unless the work is truly exceptional.
+
+    9. Final Evaluation:
+       - Summarize the overall assessment of the code, highlighting the positive aspects.
+       - Provide constructive suggestions for improvement, focusing on the most important areas for growth.
+
+    Format your response as a JSON object with the following structure:
+    {
+        "syntax_check": [
+            {"line": number, "error": "string"}
+        ],
+        "compilation_test": {
+            "compiles": boolean,
+            "errors": [
+                "string"
+            ]
+        },
+        "logical_errors": [
+            "string"
+        ],
+        "runtime_simulation": {
+            "status": "string",
+            "summary": "string",
+            "details": "string"
+        },
+        "requirements_assessment": [
+            {"requirement": "string", "met": boolean, "explanation": "string"}
+        ],
+        "code_quality": "string",
+        "point_deductions": [
+            {"reason": "string", "points": number}
+        ],
+        "extra_credit": {
+            "awarded": boolean,
+            "points": number,
+            "reason": "string"
+        },
+        "final_score": number,
+        "overall_assessment": "string",
+        "improvement_suggestions": [
+            "string"
+        ],
+        "comment_consideration": "string"
+    }
+
+    Ensure that your response is a valid JSON object, and all values are JSON-parsable and of the correct type.
+"""
+
+# Instructions for the per-file analysis calls used when a submission is too
+# large to grade in one request. Their output is fed to a final grading call.
+ANALYSIS_INSTRUCTIONS = """You are an experienced Java programming instructor and compiler expert helping to grade a student project that is too large to review in one pass.
+
+    Below are the assignment guidelines and some of the project's files. Do not grade or score anything. For each file, report what a grader needs to know:
+    - A short summary of what the file does
+    - Syntax errors, with line numbers
+    - Anything that would stop the project from compiling
+    - Logical errors
+    - Which assignment requirements the file implements, partially implements or gets wrong
+    - Notable code quality or style issues
+
+    Format your response as a JSON object with the following structure:
+    {
+        "files": [
+            {
+                "file": "string",
+                "summary": "string",
+                "syntax_errors": [{"line": number, "error": "string"}],
+                "compilation_issues": ["string"],
+                "logical_errors": ["string"],
+                "requirements_evidence": ["string"],
+                "code_quality": "string"
+            }
+        ]
+    }
+
+    Ensure that your response is a valid JSON object, and all values are JSON-parsable and of the correct type.
+"""
+
+# Steps 5 and 7, their explanation guidance, and the requirements_assessment and point_deductions entries of
+# GRADING_INSTRUCTIONS, and their replacements when grading against a compiled rubric
+_REQUIREMENTS_STEP = "- List all requirements from the assignment guidelines."
+_RUBRIC_REQUIREMENTS_STEP = (
+    "- Assess every requirement in the grading rubric, in order, referring to it only by its ID (R1, R2, ...)."
+)
+_EXPLANATION_STEP = "- Provide a brief explanation for each requirement's assessment."
+_RUBRIC_EXPLANATION_STEP = (
+    "- Leave the explanation empty for a requirement that is met; for one that is not, briefly explain what is missing."
+)
+_REQUIREMENT_ENTRY = '{"requirement": "string", "met": boolean, "explanation": "string"}'
+_RUBRIC_REQUIREMENT_ENTRY = '{"id": "string", "met": boolean, "explanation": "string (empty if met)"}'
+_DEDUCTIONS_STEP = "- Provide a clear reason for each deduction, focusing on learning opportunities rather than punishment."
+_RUBRIC_DEDUCTIONS_STEP = (
+    "- Where one of the rubric's standard deductions applies, refer to it only by its ID (D1, D2, ...), with its points or fewer and an empty reason.\n"
+    "       - For any other deduction, use the ID \"other\" and give a clear reason, focusing on learning opportunities rather than punishment."
+)
+_DEDUCTION_ENTRY = '{"reason": "string", "points": number}'
+_RUBRIC_DEDUCTION_ENTRY = '{"id": "string", "points": number, "reason": "string (empty unless id is \\"other\\")"}'
+
+# Grading instructions used with a compiled rubric: requirements and standard deductions are answered by ID
+RUBRIC_GRADING_INSTRUCTIONS = GRADING_INSTRUCTIONS.replace(
+    "the assignment guidelines that follow these instructions", "the grading rubric that follows these instructions"
+).replace(_REQUIREMENTS_STEP, _RUBRIC_REQUIREMENTS_STEP).replace(_EXPLANATION_STEP, _RUBRIC_EXPLANATION_STEP).replace(
+    _REQUIREMENT_ENTRY, _RUBRIC_REQUIREMENT_ENTRY
+).replace(_DEDUCTIONS_STEP, _RUBRIC_DEDUCTIONS_STEP).replace(_DEDUCTION_ENTRY, _RUBRIC_DEDUCTION_ENTRY)
+
+# Instructions for compiling the guidelines into a numbered rubric, done once per assignment
+RUBRIC_INSTRUCTIONS = """You are an experienced Java programming instructor preparing to grade a class's submissions for the assignment below.
+
+    Turn the assignment guidelines into a grading rubric: a list of the distinct, individually checkable requirements a submission must meet. The rubric will be used in place of the guidelines, so:
+    - Make each description self-contained and specific, keeping any exact names, formats, inputs or outputs the guidelines require.
+    - Split compound requirements into separate entries, and do not list the same requirement twice.
+    - Leave out instructions that cannot be checked from the code, such as submission logistics.
+    - Give each requirement its share of the Maximum Points; the shares should add up to the maximum.
+
+    Also list the standard deductions you expect to apply to many students, such as a commonly missed requirement, a likely logical mistake or a code quality problem. Give each a short reason written for the student and the points it usually costs, keeping in mind that most students are new to programming. Graders will refer to these by number instead of rewriting the reason for every student.
+
+    Format your response as a JSON object with the following structure:
+    {
+        "requirements": [
+            {"description": "string", "points": number}
+        ],
+        "deductions": [
+            {"reason": "string", "points": number}
+        ]
+    }
+
+    Ensure that your response is a valid JSON object, and all values are JSON-parsable and of the correct type.
+"""
+
+# Replaces the student's code in the final grading call of a chunked submission
+_SUMMARIES_HEADER = """The project was too large to show in full, so each of its files was analyzed separately. Grade the project from these per-file analyses, treating them as your own review of the code.
+"""
+
+# Added after the guidelines when several students are graded in one request
+_GROUP_HEADER = """Student Submissions:
+    This request contains several independent student submissions. Each one starts with a line of the form "=== Submission <ID> ===" followed by its files. Grade every submission on its own, exactly as if it were the only one, and do not compare submissions or let one affect another's grade.
+
+    Respond with a JSON object of the form {"results": [...]}, holding one object per submission in the order given. Each object has a "submission_id" field set to the submission's ID, followed by every field of the structure above.
+
+    """
+
+# Added after the student's code in two-phase grading. Asking for a phase at the
+# end keeps the prompt's prefix identical to full grading, so it stays cached.
+_SCORES_REQUEST = """
+
+    Grade Only:
+    Follow the steps above, but respond with the grade alone: a JSON object with only the "requirements_assessment" (without explanations), "point_deductions", "extra_credit" and "final_score" fields of the structure above. Written feedback will be requested separately.
+    """
+_FEEDBACK_REQUEST = """
+
+    Written Feedback:
+    This submission has already been graded as follows, and the grade is final:
+    {grade}
+
+    Do not regrade it. Write the feedback explaining this grade: a JSON object with the "syntax_check", "compilation_test", "logical_errors", "runtime_simulation", "code_quality", "overall_assessment", "improvement_suggestions" and "comment_consideration" fields of the structure above, plus "requirement_explanations": a list with a brief explanation for each requirement in the grade, in the same order.
+    """
+
+# Text between the student's code and comment, and after the comment
+_COMMENT_HEADER = """
+
+    Student's Comment:
+    """
+_TRAILER = """
+    """
+
+
+def _criteria(guidelines: str, rubric: Optional[Rubric]) -> str:
+    """The section of a prompt stating what the assignment requires."""
+    if rubric is None:
+        return f"""Assignment Guidelines:
+    {guidelines}"""
+    rubric_text = rubric.render().replace("\n", "\n    ")
+    return f"""Grading Rubric:
+    {rubric_text}"""
+
+
+def build_rubric_messages(guidelines: str, max_points: int) -> List[Dict[str, str]]:
+    """
+    Build the messages asking for a numbered rubric compiled from the guidelines.
+
+    Args:
+        guidelines (str): The assignment guidelines
+        max_points (int): The maximum number of points for the assignment
+
+    Returns:
+        List[Dict[str, str]]: The messages to send to the chat completions API
+    """
+    prompt = f"""{RUBRIC_INSTRUCTIONS}
+    Assignment Guidelines:
+    {guidelines}
+
+    Maximum Points: {max_points}
+    """
+    return [{"role": "user", "content": prompt}]
+
+
+def _format_files(files: List[Tuple[str, str]]) -> str:
+    """Join a submission's files into the code section of the prompt."""
+    return "\n\n".join(f"File name: {file_name}\n{content}" for file_name, content in files)
+
+
+class PromptTemplate:
+    """
+    The grading prompt for one assignment, with the student's code left blank.
+
+    The instructions, schema, guidelines and maximum points are assembled once
+    when the template is created; `render` only joins the student's files and
+    comment onto that fixed prefix. The fixed part's token count is computed
+    once per model, so schedulers can size requests without re-tokenizing the
+    guidelines for every submission. With a compiled rubric, the rubric is sent
+    in place of the guidelines and requirements are answered by ID.
+    """
+
+    def __init__(self, guidelines: str, max_points: int, rubric: Optional[Rubric] = None):
+        """
+        Compile the template.
+
+        Args:
+            guidelines (str): The assignment guidelines
+            max_points (int): The maximum number of points for the assignment
+            rubric (Optional[Rubric]): Rubric compiled from the guidelines, to send instead of them
+        """
+        self.guidelines = guidelines
+        self.max_points = max_points
+        self.rubric = rubric
+        instructions = GRADING_INSTRUCTIONS if rubric is None else RUBRIC_GRADING_INSTRUCTIONS
+        criteria = _criteria(guidelines, rubric)
+        self.prefix = f"""{instructions}
+    {criteria}
+
+    Maximum Points: {max_points}
+
+    Student's Java Code:
+    """
+        self.analysis_prefix = f"""{ANALYSIS_INSTRUCTIONS}
+    {criteria}
+
+    Project Files:
+    """
+        self.group_prefix = f"""{instructions}
+    {criteria}
+
+    Maximum Points: {max_points}
+
+    {_GROUP_HEADER}"""
+        self._fixed_tokens: Dict[str, int] = {}
+        self._analysis_tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def render(self, files: List[Tuple[str, str]], student_comment: str = "") -> List[Dict[str, str]]:
+        """
+        Fill in a student's files and comment.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents
+            student_comment (str): Any comments provided by the student
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        prompt = "".join((self.prefix, _format_files(files), _COMMENT_HEADER, student_comment, _TRAILER))
+        return [{"role": "user", "content": prompt}]
+
+    def render_scores(self, files: List[Tuple[str, str]], student_comment: str = "") -> List[Dict[str, str]]:
+        """
+        Build the messages for the first phase of two-phase grading, asking for the grade without prose.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents
+            student_comment (str): Any comments provided by the student
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        prompt = "".join((self.prefix, _format_files(files), _COMMENT_HEADER, student_comment, _SCORES_REQUEST, _TRAILER))
+        return [{"role": "user", "content": prompt}]
+
+    def render_feedback(self, files: List[Tuple[str, str]], student_comment: str,
+                        scores: Dict) -> List[Dict[str, str]]:
+        """
+        Build the messages for the second phase of two-phase grading, asking for the prose for a given grade.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents
+            student_comment (str): Any comments provided by the student
+            scores (Dict): The scores-only result from the first phase
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        grade = json.dumps({
+            "requirements_assessment": [
+                {"requirement": r["requirement"], "met": r["met"]} for r in scores["requirements_assessment"]
+            ],
+            "point_deductions": scores["point_deductions"],
+            "extra_credit": scores["extra_credit"],
+            "final_score": scores["final_score"],
+        }, indent=2).replace("\n", "\n    ")
+        request = _FEEDBACK_REQUEST.format(grade=grade)
+        prompt = "".join((self.prefix, _format_files(files), _COMMENT_HEADER, student_comment, request, _TRAILER))
+        return [{"role": "user", "content": prompt}]
+
+    def fixed_tokens(self, model: str) -> int:
+        """
+        Tokens in the part of the prompt shared by every submission.
+
+        Args:
+            model (str): Model whose tokenizer should be used
+
+        Returns:
+            int: Token count, including the per-message overhead
+        """
+        with self._lock:
+            if model not in self._fixed_tokens:
+                self._fixed_tokens[model] = TOKENS_PER_MESSAGE + count_tokens(
+                    self.prefix + _COMMENT_HEADER + _TRAILER, model
+                )
+            return self._fixed_tokens[model]
+
+    def estimate_tokens(self, files: List[Tuple[str, str]], student_comment: str, model: str) -> int:
+        """
+        Estimate the prompt tokens of a rendered request, tokenizing only the student's part.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents
+            student_comment (str): Any comments provided by the student
+            model (str): Model whose tokenizer should be used
+
+        Returns:
+            int: Estimated prompt tokens
+        """
+        return self.fixed_tokens(model) + count_tokens(_format_files(files) + student_comment, model)
+
+    def render_analysis(self, files: List[Tuple[str, str]]) -> List[Dict[str, str]]:
+        """
+        Build the messages asking for a per-file analysis of some of a submission's files.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents for this chunk
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        return [{"role": "user", "content": self.analysis_prefix + _format_files(files) + _TRAILER}]
+
+    def analysis_fixed_tokens(self, model: str) -> int:
+        """Tokens in the part of an analysis prompt shared by every chunk."""
+        with self._lock:
+            if model not in self._analysis_tokens:
+                self._analysis_tokens[model] = TOKENS_PER_MESSAGE + count_tokens(self.analysis_prefix + _TRAILER, model)
+            return self._analysis_tokens[model]
+
+    def render_summaries(self, analyses: List[Dict], omitted: List[str], student_comment: str = "") -> List[Dict[str, str]]:
+        """
+        Build the final grading messages for a chunked submission from its per-file analyses.
+
+        Args:
+            analyses (List[Dict]): Per-file analysis objects from the chunk calls
+            omitted (List[str]): Descriptions of files that were left out or truncated
+            student_comment (str): Any comments provided by the student
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        summaries = json.dumps(analyses, indent=2)
+        if omitted:
+            summaries += "\n\nFiles not analyzed in full:\n" + "\n".join(f"- {line}" for line in omitted)
+        prompt = "".join((self.prefix, _SUMMARIES_HEADER, summaries, _COMMENT_HEADER, student_comment, _TRAILER))
+        return [{"role": "user", "content": prompt}]
+
+    def render_group(self, submissions: List[Tuple[str, List[Tuple[str, str]]]]) -> List[Dict[str, str]]:
+        """
+        Build the messages grading several submissions in one request.
+
+        Args:
+            submissions (List[Tuple[str, List[Tuple[str, str]]]]): (ID, files) for
+                each submission; IDs should be opaque, not student names
+
+        Returns:
+            List[Dict[str, str]]: The messages to send to the chat completions API
+        """
+        body = "\n\n".join(f"=== Submission {sid} ===\n{_format_files(files)}" for sid, files in submissions)
+        return [{"role": "user", "content": self.group_prefix + body + _TRAILER}]
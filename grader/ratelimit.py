@@ -0,0 +1,249 @@
+"""Client-side requests-per-minute and tokens-per-minute rate limiting."""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from grader.client import endpoint_count
+from grader.tokens import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Default (requests per minute, tokens per minute) per model and API key.
+# Override with environment variables such as O1_PREVIEW_RPM / O1_PREVIEW_TPM,
+# or with configure_rate_limit(). The process-wide budget is these limits times
+# the number of endpoints requests are balanced across.
+DEFAULT_LIMITS: Dict[str, Tuple[int, int]] = {
+    "o1-preview": (500, 30_000_000),
+    "gpt-4o-mini": (5_000, 4_000_000),
+}
+FALLBACK_LIMITS = (500, 1_000_000)
+
+# Output tokens reserved up front when the caller gives no better estimate
+DEFAULT_EXPECTED_OUTPUT_TOKENS = 1_000
+
+
+class TokenBucket:
+    """
+    A bucket holding up to `capacity` units that refills continuously over a minute.
+
+    The bucket is not locked on its own; `RateLimiter` guards it.
+    """
+
+    def __init__(self, per_minute: int):
+        """
+        Initialize a full bucket.
+
+        Args:
+            per_minute (int): Capacity, refilled evenly over sixty seconds
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        """Add the units accrued since the last refill."""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` units are available (0 if they already are)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class Reservation:
+    """Budget taken from a `RateLimiter` for one request, settled once usage is known."""
+
+    def __init__(self, limiter: "RateLimiter", tokens: int):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.settled = False
+
+    def settle(self, usage=None) -> None:
+        """
+        Correct the token bucket with the real usage of the request.
+
+        Args:
+            usage: `response.usage` from the API, or None if the request failed
+                and the estimate should stand
+        """
+        if self.settled:
+            return
+        self.settled = True
+        if usage is not None and getattr(usage, "total_tokens", None) is not None:
+            self.limiter._adjust(self.tokens - usage.total_tokens)
+
+
+class RateLimiter:
+    """
+    Paired request and token buckets for one model.
+
+    Callers reserve one request plus an estimated number of tokens before
+    sending and settle the reservation with `response.usage` afterwards, so
+    overestimates are refunded and underestimates are charged.
+    """
+
+    def __init__(self, model: str, rpm: int, tpm: int):
+        """
+        Initialize the limiter.
+
+        Args:
+            model (str): Model the limits apply to (used in log messages)
+            rpm (int): Requests per minute
+            tpm (int): Tokens per minute
+        """
+        self.model = model
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+
+    def _try_reserve(self, tokens: int) -> float:
+        """Take the budget if available; otherwise return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait == 0:
+                self.requests.tokens -= 1
+                self.tokens.tokens -= min(tokens, self.tokens.capacity)
+            return wait
+
+    def _adjust(self, tokens: float) -> None:
+        """Refund (positive) or charge (negative) tokens after settlement."""
+        with self._lock:
+            self.tokens.refill(time.monotonic())
+            self.tokens.tokens = min(self.tokens.capacity, self.tokens.tokens + tokens)
+
+    def reserve(self, tokens: int) -> Reservation:
+        """
+        Block the calling thread until one request and `tokens` tokens are available.
+
+        Args:
+            tokens (int): Estimated prompt plus output tokens
+
+        Returns:
+            Reservation: The budget taken, to be settled after the call
+        """
+        while (wait := self._try_reserve(tokens)) > 0:
+            logger.debug(f"Rate limit for {self.model}: waiting {wait:.2f}s")
+            time.sleep(wait)
+        return Reservation(self, tokens)
+
+    async def reserve_async(self, tokens: int) -> Reservation:
+        """Asynchronous version of `reserve` that sleeps on the event loop."""
+        while (wait := self._try_reserve(tokens)) > 0:
+            logger.debug(f"Rate limit for {self.model}: waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+        return Reservation(self, tokens)
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limits_from_env(model: str) -> Tuple[int, int]:
+    """Read per-model limits from the environment, falling back to the defaults."""
+    rpm, tpm = DEFAULT_LIMITS.get(model, FALLBACK_LIMITS)
+    prefix = model.upper().replace("-", "_").replace(".", "_")
+    return (
+        int(os.getenv(f"{prefix}_RPM", rpm)),
+        int(os.getenv(f"{prefix}_TPM", tpm)),
+    )
+
+
+def configure_rate_limit(model: str, rpm: Optional[int] = None, tpm: Optional[int] = None) -> RateLimiter:
+    """
+    Set the per-key limits for a model, replacing any existing limiter for it.
+
+    Args:
+        model (str): Model name
+        rpm (Optional[int]): Requests per minute per key, or None for the configured default
+        tpm (Optional[int]): Tokens per minute per key, or None for the configured default
+
+    Returns:
+        RateLimiter: The new limiter shared by every call to that model
+    """
+    default_rpm, default_tpm = _limits_from_env(model)
+    keys = endpoint_count()
+    limiter = RateLimiter(model, (rpm or default_rpm) * keys, (tpm or default_tpm) * keys)
+    with _limiters_lock:
+        _limiters[model] = limiter
+    return limiter
+
+
+def get_rate_limiter(model: str) -> RateLimiter:
+    """
+    Return the process-wide limiter for a model, creating it on first use.
+
+    Args:
+        model (str): Model name
+
+    Returns:
+        RateLimiter: Limiter shared by every call path using that model
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            rpm, tpm = _limits_from_env(model)
+            keys = endpoint_count()
+            _limiters[model] = RateLimiter(model, rpm * keys, tpm * keys)
+        return _limiters[model]
+
+
+def estimate_request_tokens(model: str, messages: List[Dict[str, str]], expected_output_tokens: int,
+                            prompt_tokens: Optional[int] = None) -> int:
+    """Estimate the total tokens a request will use, for reserving budget."""
+    if prompt_tokens is None:
+        prompt_tokens = count_message_tokens(messages, model)
+    return prompt_tokens + expected_output_tokens
+
+
+def create_completion(client, *, model: str, messages: List[Dict[str, str]],
+                      expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS,
+                      prompt_tokens: Optional[int] = None, **kwargs):
+    """
+    Call `client.chat.completions.create` within the model's rate limits.
+
+    Args:
+        client (OpenAI): Client used to send the request
+        model (str): Model name
+        messages (List[Dict]): Chat messages
+        expected_output_tokens (int): Output tokens to reserve before the real
+            usage is known
+        prompt_tokens (Optional[int]): Precomputed prompt token count, e.g. from
+            `PromptTemplate.estimate_tokens`; counted from `messages` if omitted
+        **kwargs: Extra arguments passed through to the API
+
+    Returns:
+        The chat completion response
+    """
+    reservation = get_rate_limiter(model).reserve(
+        estimate_request_tokens(model, messages, expected_output_tokens, prompt_tokens)
+    )
+    response = None
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return response
+    finally:
+        reservation.settle(getattr(response, "usage", None))
+
+
+async def create_completion_async(client, *, model: str, messages: List[Dict[str, str]],
+                                  expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS,
+                                  prompt_tokens: Optional[int] = None, **kwargs):
+    """Asynchronous version of `create_completion` for an AsyncOpenAI client."""
+    reservation = await get_rate_limiter(model).reserve_async(
+        estimate_request_tokens(model, messages, expected_output_tokens, prompt_tokens)
+    )
+    response = None
+    try:
+        response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+        return response
+    finally:
+        reservation.settle(getattr(response, "usage", None))
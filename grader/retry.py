@@ -0,0 +1,198 @@
+"""Retries with exponential backoff for transient grading failures."""
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import openai
+
+from grader.deadline import Deadline
+
+logger = logging.getLogger(__name__)
+
+
+class GradingFailed(Exception):
+    """Raised when a submission could not be graded after all retries."""
+
+    def __init__(self, message: str, attempts: int):
+        super().__init__(message)
+        self.attempts = attempts
+
+
+class RetryBudget:
+    """
+    Cap on the total number of retries across a whole run.
+
+    When a systemic failure makes every call fail, the budget stops each
+    submission from burning through its own retries against a dead endpoint.
+    """
+
+    def __init__(self, total: int):
+        """
+        Initialize the budget.
+
+        Args:
+            total (int): Retries allowed across all submissions
+        """
+        self.remaining = total
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget, returning False if it is exhausted."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, honouring the server's Retry-After.
+
+    Attributes:
+        max_attempts (int): Attempts per submission, including the first
+        base_delay (float): Delay before the first retry, in seconds
+        max_delay (float): Upper bound on any single delay, in seconds
+        budget (Optional[RetryBudget]): Shared budget across submissions
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        base_delay: float = 2.0,
+        max_delay: float = 60.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        """
+        Seconds to wait before the next attempt.
+
+        Args:
+            attempt (int): Number of attempts made so far (1 after the first failure)
+            error (BaseException): Error from the last attempt
+
+        Returns:
+            float: Delay in seconds
+        """
+        server_delay = retry_after(error)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def should_retry(self, attempt: int, error: BaseException) -> bool:
+        """Check whether another attempt is allowed after `error`."""
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return False
+        return self.budget is None or self.budget.try_spend()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Check whether an error is transient and worth retrying.
+
+    Rate limits, timeouts, connection errors, 5xx responses and unparseable
+    model output are retried. Authentication, permission and bad-request
+    errors are permanent.
+
+    Args:
+        error (BaseException): Error raised by a grading attempt
+
+    Returns:
+        bool: True if the attempt should be retried
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError,
+                          openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    # extract_json and json.loads failures surface as ValueError
+    return isinstance(error, (ValueError, KeyError, TimeoutError))
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """
+    Read the server's requested delay from an API error, if any.
+
+    Args:
+        error (BaseException): Error raised by an API call
+
+    Returns:
+        Optional[float]: Delay in seconds, or None if the server gave none
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(attempt_fn: Callable, policy: RetryPolicy, deadline: Optional[Deadline] = None):
+    """
+    Run `attempt_fn` until it succeeds or the policy gives up.
+
+    Args:
+        attempt_fn (Callable): Zero-argument function making one attempt
+        policy (RetryPolicy): Retry policy
+        deadline (Optional[Deadline]): Run deadline; backoff sleeps end early
+            when it passes or the run is cancelled
+
+    Returns:
+        The value returned by the successful attempt
+
+    Raises:
+        GradingFailed: If every allowed attempt failed
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return attempt_fn()
+        except Exception as e:
+            if not policy.should_retry(attempt, e):
+                raise GradingFailed(f"{type(e).__name__}: {e}", attempt) from e
+            delay = policy.delay(attempt, e)
+            logger.warning(f"Attempt {attempt} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+            if deadline is not None:
+                deadline.sleep(delay)
+            else:
+                time.sleep(delay)
+
+
+async def call_with_retry_async(attempt_fn: Callable, policy: RetryPolicy, deadline: Optional[Deadline] = None):
+    """Asynchronous version of `call_with_retry` for a coroutine function."""
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return await attempt_fn()
+        except Exception as e:
+            if not policy.should_retry(attempt, e):
+                raise GradingFailed(f"{type(e).__name__}: {e}", attempt) from e
+            delay = policy.delay(attempt, e)
+            logger.warning(f"Attempt {attempt} failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+            remaining = deadline.remaining() if deadline is not None else None
+            await asyncio.sleep(delay if remaining is None else min(delay, remaining))
@@ -0,0 +1,157 @@
+"""Route submissions to a fast or a reasoning model based on cheap local signals."""
+import difflib
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SIMPLE = "simple"
+COMPLEX = "complex"
+
+# Strings, char literals and comments, removed before checking delimiter balance
+_NOISE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//[^\n]*|/\*.*?\*/', re.DOTALL)
+_PAIRS = {")": "(", "]": "[", "}": "{"}
+
+
+@dataclass
+class RoutingConfig:
+    """
+    Thresholds and models for each tier.
+
+    Attributes:
+        simple_model (str): Model for simple submissions
+        complex_model (str): Model for everything else
+        simple_max_lines (int): Most non-blank lines a simple submission may have
+        simple_max_files (int): Most files a simple submission may have
+        starter_similarity (float): Similarity to the starter code (0-1) at or
+            above which a submission is treated as simple
+        starter_code (str): Starter code handed out with the assignment, if any
+    """
+    simple_model: str = "gpt-4o-mini"
+    complex_model: str = "o1-preview"
+    simple_max_lines: int = 40
+    simple_max_files: int = 1
+    starter_similarity: float = 0.9
+    starter_code: str = ""
+
+
+@dataclass
+class RoutingDecision:
+    """
+    The tier chosen for a submission and why.
+
+    Attributes:
+        tier (str): SIMPLE or COMPLEX
+        model (str): Model the submission will be graded with
+        reason (str): Short explanation of the decision
+        signals (Dict): The local signals the decision was based on
+    """
+    tier: str
+    model: str
+    reason: str
+    signals: Dict[str, object] = field(default_factory=dict)
+
+
+def looks_parseable(code: str) -> bool:
+    """
+    Cheap stand-in for a Java parser: a class declaration and balanced delimiters.
+
+    Args:
+        code (str): Java source
+
+    Returns:
+        bool: False if the code clearly cannot compile
+    """
+    if not re.search(r"\b(class|interface|enum|record)\s+\w+", code):
+        return False
+    stack = []
+    for ch in _NOISE.sub("", code):
+        if ch in "([{":
+            stack.append(ch)
+        elif ch in _PAIRS:
+            if not stack or stack.pop() != _PAIRS[ch]:
+                return False
+    return not stack
+
+
+class Router:
+    """
+    Assigns each submission to a tier and records per-tier decisions and latency.
+
+    The router is shared between grading threads.
+    """
+
+    def __init__(self, config: RoutingConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._stats: Dict[str, List[float]] = {SIMPLE: [], COMPLEX: []}
+        self._reasons: Dict[str, int] = {}
+
+    def route(self, files: List[Tuple[str, str]]) -> RoutingDecision:
+        """
+        Choose a tier for a submission.
+
+        Args:
+            files (List[Tuple[str, str]]): File names and contents
+
+        Returns:
+            RoutingDecision: The chosen tier and model
+        """
+        config = self.config
+        code = "\n".join(content for _, content in files)
+        lines = sum(1 for line in code.splitlines() if line.strip())
+        signals = {"files": len(files), "lines": lines}
+
+        if lines == 0:
+            decision = RoutingDecision(SIMPLE, config.simple_model, "empty", signals)
+        else:
+            if config.starter_code:
+                similarity = difflib.SequenceMatcher(None, config.starter_code, code).ratio()
+                signals["starter_similarity"] = round(similarity, 3)
+            else:
+                similarity = 0.0
+            signals["parses"] = parses = looks_parseable(code)
+
+            if similarity >= config.starter_similarity:
+                decision = RoutingDecision(SIMPLE, config.simple_model, "close to starter code", signals)
+            elif not parses:
+                decision = RoutingDecision(COMPLEX, config.complex_model, "does not parse", signals)
+            elif lines <= config.simple_max_lines and len(files) <= config.simple_max_files:
+                decision = RoutingDecision(SIMPLE, config.simple_model, "small", signals)
+            else:
+                decision = RoutingDecision(COMPLEX, config.complex_model, "large", signals)
+
+        with self._lock:
+            key = f"{decision.tier}: {decision.reason}"
+            self._reasons[key] = self._reasons.get(key, 0) + 1
+        logger.info(f"Routed to {decision.tier} tier ({decision.model}): {decision.reason} {signals}")
+        return decision
+
+    def record(self, decision: RoutingDecision, latency: float) -> None:
+        """
+        Record how long grading took for a routed submission.
+
+        Args:
+            decision (RoutingDecision): Decision returned by `route`
+            latency (float): Seconds spent grading
+        """
+        with self._lock:
+            self._stats[decision.tier].append(latency)
+
+    def summary(self) -> str:
+        """Return a report of routing decisions and per-tier latency."""
+        with self._lock:
+            lines = ["Routing:"]
+            for tier, latencies in self._stats.items():
+                if latencies:
+                    ordered = sorted(latencies)
+                    lines.append(
+                        f"  {tier}: {len(ordered)} submissions, "
+                        f"median {ordered[len(ordered) // 2]:.1f}s, max {ordered[-1]:.1f}s"
+                    )
+            for reason, count in sorted(self._reasons.items()):
+                lines.append(f"  {reason}: {count}")
+        return "\n".join(lines)
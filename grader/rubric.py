@@ -0,0 +1,216 @@
+"""Numbered grading rubrics, compiled once per assignment and cached by guidelines hash."""
+import hashlib
+import json
+import logging
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple, Union
+
+from grader.schema import OTHER_DEDUCTION, Number, ResultValidationError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RUBRIC_DIR = Path(".grader_rubrics")
+
+# Bump whenever the rubric prompt or file format changes so cached rubrics are recompiled
+RUBRIC_VERSION = "2"
+
+
+def guidelines_hash(guidelines: str) -> str:
+    """Return the hex SHA-256 digest of an assignment's guidelines."""
+    return hashlib.sha256(guidelines.encode("utf-8")).hexdigest()
+
+
+def rubric_path(guidelines: str, max_points: int, directory: Union[str, Path] = DEFAULT_RUBRIC_DIR) -> Path:
+    """
+    Where the compiled rubric for some guidelines is cached.
+
+    Args:
+        guidelines (str): The assignment guidelines
+        max_points (int): The maximum number of points for the assignment
+        directory (Union[str, Path]): Directory holding compiled rubrics
+
+    Returns:
+        Path: The rubric's JSON file, which may not exist yet
+    """
+    return Path(directory) / f"{guidelines_hash(guidelines)[:16]}-{max_points}.json"
+
+
+@dataclass
+class RubricItem:
+    """One numbered requirement or standard deduction of a rubric."""
+    id: str
+    description: str
+    points: Number = 0
+
+
+@dataclass
+class Rubric:
+    """
+    The requirements of an assignment, numbered so grading calls can answer by ID.
+
+    A rubric is compiled from the guidelines once and then sent in place of
+    them. Because every student is assessed against the same IDs, requirement
+    wording is identical across a class and per-requirement results can be
+    tallied by ID. Common deductions are numbered too (D1, D2, ...), so the
+    model names them instead of writing the same reason for every student;
+    `expand` puts the text back when a result is parsed.
+
+    Attributes:
+        guidelines_hash (str): Hash of the guidelines the rubric was compiled from
+        max_points (int): The maximum number of points for the assignment
+        requirements (List[RubricItem]): The numbered requirements, in order
+        deductions (List[RubricItem]): The standard deductions, with their usual points
+        version (str): RUBRIC_VERSION when the rubric was compiled
+    """
+    guidelines_hash: str
+    max_points: int
+    requirements: List[RubricItem] = field(default_factory=list)
+    deductions: List[RubricItem] = field(default_factory=list)
+    version: str = RUBRIC_VERSION
+
+    @classmethod
+    def from_items(cls, items: List[Dict[str, Any]], guidelines: str, max_points: int,
+                   deductions: Iterable[Dict[str, Any]] = ()) -> "Rubric":
+        """
+        Build a rubric from the model's lists, numbering requirements R1, R2, ... and deductions D1, D2, ...
+
+        Args:
+            items (List[Dict]): Requirements, as objects with a description and points
+            guidelines (str): The guidelines the rubric was compiled from
+            max_points (int): The maximum number of points for the assignment
+            deductions (Iterable[Dict]): Standard deductions, as objects with a reason and points
+
+        Returns:
+            Rubric: The numbered rubric
+
+        Raises:
+            ValueError: If there are no requirements
+        """
+        requirements = [
+            RubricItem(f"R{i + 1}", str(item["description"]).strip(), item.get("points", 0))
+            for i, item in enumerate(items)
+            if isinstance(item, dict) and str(item.get("description", "")).strip()
+        ]
+        if not requirements:
+            raise ValueError("Compiled rubric has no requirements")
+        total = sum(r.points for r in requirements)
+        if total != max_points:
+            logger.warning(f"Rubric points add up to {total}, not the maximum of {max_points}")
+        standard = [
+            RubricItem(f"D{i + 1}", str(item["reason"]).strip(), item.get("points", 0))
+            for i, item in enumerate(deductions)
+            if isinstance(item, dict) and str(item.get("reason", "")).strip()
+        ]
+        return cls(guidelines_hash(guidelines), max_points, requirements, standard)
+
+    @property
+    def ids(self) -> List[str]:
+        """The requirement IDs, in order."""
+        return [r.id for r in self.requirements]
+
+    @property
+    def deduction_ids(self) -> List[str]:
+        """The standard deduction IDs, in order."""
+        return [d.id for d in self.deductions]
+
+    def render(self) -> str:
+        """Return the rubric as the compact text sent in grading prompts, one requirement or deduction per line."""
+        lines = [f"{r.id} ({r.points} points): {r.description}" for r in self.requirements]
+        if self.deductions:
+            lines.append("Standard deductions:")
+            lines.extend(f"{d.id} (-{d.points} points): {d.description}" for d in self.deductions)
+        return "\n".join(lines)
+
+    def expand(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fill in the requirement text and deduction reasons of a result that names rubric IDs.
+
+        Args:
+            data (Dict): A decoded grading result
+
+        Returns:
+            Dict: The result with each assessment's `requirement` and each standard
+                deduction's `reason` set from the rubric
+
+        Raises:
+            ResultValidationError: If an assessment or deduction names an ID that is not in the rubric
+        """
+        items = data.get("requirements_assessment") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return data
+        data = self._expand_deductions(data)
+        by_id = {r.id: r for r in self.requirements}
+        expanded = []
+        for i, item in enumerate(items):
+            requirement = by_id.get(item.get("id")) if isinstance(item, dict) else None
+            if requirement is None:
+                raise ResultValidationError(f"requirements_assessment[{i}] does not name a rubric requirement")
+            expanded.append({**item, "requirement": requirement.description})
+        missing = set(by_id) - {item["id"] for item in expanded}
+        if missing:
+            logger.warning(f"Grading result did not assess rubric requirements {', '.join(sorted(missing))}")
+        return {**data, "requirements_assessment": expanded}
+
+    def _expand_deductions(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill in the reason of every deduction that names a standard deduction's ID."""
+        items = data.get("point_deductions")
+        if not isinstance(items, list):
+            return data
+        by_id = {d.id: d for d in self.deductions}
+        expanded = []
+        for i, item in enumerate(items):
+            deduction_id = item.get("id") if isinstance(item, dict) else None
+            if deduction_id in (None, "", OTHER_DEDUCTION):
+                expanded.append(item)
+            elif deduction_id in by_id:
+                expanded.append({**item, "reason": by_id[deduction_id].description})
+            else:
+                raise ResultValidationError(f"point_deductions[{i}] does not name a standard deduction")
+        return {**data, "point_deductions": expanded}
+
+    def tally(self, assessments: Iterable[List[Dict[str, Any]]]) -> List[Tuple[RubricItem, int, int]]:
+        """
+        Count how many students met each requirement.
+
+        Args:
+            assessments (Iterable[List[Dict]]): Each graded student's requirements_assessment
+
+        Returns:
+            List[Tuple[RubricItem, int, int]]: Each requirement with the number of
+                students who met it and the number assessed on it
+        """
+        met = {r.id: 0 for r in self.requirements}
+        assessed = dict(met)
+        for items in assessments:
+            for item in items:
+                if item.get("id") in met:
+                    assessed[item["id"]] += 1
+                    met[item["id"]] += bool(item.get("met"))
+        return [(r, met[r.id], assessed[r.id]) for r in self.requirements]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the rubric as plain JSON-compatible data."""
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Rubric":
+        """Rebuild a rubric from `to_dict` output."""
+        return cls(
+            guidelines_hash=data["guidelines_hash"],
+            max_points=data["max_points"],
+            requirements=[RubricItem(**item) for item in data["requirements"]],
+            deductions=[RubricItem(**item) for item in data.get("deductions", [])],
+            version=data.get("version", ""),
+        )
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the rubric to a JSON file, creating its directory if needed."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "Rubric":
+        """Read a rubric written by `save`."""
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
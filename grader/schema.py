@@ -0,0 +1,465 @@
+"""JSON schemas for structured outputs and typed validation of grading results."""
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Union
+
+Number = Union[int, float]
+
+# Model name prefixes that accept `response_format={"type": "json_schema", ...}`.
+# o1-preview and o1-mini do not, so they fall back to parsing JSON out of free text.
+STRUCTURED_OUTPUT_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1-2024", "o3", "o4")
+_UNSUPPORTED_MODELS = ("gpt-4o-2024-05-13",)
+
+
+def _object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """A strict-mode object schema: every property required, nothing else allowed."""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+def _array(items: Dict[str, Any]) -> Dict[str, Any]:
+    """An array schema."""
+    return {"type": "array", "items": items}
+
+
+_STRING = {"type": "string"}
+_NUMBER = {"type": "number"}
+_BOOLEAN = {"type": "boolean"}
+
+# Mirrors the result structure described in GRADING_INSTRUCTIONS
+GRADING_SCHEMA = _object({
+    "syntax_check": _array(_object({"line": {"type": "integer"}, "error": _STRING})),
+    "compilation_test": _object({"compiles": _BOOLEAN, "errors": _array(_STRING)}),
+    "logical_errors": _array(_STRING),
+    "runtime_simulation": _object({
+        "status": {"type": "string", "enum": ["success", "warning", "error"]},
+        "summary": _STRING,
+        "details": _STRING,
+    }),
+    "requirements_assessment": _array(_object({
+        "requirement": _STRING,
+        "met": _BOOLEAN,
+        "explanation": _STRING,
+    })),
+    "code_quality": _STRING,
+    "point_deductions": _array(_object({"reason": _STRING, "points": _NUMBER})),
+    "extra_credit": _object({"awarded": _BOOLEAN, "points": _NUMBER, "reason": _STRING}),
+    "final_score": _NUMBER,
+    "overall_assessment": _STRING,
+    "improvement_suggestions": _array(_STRING),
+    "comment_consideration": _STRING,
+})
+
+
+# ID of a deduction that is not one of the rubric's standard deductions; it carries its own reason
+OTHER_DEDUCTION = "other"
+
+
+def _requirement_ref(requirement_ids: Optional[List[str]]) -> Dict[str, Any]:
+    """How an assessment names its requirement: by text, or by rubric ID."""
+    if requirement_ids is None:
+        return {"requirement": _STRING}
+    return {"id": {"type": "string", "enum": list(requirement_ids)}}
+
+
+def _deductions(deduction_ids: Optional[List[str]]) -> Dict[str, Any]:
+    """The point_deductions array: reasons in full, or standard deductions by rubric ID."""
+    if deduction_ids is None:
+        return GRADING_SCHEMA["properties"]["point_deductions"]
+    return _array(_object({
+        "id": {"type": "string", "enum": [*deduction_ids, OTHER_DEDUCTION]},
+        "points": _NUMBER,
+        "reason": _STRING,
+    }))
+
+
+def grading_schema(requirement_ids: Optional[List[str]] = None,
+                   deduction_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    The grading schema, optionally answering requirements and deductions by rubric ID.
+
+    Args:
+        requirement_ids (Optional[List[str]]): IDs of a compiled rubric's requirements;
+            each assessment then names one of them instead of restating the requirement
+        deduction_ids (Optional[List[str]]): IDs of the rubric's standard deductions;
+            each deduction then names one of them (or OTHER_DEDUCTION) instead of restating its reason
+
+    Returns:
+        Dict: Strict-mode JSON schema for one grading result
+    """
+    if requirement_ids is None and deduction_ids is None:
+        return GRADING_SCHEMA
+    return _object({
+        **GRADING_SCHEMA["properties"],
+        "requirements_assessment": _array(_object({
+            **_requirement_ref(requirement_ids),
+            "met": _BOOLEAN,
+            "explanation": _STRING,
+        })),
+        "point_deductions": _deductions(deduction_ids),
+    })
+
+
+def scores_schema(requirement_ids: Optional[List[str]] = None,
+                  deduction_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    The first phase of two-phase grading: the grade and what it rests on, without prose.
+
+    Args:
+        requirement_ids (Optional[List[str]]): IDs of a compiled rubric's requirements, if graded against one
+        deduction_ids (Optional[List[str]]): IDs of the rubric's standard deductions, if graded against one
+
+    Returns:
+        Dict: Strict-mode JSON schema for a scores-only result
+    """
+    return _object({
+        "requirements_assessment": _array(_object({**_requirement_ref(requirement_ids), "met": _BOOLEAN})),
+        "point_deductions": _deductions(deduction_ids),
+        "extra_credit": GRADING_SCHEMA["properties"]["extra_credit"],
+        "final_score": _NUMBER,
+    })
+
+
+# Prose written in the second phase of two-phase grading, for a grade already given
+FEEDBACK_FIELDS = (
+    "syntax_check", "compilation_test", "logical_errors", "runtime_simulation",
+    "code_quality", "overall_assessment", "improvement_suggestions", "comment_consideration",
+)
+
+FEEDBACK_SCHEMA = _object({
+    **{key: GRADING_SCHEMA["properties"][key] for key in FEEDBACK_FIELDS},
+    "requirement_explanations": _array(_STRING),
+})
+
+
+def group_schema(requirement_ids: Optional[List[str]] = None,
+                 deduction_ids: Optional[List[str]] = None) -> Dict[str, Any]:
+    """One grading result per submission when several are graded in one request."""
+    properties = grading_schema(requirement_ids, deduction_ids)["properties"]
+    return _object({
+        "results": _array(_object({"submission_id": _STRING, **properties})),
+    })
+
+
+GROUP_SCHEMA = group_schema()
+
+# Mirrors the rubric structure described in RUBRIC_INSTRUCTIONS
+RUBRIC_SCHEMA = _object({
+    "requirements": _array(_object({"description": _STRING, "points": _NUMBER})),
+    "deductions": _array(_object({"reason": _STRING, "points": _NUMBER})),
+})
+
+# Mirrors the per-file analysis structure described in ANALYSIS_INSTRUCTIONS
+ANALYSIS_SCHEMA = _object({
+    "files": _array(_object({
+        "file": _STRING,
+        "summary": _STRING,
+        "syntax_errors": _array(_object({"line": {"type": "integer"}, "error": _STRING})),
+        "compilation_issues": _array(_STRING),
+        "logical_errors": _array(_STRING),
+        "requirements_evidence": _array(_STRING),
+        "code_quality": _STRING,
+    })),
+})
+
+
+def supports_structured_outputs(model: str) -> bool:
+    """Check whether a model can be asked for schema-constrained JSON."""
+    return model.startswith(STRUCTURED_OUTPUT_MODELS) and not model.startswith(_UNSUPPORTED_MODELS)
+
+
+def response_format(model: str, name: str, schema: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Build the `response_format` argument enforcing a schema, if the model supports it.
+
+    Args:
+        model (str): Model the request is sent to
+        name (str): Name of the schema, reported back by the API
+        schema (Dict): Strict-mode JSON schema
+
+    Returns:
+        Optional[Dict]: The argument to pass, or None to fall back to free text
+    """
+    if not supports_structured_outputs(model):
+        return None
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+# Top-level fields every grading result must contain, with or without a schema
+REQUIRED_FIELDS = (
+    "final_score", "code_quality", "requirements_assessment", "point_deductions",
+    "extra_credit", "overall_assessment", "improvement_suggestions",
+)
+
+
+class ResultValidationError(ValueError):
+    """Raised when a grading result does not match the expected structure."""
+
+
+def _require(data: Dict[str, Any], key: str, path: str) -> Any:
+    """Return `data[key]`, raising a validation error naming `path` if it is absent."""
+    if not isinstance(data, dict):
+        raise ResultValidationError(f"{path or 'result'} should be an object")
+    if key not in data:
+        raise ResultValidationError(f"Grading result is missing {path + '.' if path else ''}{key}")
+    return data[key]
+
+
+def _str(value: Any, path: str) -> str:
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ResultValidationError(f"{path} should be a string, got {type(value).__name__}")
+    return value
+
+
+def _bool(value: Any, path: str) -> bool:
+    if not isinstance(value, bool):
+        raise ResultValidationError(f"{path} should be true or false, got {value!r}")
+    return value
+
+
+def _number(value: Any, path: str) -> Number:
+    if isinstance(value, str):
+        try:
+            value = float(value.strip())
+        except ValueError:
+            raise ResultValidationError(f"{path} should be a number, got {value!r}")
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ResultValidationError(f"{path} should be a number, got {value!r}")
+    return int(value) if float(value).is_integer() else value
+
+
+def _list(value: Any, path: str) -> List[Any]:
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ResultValidationError(f"{path} should be a list")
+    return value
+
+
+@dataclass
+class SyntaxIssue:
+    """A syntax error reported by the model."""
+    line: Optional[int]
+    error: str
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "SyntaxIssue":
+        line = data.get("line") if isinstance(data, dict) else None
+        return cls(
+            line=_number(line, f"{path}.line") if line is not None else None,
+            error=_str(_require(data, "error", path), f"{path}.error"),
+        )
+
+
+@dataclass
+class CompilationTest:
+    """Whether the code would compile, and why not."""
+    compiles: bool = True
+    errors: List[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "CompilationTest":
+        return cls(
+            compiles=_bool(_require(data, "compiles", path), f"{path}.compiles"),
+            errors=[_str(e, f"{path}.errors[{i}]") for i, e in enumerate(_list(data.get("errors"), f"{path}.errors"))],
+        )
+
+
+@dataclass
+class RuntimeSimulation:
+    """The model's account of how the program behaves when run."""
+    status: str = ""
+    summary: str = ""
+    details: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "RuntimeSimulation":
+        if not isinstance(data, dict):
+            raise ResultValidationError(f"{path} should be an object")
+        return cls(**{k: _str(data.get(k), f"{path}.{k}") for k in ("status", "summary", "details")})
+
+
+@dataclass
+class Requirement:
+    """Whether one assignment requirement is met, and its rubric ID if graded against one."""
+    requirement: str
+    met: bool
+    explanation: str
+    id: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "Requirement":
+        return cls(
+            requirement=_str(_require(data, "requirement", path), f"{path}.requirement"),
+            met=_bool(_require(data, "met", path), f"{path}.met"),
+            explanation=_str(data.get("explanation"), f"{path}.explanation"),
+            id=_str(data.get("id"), f"{path}.id"),
+        )
+
+
+@dataclass
+class Deduction:
+    """Points taken off, and why, with the rubric's ID for a standard deduction."""
+    reason: str
+    points: Number
+    id: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "Deduction":
+        return cls(
+            reason=_str(_require(data, "reason", path), f"{path}.reason"),
+            points=_number(_require(data, "points", path), f"{path}.points"),
+            id=_str(data.get("id"), f"{path}.id"),
+        )
+
+
+@dataclass
+class ExtraCredit:
+    """Extra credit awarded, if any."""
+    awarded: bool = False
+    points: Number = 0
+    reason: str = ""
+
+    @classmethod
+    def from_dict(cls, data: Any, path: str) -> "ExtraCredit":
+        return cls(
+            awarded=_bool(_require(data, "awarded", path), f"{path}.awarded"),
+            points=_number(data.get("points", 0), f"{path}.points"),
+            reason=_str(data.get("reason"), f"{path}.reason"),
+        )
+
+
+@dataclass
+class GradeResult:
+    """
+    A validated grading result.
+
+    The fields the grade depends on are required; the diagnostic sections
+    (syntax check, compilation test, logical errors, runtime simulation and
+    comment consideration) default to empty when a free-text response leaves
+    them out. Schema-constrained responses always include every field.
+
+    A scores-only result from the first phase of two-phase grading has
+    `feedback_pending` set and its prose fields empty until `merge_feedback`
+    fills them in.
+    """
+    final_score: Number
+    code_quality: str
+    requirements_assessment: List[Requirement]
+    point_deductions: List[Deduction]
+    extra_credit: ExtraCredit
+    overall_assessment: str
+    improvement_suggestions: List[str]
+    syntax_check: List[SyntaxIssue] = field(default_factory=list)
+    compilation_test: CompilationTest = field(default_factory=CompilationTest)
+    logical_errors: List[str] = field(default_factory=list)
+    runtime_simulation: RuntimeSimulation = field(default_factory=RuntimeSimulation)
+    comment_consideration: str = ""
+    feedback_pending: bool = False
+
+    @classmethod
+    def from_dict(cls, data: Any) -> "GradeResult":
+        """
+        Validate a parsed JSON result.
+
+        Args:
+            data (Any): The decoded JSON object
+
+        Returns:
+            GradeResult: The typed result
+
+        Raises:
+            ResultValidationError: If a required field is missing or has the wrong type
+        """
+        if not isinstance(data, dict):
+            raise ResultValidationError("Grading result should be a JSON object")
+        missing = [key for key in REQUIRED_FIELDS if key not in data]
+        if missing:
+            raise ResultValidationError(f"Grading result is missing keys: {', '.join(missing)}")
+
+        def items(key, parse):
+            return [parse(item, f"{key}[{i}]") for i, item in enumerate(_list(data.get(key), key))]
+
+        def section(key, parse, default):
+            return parse(data[key], key) if data.get(key) is not None else default()
+
+        return cls(
+            final_score=_number(data["final_score"], "final_score"),
+            code_quality=_str(data["code_quality"], "code_quality"),
+            requirements_assessment=items("requirements_assessment", Requirement.from_dict),
+            point_deductions=items("point_deductions", Deduction.from_dict),
+            extra_credit=ExtraCredit.from_dict(data["extra_credit"], "extra_credit"),
+            overall_assessment=_str(data["overall_assessment"], "overall_assessment"),
+            improvement_suggestions=items("improvement_suggestions", _str),
+            syntax_check=items("syntax_check", SyntaxIssue.from_dict),
+            compilation_test=section("compilation_test", CompilationTest.from_dict, CompilationTest),
+            logical_errors=items("logical_errors", _str),
+            runtime_simulation=section("runtime_simulation", RuntimeSimulation.from_dict, RuntimeSimulation),
+            comment_consideration=_str(data.get("comment_consideration"), "comment_consideration"),
+            feedback_pending=_bool(data.get("feedback_pending", False), "feedback_pending"),
+        )
+
+    @classmethod
+    def from_scores(cls, data: Any) -> "GradeResult":
+        """
+        Validate a scores-only result, leaving its prose fields empty.
+
+        Args:
+            data (Any): The decoded JSON object
+
+        Returns:
+            GradeResult: The typed result, with `feedback_pending` set
+
+        Raises:
+            ResultValidationError: If a scoring field is missing or has the wrong type
+        """
+        if not isinstance(data, dict):
+            raise ResultValidationError("Scores should be a JSON object")
+        prose = {"code_quality": "", "overall_assessment": "", "improvement_suggestions": []}
+        return cls.from_dict({**prose, **data, "feedback_pending": True})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the result as plain JSON-compatible data, as stored in the cache."""
+        return asdict(self)
+
+
+def merge_feedback(scores: Dict[str, Any], feedback: Any) -> Dict[str, Any]:
+    """
+    Combine a scores-only result with the feedback written for it.
+
+    The grade, deductions and which requirements are met come from `scores`;
+    the prose comes from `feedback`, with requirement explanations matched to
+    the scored requirements by position.
+
+    Args:
+        scores (Dict): A scores-only result, as returned by `GradeResult.from_scores(...).to_dict()`
+        feedback (Any): The decoded feedback object
+
+    Returns:
+        Dict: The complete result
+
+    Raises:
+        ResultValidationError: If the feedback is missing a field or has the wrong type
+    """
+    if not isinstance(feedback, dict):
+        raise ResultValidationError("Feedback should be a JSON object")
+    missing = [key for key in ("code_quality", "overall_assessment", "improvement_suggestions") if key not in feedback]
+    if missing:
+        raise ResultValidationError(f"Feedback is missing keys: {', '.join(missing)}")
+    explanations = _list(feedback.get("requirement_explanations"), "requirement_explanations")
+    requirements = [
+        {**item, "explanation": _str(explanations[i], f"requirement_explanations[{i}]")} if i < len(explanations) else item
+        for i, item in enumerate(scores["requirements_assessment"])
+    ]
+    merged = {
+        **scores,
+        **{key: feedback[key] for key in FEEDBACK_FIELDS if key in feedback},
+        "requirements_assessment": requirements,
+        "feedback_pending": False,
+    }
+    return GradeResult.from_dict(merged).to_dict()
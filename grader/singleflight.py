@@ -0,0 +1,102 @@
+"""Coalescing of identical in-flight requests."""
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List
+
+
+def request_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Hash a full request so byte-identical prompts map to the same key.
+
+    Args:
+        model (str): Model name
+        messages (List[Dict]): Chat messages
+
+    Returns:
+        str: Hex SHA-256 digest of the request
+    """
+    payload = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers share its result.
+
+    The first caller for a key does the work. Anyone arriving with the same key
+    while it is running waits for that result (or exception) instead of making
+    their own call. Waiters get a deep copy so no two callers share a mutable
+    result. Thread callers and event-loop callers are tracked separately.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self._async_calls: Dict[str, asyncio.Future] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """
+        Call `fn`, or wait for an identical call already in flight.
+
+        Args:
+            key (str): Identity of the call, e.g. from `request_key`
+            fn (Callable): Zero-argument function doing the work
+
+        Returns:
+            The result of `fn`
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await `fn()`, or wait for an identical call already in flight on this loop.
+
+        Args:
+            key (str): Identity of the call, e.g. from `request_key`
+            fn (Callable): Zero-argument coroutine function doing the work
+
+        Returns:
+            The result of `fn()`
+        """
+        future = self._async_calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(future))
+        future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._async_calls[key]
@@ -0,0 +1,267 @@
+"""Streaming completions with incremental parsing of the result JSON."""
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from grader.ratelimit import DEFAULT_EXPECTED_OUTPUT_TOKENS, estimate_request_tokens, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+FieldCallback = Callable[[str, Any], None]
+
+# Parser states while inside the top-level object
+_PREFIX, _KEY_OR_END, _KEY, _COLON, _VALUE_START, _VALUE, _AFTER_VALUE, _DONE = range(8)
+_CLOSERS = {"{": "}", "[": "]"}
+
+# Accepts raw control characters (e.g. newlines) inside strings, as jsonrepair does
+_decoder = json.JSONDecoder(strict=False)
+
+
+class MalformedStreamError(ValueError):
+    """Raised as soon as the streamed text can no longer be read as a result object, even with repairs."""
+
+
+class IncrementalJSONParser:
+    """
+    Parses a JSON object from text arriving in chunks, field by field.
+
+    Any text before the object (prose, a markdown fence, a brace in prose)
+    is skipped. Each top-level field is decoded and passed to `on_field` the
+    moment its value closes, so a score can be shown while the long prose
+    fields are still being generated.
+
+    The parser accepts what `jsonrepair.load_object` would repair: trailing
+    commas and raw control characters in strings. Other structural errors
+    (a missing colon, mismatched brackets, an invalid value) raise
+    `MalformedStreamError` right away rather than after the whole response
+    has arrived. Output that stops mid-object is left for the caller to
+    repair once the stream ends; see `done`.
+    """
+
+    def __init__(self, on_field: Optional[FieldCallback] = None):
+        """
+        Initialize the parser.
+
+        Args:
+            on_field (Optional[Callable[[str, Any], None]]): Called with each
+                top-level key and its decoded value as soon as it is complete
+        """
+        self.on_field = on_field
+        self.fields: Dict[str, Any] = {}
+        self.text = ""
+        self._pos = 0
+        self._state = _PREFIX
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._start = 0
+        self._key = None
+        self._comma: Optional[int] = None  # last comma seen inside the current value
+        self._cuts: List[int] = []         # trailing commas to drop from the current value
+
+    @property
+    def done(self) -> bool:
+        """True once the top-level object has been closed."""
+        return self._state == _DONE
+
+    def _fail(self, message: str) -> None:
+        raise MalformedStreamError(f"{message} at offset {self._pos}")
+
+    def _emit(self, end: int) -> None:
+        """Decode the current value (ending before `end`), without its trailing commas, and report it."""
+        parts, start = [], self._start
+        for cut in self._cuts:
+            parts.append(self.text[start:cut])
+            start = cut + 1
+        parts.append(self.text[start:end])
+        self._cuts = []
+        self._comma = None
+        try:
+            value = _decoder.decode("".join(parts))
+        except json.JSONDecodeError as e:
+            self._fail(f"Invalid value for {self._key!r}: {e}")
+        self.fields[self._key] = value
+        if self.on_field is not None:
+            self.on_field(self._key, value)
+
+    def feed(self, chunk: str) -> None:
+        """
+        Consume the next piece of streamed text.
+
+        Args:
+            chunk (str): Newly received text
+
+        Raises:
+            MalformedStreamError: If the text cannot form a valid object
+        """
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text) and self._state != _DONE:
+            ch = text[self._pos]
+            state = self._state
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if state == _KEY:
+                        self._key = _decoder.decode(text[self._start:self._pos + 1])
+                        self._state = _COLON
+                    elif state == _VALUE and not self._stack:
+                        self._emit(self._pos + 1)
+                        self._state = _AFTER_VALUE
+            elif state == _PREFIX:
+                if ch == "{":
+                    self._state = _KEY_OR_END
+            elif state in (_KEY_OR_END, _COLON, _AFTER_VALUE, _VALUE_START) and ch.isspace():
+                pass
+            elif state == _KEY_OR_END:
+                if ch == '"':
+                    self._in_string = True
+                    self._start = self._pos
+                    self._state = _KEY
+                elif ch == "}":
+                    # An empty object, or one ending in a trailing comma
+                    self._state = _DONE
+                elif not self.fields:
+                    # The "{" was a brace in prose, not the start of the object
+                    self._state = _PREFIX
+                    continue
+                else:
+                    self._fail(f"Expected a key, got {ch!r}")
+            elif state == _COLON:
+                if ch != ":":
+                    self._fail(f"Expected ':' after {self._key!r}, got {ch!r}")
+                self._state = _VALUE_START
+            elif state == _AFTER_VALUE:
+                if ch == ",":
+                    self._state = _KEY_OR_END
+                elif ch == "}":
+                    self._state = _DONE
+                else:
+                    self._fail(f"Expected ',' or '}}' after {self._key!r}, got {ch!r}")
+            else:
+                if state == _VALUE_START:
+                    self._start = self._pos
+                    self._state = state = _VALUE
+                if ch == '"':
+                    self._in_string = True
+                elif ch in _CLOSERS:
+                    self._stack.append(_CLOSERS[ch])
+                elif ch in "}]":
+                    if self._comma is not None and not text[self._comma + 1:self._pos].strip():
+                        self._cuts.append(self._comma)
+                    self._comma = None
+                    if self._stack:
+                        if self._stack.pop() != ch:
+                            self._fail(f"Mismatched {ch!r}")
+                        if not self._stack:
+                            self._emit(self._pos + 1)
+                            self._state = _AFTER_VALUE
+                    elif ch == "}":
+                        # End of a scalar value that was the last field
+                        self._emit(self._pos)
+                        self._state = _DONE
+                    else:
+                        self._fail("Unexpected ']'")
+                elif ch == "," and not self._stack:
+                    self._emit(self._pos)
+                    self._state = _KEY_OR_END
+                elif ch == ",":
+                    self._comma = self._pos
+            self._pos += 1
+
+
+def _consume(chunk, parser: IncrementalJSONParser, parts: List[str]):
+    """Feed one streamed chunk to the parser, returning its usage if present."""
+    if chunk.choices:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            parts.append(delta)
+            parser.feed(delta)
+    return getattr(chunk, "usage", None)
+
+
+def _finish(parser: IncrementalJSONParser) -> None:
+    """Log when the stream ended before the object was complete, leaving it to be repaired."""
+    if not parser.done:
+        logger.warning("Stream ended before the JSON object was complete; repairing the full response")
+
+
+def stream_completion(client, *, model: str, messages: List[Dict[str, str]],
+                      on_field: Optional[FieldCallback] = None,
+                      expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS,
+                      prompt_tokens: Optional[int] = None,
+                      **kwargs) -> Tuple[str, Any]:
+    """
+    Stream a chat completion within the model's rate limits, parsing as it arrives.
+
+    The stream is closed as soon as the output is found to be malformed beyond
+    what `jsonrepair.load_object` can repair, so the caller can retry without
+    waiting for the rest of a bad response. A response cut off mid-object is
+    returned whole for the caller to repair.
+
+    Args:
+        client (OpenAI): Client used to send the request
+        model (str): Model name
+        messages (List[Dict]): Chat messages
+        on_field (Optional[Callable[[str, Any], None]]): Called for each
+            top-level field of the result as soon as it is complete
+        expected_output_tokens (int): Output tokens to reserve up front
+        prompt_tokens (Optional[int]): Precomputed prompt token count, e.g. from
+            `PromptTemplate.estimate_tokens`; counted from `messages` if omitted
+        **kwargs: Extra arguments passed through to the API
+
+    Returns:
+        Tuple[str, Any]: The full message content and the usage report
+
+    Raises:
+        MalformedStreamError: If the streamed JSON is malformed beyond repair
+    """
+    reservation = get_rate_limiter(model).reserve(
+        estimate_request_tokens(model, messages, expected_output_tokens, prompt_tokens)
+    )
+    parser = IncrementalJSONParser(on_field)
+    parts: List[str] = []
+    usage = None
+    try:
+        stream = client.chat.completions.create(
+            model=model, messages=messages, stream=True,
+            stream_options={"include_usage": True}, **kwargs
+        )
+        with stream:
+            for chunk in stream:
+                usage = _consume(chunk, parser, parts) or usage
+        _finish(parser)
+        return "".join(parts), usage
+    finally:
+        reservation.settle(usage)
+
+
+async def stream_completion_async(client, *, model: str, messages: List[Dict[str, str]],
+                                  on_field: Optional[FieldCallback] = None,
+                                  expected_output_tokens: int = DEFAULT_EXPECTED_OUTPUT_TOKENS,
+                                  prompt_tokens: Optional[int] = None,
+                                  **kwargs) -> Tuple[str, Any]:
+    """Asynchronous version of `stream_completion` for an AsyncOpenAI client."""
+    reservation = await get_rate_limiter(model).reserve_async(
+        estimate_request_tokens(model, messages, expected_output_tokens, prompt_tokens)
+    )
+    parser = IncrementalJSONParser(on_field)
+    parts: List[str] = []
+    usage = None
+    try:
+        stream = await client.chat.completions.create(
+            model=model, messages=messages, stream=True,
+            stream_options={"include_usage": True}, **kwargs
+        )
+        async with stream:
+            async for chunk in stream:
+                usage = _consume(chunk, parser, parts) or usage
+        _finish(parser)
+        return "".join(parts), usage
+    finally:
+        reservation.settle(usage)
@@ -0,0 +1,60 @@
+"""Local token counting for prompts and responses."""
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+# Rough average for English prose and Java source with the o200k/cl100k encodings
+CHARS_PER_TOKEN = 4
+
+# Fixed overhead the chat format adds per message
+TOKENS_PER_MESSAGE = 4
+
+_encodings = {}
+
+
+def _encoding(model: str):
+    """Return a cached tiktoken encoding for the model, or None if unavailable."""
+    if tiktoken is None:
+        return None
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    """
+    Count (or estimate) the number of tokens in a piece of text.
+
+    Uses tiktoken when it is installed and a chars-per-token estimate otherwise.
+
+    Args:
+        text (str): Text to measure
+        model (str): Model whose tokenizer should be used
+
+    Returns:
+        int: Number of tokens
+    """
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o") -> int:
+    """
+    Count (or estimate) the prompt tokens for a list of chat messages.
+
+    Args:
+        messages (List[Dict]): Chat messages with a "content" field
+        model (str): Model whose tokenizer should be used
+
+    Returns:
+        int: Number of prompt tokens
+    """
+    return sum(TOKENS_PER_MESSAGE + count_tokens(m["content"], model) for m in messages)
@@ -0,0 +1,56 @@
+"""Token usage and latency accounting across a grading run."""
+import threading
+
+
+class UsageStats:
+    """
+    Thread-safe totals of prompt, cached and completion tokens.
+
+    Requests whose prompt was partly served from the provider's prompt cache
+    are timed separately so a run can show the latency the cache saves.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self._latency = {True: [0, 0.0], False: [0, 0.0]}
+        self._lock = threading.Lock()
+
+    def record(self, usage, latency: float) -> None:
+        """
+        Add one response's usage to the totals.
+
+        Args:
+            usage: `response.usage` from the API (ignored if None)
+            latency (float): Seconds the request took
+        """
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+            self.cached_tokens += cached
+            bucket = self._latency[cached > 0]
+            bucket[0] += 1
+            bucket[1] += latency
+
+    def summary(self) -> str:
+        """Return a short report of token usage and cache effectiveness."""
+        with self._lock:
+            share = (self.cached_tokens / self.prompt_tokens * 100) if self.prompt_tokens else 0.0
+            lines = [
+                f"Tokens: {self.prompt_tokens} prompt ({self.cached_tokens} cached, {share:.0f}%), "
+                f"{self.completion_tokens} completion over {self.requests} requests"
+            ]
+            (hit_n, hit_t), (miss_n, miss_t) = self._latency[True], self._latency[False]
+            if hit_n and miss_n:
+                lines.append(
+                    f"Average latency: {hit_t / hit_n:.1f}s with a prompt-cache hit, "
+                    f"{miss_t / miss_n:.1f}s without"
+                )
+        return "\n".join(lines)
@@ -0,0 +1,126 @@
+"""Tests for grader.circuit."""
+import asyncio
+
+import openai
+import pytest
+
+from grader import circuit
+from grader.circuit import CLOSED, HALF_OPEN, OPEN, STOPPED, CircuitBreaker, CircuitOpenError, is_systemic
+from grader.deadline import DeadlineExceeded
+
+# The HTTP library the installed SDK is built on, as in grader.client
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _status_error(cls, status, code=None):
+    body = {"code": code} if code else None
+    return cls("error", response=httpx.Response(status, request=REQUEST), body=body)
+
+
+OUTAGE = openai.APIConnectionError(request=REQUEST)
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(circuit, "time", clock)
+    return clock
+
+
+def _call(breaker, error=None):
+    """Make one guarded call that fails with `error`, or succeeds if it is None."""
+    if error is None:
+        with breaker.guard():
+            return
+    with pytest.raises(type(error)):
+        with breaker.guard():
+            raise error
+
+
+@pytest.mark.parametrize("error, expected", [
+    (OUTAGE, True),
+    (_status_error(openai.InternalServerError, 503), True),
+    (_status_error(openai.AuthenticationError, 401), True),
+    (_status_error(openai.NotFoundError, 404), True),
+    (_status_error(openai.RateLimitError, 429, code="insufficient_quota"), True),
+    (_status_error(openai.RateLimitError, 429, code="rate_limit_exceeded"), False),
+    (_status_error(openai.BadRequestError, 400), False),
+    (ValueError("bad JSON"), False),
+])
+def test_is_systemic(error, expected):
+    assert is_systemic(error) is expected
+
+
+def test_opens_after_consecutive_systemic_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3)
+    _call(breaker, OUTAGE)
+    _call(breaker, OUTAGE)
+    _call(breaker, ValueError("bad JSON"))  # resets the run of failures
+    _call(breaker, OUTAGE)
+    _call(breaker, OUTAGE)
+    assert breaker.state == CLOSED
+    _call(breaker, OUTAGE)
+    assert (breaker.state, breaker.trips) == (OPEN, 1)
+
+
+def test_opens_when_a_full_window_is_mostly_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=10, window=4, failure_ratio=0.5)
+    for error in (OUTAGE, None, None):
+        _call(breaker, error)
+    assert breaker.state == CLOSED
+    _call(breaker, OUTAGE)
+    assert (breaker.state, breaker.trips) == (OPEN, 1)
+
+
+def test_successful_probe_after_the_cooldown_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    _call(breaker, OUTAGE)
+    with breaker._lock:
+        assert breaker._admit() == pytest.approx(30)
+    clock.advance(30)
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+    assert breaker.state == CLOSED
+
+
+def test_stops_after_repeated_failed_probes(clock):
+    stopped = []
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30, max_probes=2, on_stop=lambda: stopped.append(True))
+    _call(breaker, OUTAGE)
+    clock.advance(30)
+    _call(breaker, OUTAGE)
+    assert breaker.state == OPEN
+    clock.advance(30)
+    _call(breaker, OUTAGE)
+    assert breaker.stopped and breaker.state == STOPPED
+    assert stopped == [True]
+    with pytest.raises(CircuitOpenError):
+        _call(breaker)
+    assert "stopped the run" in breaker.summary()
+
+
+def test_probe_that_never_reached_the_api_does_not_count(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30, max_probes=1)
+    _call(breaker, OUTAGE)
+    clock.advance(30)
+    _call(breaker, DeadlineExceeded("Grading deadline passed"))
+    assert breaker.state == OPEN
+    _call(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_async_probe_closes_the_circuit(clock):
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    _call(breaker, OUTAGE)
+    clock.advance(30)
+
+    async def probe():
+        async with breaker.async_guard():
+            return breaker.state
+
+    assert asyncio.run(probe()) == HALF_OPEN
+    assert breaker.state == CLOSED
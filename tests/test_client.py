@@ -0,0 +1,46 @@
+"""Tests for grader.client."""
+import asyncio
+import threading
+
+import pytest
+
+from grader import client
+from grader.client import EndpointConfig, configure_endpoints, get_async_client
+from grader.mock_server import serve
+
+
+@pytest.fixture
+def mock_api(monkeypatch):
+    """A keep-alive mock API server that the shared clients point at."""
+    server = serve(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(client, "_endpoint_configs", None)
+    monkeypatch.setattr(client, "_endpoints", None)
+    configure_endpoints([EndpointConfig(
+        api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", name="mock"
+    )])
+    yield
+    server.shutdown()
+    server.server_close()
+
+
+async def _complete():
+    response = await get_async_client().chat.completions.create(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": "Grade this"}]
+    )
+    return response.choices[0].message.content
+
+
+def test_async_client_works_across_event_loops(mock_api):
+    # Each asyncio.run closes its loop, and with it any connections it pooled
+    for _ in range(2):
+        assert asyncio.run(_complete())
+
+
+def test_async_client_is_shared_within_a_loop(mock_api):
+    async def clients():
+        return get_async_client(), get_async_client()
+
+    first, second = asyncio.run(clients())
+    assert first is second
@@ -0,0 +1,28 @@
+"""Tests for grader.concurrency."""
+import asyncio
+
+from grader.concurrency import AdaptiveConcurrency
+
+
+async def _contend(limiter: AdaptiveConcurrency, tasks: int) -> int:
+    """Run more coroutines than the limit allows and return the most seen in flight at once."""
+    in_flight = peak = 0
+
+    async def call():
+        nonlocal in_flight, peak
+        async with limiter.async_slot():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    await asyncio.gather(*(call() for _ in range(tasks)))
+    return peak
+
+
+def test_async_slot_works_across_event_loops():
+    limiter = AdaptiveConcurrency(initial=1, minimum=1, maximum=1)
+    # Each asyncio.run has its own loop; waiting under contention must not hit the first loop's condition
+    assert asyncio.run(_contend(limiter, 5)) == 1
+    assert asyncio.run(_contend(limiter, 5)) == 1
+    assert limiter._in_flight == 0
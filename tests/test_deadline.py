@@ -0,0 +1,74 @@
+"""Tests for grader.deadline."""
+import time
+
+import pytest
+
+from grader import deadline as deadline_module
+from grader.deadline import Deadline, DeadlineExceeded
+from grader.retry import GradingFailed, RetryPolicy, call_with_retry
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(deadline_module, "time", clock)
+    return clock
+
+
+def test_no_deadline_never_expires(clock):
+    deadline = Deadline()
+    clock.advance(10 ** 6)
+    assert deadline.remaining() is None
+    assert not deadline.expired()
+    assert deadline.timeout() is None
+
+
+def test_request_timeout_is_bounded_by_the_time_left(clock):
+    deadline = Deadline(seconds=100, request_timeout=30)
+    assert deadline.timeout() == 30
+    clock.advance(80)
+    assert deadline.remaining() == 20
+    assert deadline.timeout() == 20
+
+
+def test_expired_deadline_stops_new_requests(clock):
+    deadline = Deadline(seconds=10)
+    clock.advance(10)
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded, match="deadline passed"):
+        deadline.timeout()
+
+
+def test_cancel_stops_new_requests_at_once(clock):
+    deadline = Deadline(seconds=100)
+    deadline.cancel()
+    assert deadline.expired()
+    with pytest.raises(DeadlineExceeded, match="cancelled"):
+        deadline.check()
+
+
+def test_sleep_wakes_when_cancelled():
+    deadline = Deadline()
+    deadline.cancel()
+    started = time.monotonic()
+    deadline.sleep(30)
+    assert time.monotonic() - started < 1
+
+
+def test_cancelling_during_a_retry_stops_the_retries():
+    deadline = Deadline()
+    attempts = []
+
+    def attempt():
+        attempts.append(deadline.timeout())
+        # Ctrl-C arrives while this attempt is failing
+        deadline.cancel()
+        raise ValueError("bad JSON")
+
+    started = time.monotonic()
+    with pytest.raises(GradingFailed) as failed:
+        call_with_retry(attempt, RetryPolicy(base_delay=30.0), deadline)
+    assert len(attempts) == 1
+    assert failed.value.attempts == 2
+    assert isinstance(failed.value.__cause__, DeadlineExceeded)
+    # The 30 s backoff was cut short by the cancellation
+    assert time.monotonic() - started < 1
@@ -0,0 +1,142 @@
+"""Tests for request coalescing and result caching in grade_assignment and grade_group."""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import grader
+from grader.cache import GradeCache
+
+MODEL = "gpt-4o-mini"
+FILES = [("Main.java", "public class Main { public static void main(String[] args) {} }")]
+GUIDELINES = "Print nothing."
+RESULT = {
+    "final_score": 9,
+    "code_quality": "Clear",
+    "requirements_assessment": [{"requirement": "Prints nothing", "met": True, "explanation": ""}],
+    "point_deductions": [{"reason": "No comments", "points": 1}],
+    "extra_credit": {"awarded": False, "points": 0, "reason": ""},
+    "overall_assessment": "Good",
+    "improvement_suggestions": ["Add comments"],
+}
+
+
+class FakeClient:
+    """Counts completion requests and answers each with RESULT, or with `content` if given."""
+
+    def __init__(self, wait_for_coalesced=False, content=None):
+        self.calls = 0
+        self.wait_for_coalesced = wait_for_coalesced
+        self.content = json.dumps(RESULT) if content is None else content
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        self.requests.append(kwargs)
+        if self.wait_for_coalesced:
+            # Stay in flight until the other caller has joined this request
+            started = time.monotonic()
+            while not grader.request_coalescer.coalesced and time.monotonic() - started < 5:
+                time.sleep(0.01)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=self.content, refusal=None))],
+            usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, total_tokens=150)
+        )
+
+
+class AsyncFakeClient:
+    """Forwards to a FakeClient through the coroutine interface of AsyncOpenAI."""
+
+    def __init__(self, fake):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.fake = fake
+
+    async def create(self, **kwargs):
+        return self.fake.create(**kwargs)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def install(**kwargs):
+        fake = FakeClient(**kwargs)
+        monkeypatch.setattr(grader, "get_client", lambda: fake)
+        monkeypatch.setattr(grader, "get_async_client", lambda: AsyncFakeClient(fake))
+        monkeypatch.setattr(grader, "request_coalescer", grader.SingleFlight())
+        return fake
+    return install
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = GradeCache(tmp_path / "cache.sqlite")
+    yield cache
+    cache.close()
+
+
+def _group_content(*ids):
+    return json.dumps({"results": [dict(RESULT, submission_id=i) for i in ids]})
+
+
+def _grade(cache=None, engine="threads"):
+    if engine == "async":
+        return asyncio.run(grader.grade_assignment_async(FILES, GUIDELINES, "", 10, cache=cache, model=MODEL))
+    return grader.grade_assignment(FILES, GUIDELINES, "", 10, cache=cache, model=MODEL)
+
+
+def test_concurrent_identical_requests_share_one_call(client):
+    fake = client(wait_for_coalesced=True)
+    barrier = threading.Barrier(2)
+
+    def grade():
+        barrier.wait()
+        return _grade()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = list(executor.map(lambda _: grade(), range(2)))
+
+    assert fake.calls == 1
+    assert grader.request_coalescer.coalesced == 1
+    assert results[0] == results[1]
+    assert results[0]["final_score"] == 9
+    # Each caller gets its own copy of the result
+    assert results[0] is not results[1]
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_rerun_is_served_from_cache(client, cache, engine):
+    fake = client()
+    first = _grade(cache, engine)
+    assert fake.calls == 1
+
+    rerun = _grade(cache, engine)
+    assert fake.calls == 1
+    assert rerun == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("engine", ["threads", "async"])
+def test_group_results_are_cached_per_submission(client, cache, engine):
+    def grade_group(file_sets):
+        if engine == "async":
+            return asyncio.run(grader.grade_group_async(file_sets, GUIDELINES, 10, cache=cache, model=MODEL))
+        return grader.grade_group(file_sets, GUIDELINES, 10, cache=cache, model=MODEL)
+
+    other = [("Main.java", "class Main {}")]
+    # The response leaves out the second submission
+    fake = client(content=_group_content("S1"))
+    results = grade_group([FILES, other])
+    assert fake.calls == 1
+    assert results[0]["final_score"] == 9
+    assert results[1] is None
+
+    # Only the submission without a cached result is sent again
+    results = grade_group([FILES, other])
+    assert fake.calls == 2
+    assert "class Main {}" in fake.requests[-1]["messages"][-1]["content"]
+    assert FILES[0][1] not in fake.requests[-1]["messages"][-1]["content"]
+    assert results[0]["final_score"] == 9
@@ -0,0 +1,142 @@
+"""Tests for grader.hedging."""
+import asyncio
+import threading
+
+from grader.hedging import Hedger
+
+
+def _hedger(delay=0.01):
+    """A hedger that hedges every call still running after `delay` seconds."""
+    hedger = Hedger(max_ratio=1.0, min_samples=1)
+    hedger.record(delay)
+    return hedger
+
+
+def test_primary_wins_after_hedging():
+    hedger = _hedger()
+    hedge_started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(len(calls))
+        if calls[-1] == 0:
+            hedge_started.wait(5)
+            return "primary"
+        hedge_started.set()
+        release.wait(5)
+        return "hedge"
+
+    try:
+        assert hedger.run(fn) == "primary"
+    finally:
+        release.set()
+    assert (hedger.calls, hedger.hedged, hedger.hedge_wins) == (1, 1, 0)
+
+
+def test_hedge_wins_over_a_stuck_primary():
+    hedger = _hedger()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(len(calls))
+        if calls[-1] == 0:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    try:
+        assert hedger.run(fn) == "hedge"
+    finally:
+        release.set()
+    assert (hedger.calls, hedger.hedged, hedger.hedge_wins) == (1, 1, 1)
+
+
+def test_fast_call_is_not_hedged():
+    hedger = _hedger(delay=5.0)
+    assert hedger.run(lambda: "primary") == "primary"
+    assert (hedger.calls, hedger.hedged) == (1, 0)
+
+
+def test_async_primary_wins_and_hedge_is_cancelled():
+    hedger = _hedger()
+    cancelled = []
+
+    async def main():
+        hedge_started = asyncio.Event()
+        calls = []
+
+        async def fn():
+            calls.append(len(calls))
+            if calls[-1] == 0:
+                await hedge_started.wait()
+                return "primary"
+            hedge_started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append("hedge")
+                raise
+            return "hedge"
+
+        result = await hedger.run_async(fn)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "primary"
+    assert cancelled == ["hedge"]
+    assert (hedger.calls, hedger.hedged, hedger.hedge_wins) == (1, 1, 0)
+
+
+def test_async_hedge_wins_and_primary_is_cancelled():
+    hedger = _hedger()
+    cancelled = []
+
+    async def main():
+        calls = []
+
+        async def fn():
+            calls.append(len(calls))
+            if calls[-1] == 0:
+                try:
+                    await asyncio.sleep(5)
+                except asyncio.CancelledError:
+                    cancelled.append("primary")
+                    raise
+                return "primary"
+            return "hedge"
+
+        result = await hedger.run_async(fn)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "hedge"
+    assert cancelled == ["primary"]
+    assert (hedger.calls, hedger.hedged, hedger.hedge_wins) == (1, 1, 1)
+
+
+def test_cancelling_the_caller_during_the_hedge_delay_cancels_the_request():
+    hedger = _hedger(delay=5.0)
+    cancelled = []
+
+    async def main():
+        started = asyncio.Event()
+
+        async def fn():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append("primary")
+                raise
+
+        caller = asyncio.ensure_future(hedger.run_async(fn))
+        await started.wait()
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels any tasks left behind
+        return list(cancelled)
+
+    assert asyncio.run(main()) == ["primary"]
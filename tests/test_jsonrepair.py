@@ -0,0 +1,82 @@
+"""Tests for grader.jsonrepair."""
+import pytest
+
+from grader.jsonrepair import load_object
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "final_score": 8', {"a": 1}),
+    ('{"a": 1, "final_score": 8.5', {"a": 1}),
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1]}),
+    ('{"a": 1, "b": tru', {"a": 1}),
+    ('{"a": 1, "b": nul', {"a": 1}),
+])
+def test_bare_value_at_the_end_is_dropped(text, expected):
+    parsed = load_object(text)
+    assert parsed.value == expected
+    assert any(r.startswith("dropped incomplete value") for r in parsed.repairs)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1, "b": true', {"a": 1, "b": True}),
+    ('{"a": 1, "b": false ', {"a": 1, "b": False}),
+    ('{"a": 1, "b": null', {"a": 1, "b": None}),
+])
+def test_complete_literal_at_the_end_is_kept(text, expected):
+    parsed = load_object(text)
+    assert parsed.value == expected
+    assert parsed.repairs == ["closed 1 unclosed brackets"]
+    assert parsed.recovered_fields == ["b"]
+
+
+def test_well_formed_object_is_decoded_as_is():
+    text = 'Here is the result:\n```json\n{"a": 1, "b": {"c": [1, 2]}}\n```\nThanks!'
+    parsed = load_object(text)
+    assert parsed.value == {"a": 1, "b": {"c": [1, 2]}}
+    assert parsed.text == '{"a": 1, "b": {"c": [1, 2]}}'
+    assert parsed.repairs == [] and parsed.recovered_fields == []
+
+
+def test_braces_in_prose_are_skipped():
+    text = 'Using the {rubric} and a set {1, 2}: {"a": "x { y"}'
+    assert load_object(text).value == {"a": "x { y"}
+
+
+def test_trailing_commas_are_removed_at_any_depth():
+    parsed = load_object('{"a": [1, 2, ], "b": {"c": 3,}, }')
+    assert parsed.value == {"a": [1, 2], "b": {"c": 3}}
+    assert parsed.repairs == ["removed 3 trailing commas"]
+
+
+def test_raw_newlines_in_strings_are_accepted():
+    assert load_object('{"a": "line one\nline two"}').value == {"a": "line one\nline two"}
+
+
+def test_cut_off_string_is_closed_and_reported():
+    parsed = load_object('{"final_score": 90, "overall_assessment": "Good work on the loo')
+    assert parsed.value == {"final_score": 90, "overall_assessment": "Good work on the loo"}
+    assert parsed.recovered_fields == ["overall_assessment"]
+    assert parsed.repairs[0].startswith("closed string left open")
+
+
+def test_cut_off_key_is_dropped():
+    parsed = load_object('{"final_score": 90, "overall_ass')
+    assert parsed.value == {"final_score": 90}
+    assert parsed.recovered_fields == []
+
+
+def test_nested_cut_is_reported_on_the_top_level_field():
+    parsed = load_object('{"a": 1, "items": [{"x": "one"}, {"x": "tw')
+    assert parsed.value == {"a": 1, "items": [{"x": "one"}, {"x": "tw"}]}
+    assert parsed.recovered_fields == ["items"]
+
+
+@pytest.mark.parametrize("text", [
+    "I could not grade this submission.",
+    "{not json}",
+    '{"a": [1, 2}',
+    '{"a": 1 "b": 2}',
+])
+def test_unrepairable_text_raises(text):
+    with pytest.raises(ValueError):
+        load_object(text)
@@ -0,0 +1,99 @@
+"""Tests for grader.packing."""
+import pytest
+
+from grader import packing
+from grader.packing import file_priority, is_vendored, plan_submission, truncate_to_tokens
+
+MAIN = "public class Main {\n    public static void main(String[] args) {}\n}\n"
+
+
+@pytest.fixture(autouse=True)
+def char_tokens(monkeypatch):
+    # One token per character keeps chunk sizes exact
+    monkeypatch.setattr(packing, "count_tokens", lambda text, model: len(text))
+
+
+def _size(name, content):
+    return len(f"File name: {name}\n{content}")
+
+
+def _plan(files, budget, overhead=0, max_chunks=8):
+    return plan_submission(files, budget, overhead, overhead, "gpt-4o", max_chunks)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Main.java", False),
+    ("src/Main.java", False),
+    ("lib/Gson.java", True),
+    ("project\\target\\Generated.java", True),
+    ("__MACOSX/Main.java", True),
+])
+def test_is_vendored(name, expected):
+    assert is_vendored(name) is expected
+
+
+def test_file_priority_puts_the_students_main_code_first():
+    files = [
+        ("lib/Util.java", MAIN),
+        ("notes.txt", "notes"),
+        ("src/deep/Helper.java", "class Helper {}"),
+        ("Helper.java", "class Helper {}"),
+        ("src/Main.java", MAIN),
+    ]
+    ordered = [name for name, content in sorted(files, key=lambda f: file_priority(*f))]
+    assert ordered == ["src/Main.java", "Helper.java", "src/deep/Helper.java", "notes.txt", "lib/Util.java"]
+
+
+def test_submission_that_fits_is_sent_whole_in_order():
+    files = [("B.java", "class B {}"), ("Main.java", MAIN)]
+    plan = _plan(files, budget=1_000, overhead=100)
+    assert plan.chunks == [files]
+    assert not plan.map_reduce
+    assert plan.total_tokens == sum(_size(*f) for f in files)
+
+
+def test_vendored_files_are_dropped_before_splitting():
+    files = [("Main.java", MAIN), ("lib/Big.java", "x" * 500)]
+    plan = _plan(files, budget=200)
+    assert plan.chunks == [[("Main.java", MAIN)]]
+    assert not plan.map_reduce
+    assert plan.omitted == [f"lib/Big.java: skipped as vendored or generated code ({_size(*files[1])} tokens)"]
+
+
+def test_only_vendored_files_are_kept():
+    files = [("lib/A.java", "class A {}")]
+    assert _plan(files, budget=1_000).chunks == [files]
+
+
+def test_oversized_submission_is_packed_first_fit_by_priority():
+    files = [("A.java", "a" * 60), ("B.java", "b" * 60), ("Main.java", MAIN), ("C.java", "c" * 10)]
+    plan = _plan(files, budget=160)
+    assert plan.map_reduce
+    assert [[name for name, _ in chunk] for chunk in plan.chunks] == [["Main.java", "C.java"], ["A.java", "B.java"]]
+    assert plan.omitted == []
+    for chunk in plan.chunks:
+        assert sum(_size(*f) for f in chunk) <= 160
+
+
+def test_file_larger_than_a_chunk_is_truncated():
+    content = "".join(f"int line{i};\n" for i in range(50))
+    plan = _plan([("Main.java", MAIN), ("Big.java", content)], budget=200)
+    assert plan.map_reduce
+    big = dict(f for chunk in plan.chunks for f in chunk)["Big.java"]
+    assert big.startswith("int line0;\n")
+    assert big.endswith("more lines to fit the request size\n")
+    assert len(big) < len(content)
+    assert plan.omitted == [f"Big.java: truncated from {_size('Big.java', content)} tokens"]
+
+
+def test_files_beyond_the_chunk_limit_are_left_out():
+    files = [(f"F{i}.java", "x" * 80) for i in range(3)]
+    plan = _plan(files, budget=100, max_chunks=2)
+    assert [[name for name, _ in chunk] for chunk in plan.chunks] == [["F0.java"], ["F1.java"]]
+    assert plan.omitted == ["F2.java: left out, the submission exceeds 2 requests"]
+
+
+def test_truncate_keeps_whole_lines():
+    content = "line one\nline two\nline three\n"
+    kept = truncate_to_tokens(content, tokens=len(content), budget=12)
+    assert kept == "line one\n// ... truncated 2 more lines to fit the request size\n"
@@ -0,0 +1,26 @@
+"""Tests for grader.prompt."""
+import pytest
+
+from grader import prompt
+from grader.prompt import GRADING_INSTRUCTIONS, RUBRIC_GRADING_INSTRUCTIONS
+
+REPLACED = [
+    (prompt._REQUIREMENTS_STEP, prompt._RUBRIC_REQUIREMENTS_STEP),
+    (prompt._EXPLANATION_STEP, prompt._RUBRIC_EXPLANATION_STEP),
+    (prompt._REQUIREMENT_ENTRY, prompt._RUBRIC_REQUIREMENT_ENTRY),
+    (prompt._DEDUCTIONS_STEP, prompt._RUBRIC_DEDUCTIONS_STEP),
+    (prompt._DEDUCTION_ENTRY, prompt._RUBRIC_DEDUCTION_ENTRY),
+]
+
+
+@pytest.mark.parametrize("original, replacement", REPLACED)
+def test_rubric_instructions_replace_each_step(original, replacement):
+    # A step that no longer matches GRADING_INSTRUCTIONS would be left in silently
+    assert original in GRADING_INSTRUCTIONS
+    assert original not in RUBRIC_GRADING_INSTRUCTIONS
+    assert replacement in RUBRIC_GRADING_INSTRUCTIONS
+
+
+def test_rubric_instructions_do_not_ask_to_explain_met_requirements():
+    assert "Provide a brief explanation for each requirement's assessment" not in RUBRIC_GRADING_INSTRUCTIONS
+    assert "Leave the explanation empty for a requirement that is met" in RUBRIC_GRADING_INSTRUCTIONS
@@ -0,0 +1,78 @@
+"""Tests for grader.ratelimit."""
+from types import SimpleNamespace
+
+import pytest
+
+from grader import ratelimit
+from grader.ratelimit import RateLimiter, TokenBucket, configure_rate_limit
+
+
+@pytest.fixture
+def limiter(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return RateLimiter("test-model", rpm=60, tpm=6_000)
+
+
+def _usage(total):
+    return SimpleNamespace(total_tokens=total)
+
+
+def test_bucket_refills_evenly_over_a_minute():
+    bucket = TokenBucket(120)
+    bucket.tokens = 0
+    bucket.refill(bucket._updated + 15)
+    assert bucket.tokens == pytest.approx(30)
+    assert bucket.wait_time(40) == pytest.approx(5)
+    bucket.refill(bucket._updated + 600)
+    assert bucket.tokens == 120
+
+
+def test_requests_wait_once_the_rpm_budget_is_spent(limiter, clock):
+    for _ in range(60):
+        limiter.reserve(10)
+    assert clock.sleeps == []
+    limiter.reserve(10)
+    # One request refills every second at 60 RPM
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_tokens_wait_once_the_tpm_budget_is_spent(limiter, clock):
+    limiter.reserve(4_000)
+    limiter.reserve(4_000)
+    # 2,000 tokens short at 100 tokens per second
+    assert sum(clock.sleeps) == pytest.approx(20.0)
+
+
+def test_request_larger_than_the_bucket_waits_for_a_full_bucket(limiter, clock):
+    limiter.reserve(10_000)
+    assert clock.sleeps == []
+    limiter.reserve(10_000)
+    assert sum(clock.sleeps) == pytest.approx(60.0)
+
+
+def test_settling_refunds_an_overestimate(limiter, clock):
+    limiter.reserve(5_000).settle(_usage(1_000))
+    limiter.reserve(5_000)
+    assert clock.sleeps == []
+
+
+def test_settling_charges_an_underestimate(limiter, clock):
+    limiter.reserve(1_000).settle(_usage(5_000))
+    limiter.reserve(2_000)
+    # 1,000 tokens short at 100 tokens per second
+    assert sum(clock.sleeps) == pytest.approx(10.0)
+
+
+def test_failed_or_repeated_settlement_leaves_the_estimate(limiter):
+    reservation = limiter.reserve(1_000)
+    reservation.settle(None)
+    reservation.settle(_usage(0))
+    assert limiter.tokens.tokens == pytest.approx(5_000)
+
+
+def test_limits_scale_with_the_number_of_api_keys(monkeypatch):
+    monkeypatch.setattr(ratelimit, "endpoint_count", lambda: 3)
+    monkeypatch.setattr(ratelimit, "_limiters", {})
+    limiter = configure_rate_limit("test-model", rpm=100, tpm=1_000)
+    assert (limiter.requests.capacity, limiter.tokens.capacity) == (300, 3_000)
+    assert ratelimit.get_rate_limiter("test-model") is limiter
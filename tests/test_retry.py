@@ -0,0 +1,130 @@
+"""Tests for grader.retry."""
+import asyncio
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import openai
+import pytest
+
+from grader import retry
+from grader.retry import (GradingFailed, RetryBudget, RetryPolicy, call_with_retry, call_with_retry_async,
+                          is_retryable, retry_after)
+
+# The HTTP library the installed SDK is built on, as in grader.client
+try:
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+
+def _status_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return cls("error", response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # Full jitter always picks the top of its range
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+
+
+@pytest.fixture
+def clock(clock, monkeypatch):
+    monkeypatch.setattr(retry, "time", clock)
+    return clock
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    policy = RetryPolicy(base_delay=2.0, max_delay=10.0)
+    assert [policy.delay(attempt, ValueError()) for attempt in range(1, 6)] == [2.0, 4.0, 8.0, 10.0, 10.0]
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({"retry-after": "7"}, 7.0),
+    ({"retry-after-ms": "1500", "retry-after": "7"}, 1.5),
+    ({"retry-after": "120"}, 60.0),
+    ({}, 2.0),
+])
+def test_delay_honours_retry_after(headers, expected):
+    error = _status_error(openai.RateLimitError, 429, headers)
+    assert RetryPolicy(base_delay=2.0, max_delay=60.0).delay(1, error) == expected
+
+
+def test_retry_after_accepts_an_http_date(clock):
+    when = datetime.fromtimestamp(clock.now + 30, tz=timezone.utc)
+    error = _status_error(openai.RateLimitError, 429, {"retry-after": format_datetime(when, usegmt=True)})
+    assert retry_after(error) == pytest.approx(30.0)
+    assert retry_after(ValueError()) is None
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_status_error(openai.RateLimitError, 429), True),
+    (_status_error(openai.InternalServerError, 503), True),
+    (openai.APITimeoutError(request=REQUEST), True),
+    (openai.APIConnectionError(request=REQUEST), True),
+    (_status_error(openai.ConflictError, 409), True),
+    (_status_error(openai.AuthenticationError, 401), False),
+    (_status_error(openai.PermissionDeniedError, 403), False),
+    (_status_error(openai.BadRequestError, 400), False),
+    (ValueError("No valid JSON found in the response"), True),
+    (RuntimeError("bug"), False),
+])
+def test_transient_errors_are_retried(error, expected):
+    assert is_retryable(error) is expected
+
+
+def _flaky(failures, error=ValueError("bad JSON")):
+    """An attempt function that fails `failures` times, then returns the attempt number."""
+    calls = []
+
+    def attempt():
+        calls.append(None)
+        if len(calls) <= failures:
+            raise error
+        return len(calls)
+    return attempt
+
+
+def test_transient_failures_are_retried_with_backoff(clock):
+    assert call_with_retry(_flaky(2), RetryPolicy(base_delay=1.0)) == 3
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_permanent_failure_is_not_retried(clock):
+    with pytest.raises(GradingFailed) as failed:
+        call_with_retry(_flaky(5, _status_error(openai.AuthenticationError, 401)), RetryPolicy())
+    assert failed.value.attempts == 1
+    assert clock.sleeps == []
+
+
+def test_gives_up_after_max_attempts(clock):
+    with pytest.raises(GradingFailed) as failed:
+        call_with_retry(_flaky(10), RetryPolicy(max_attempts=3, base_delay=1.0))
+    assert failed.value.attempts == 3
+    assert "bad JSON" in str(failed.value)
+    assert clock.sleeps == [1.0, 2.0]
+
+
+def test_budget_caps_retries_across_calls(clock):
+    policy = RetryPolicy(base_delay=1.0, budget=RetryBudget(2))
+    assert call_with_retry(_flaky(2), policy) == 3
+    with pytest.raises(GradingFailed) as failed:
+        call_with_retry(_flaky(1), policy)
+    assert failed.value.attempts == 1
+    assert policy.budget.remaining == 0
+
+
+def test_async_retries_until_success():
+    calls = []
+
+    async def attempt():
+        calls.append(None)
+        if len(calls) < 3:
+            raise ValueError("bad JSON")
+        return "graded"
+
+    policy = RetryPolicy(base_delay=0.001)
+    assert asyncio.run(call_with_retry_async(attempt, policy)) == "graded"
+    assert len(calls) == 3
@@ -0,0 +1,55 @@
+"""Tests for grader.routing."""
+import pytest
+
+from grader.routing import COMPLEX, SIMPLE, Router, RoutingConfig, looks_parseable
+
+SMALL = """public class Main {
+    public static void main(String[] args) {
+        System.out.println("Hello, world");
+    }
+}
+"""
+LARGE = "public class Main {\n" + "".join(f"    int field{i} = {i};\n" for i in range(60)) + "}\n"
+
+
+@pytest.mark.parametrize("code, expected", [
+    (SMALL, True),
+    ('class A { String s = "}"; char c = \'{\'; /* } */ // )\n }', True),
+    ("class A { void f() { }", False),
+    ("class A { void f() ) }", False),
+    ("System.out.println(1);", False),
+])
+def test_looks_parseable(code, expected):
+    assert looks_parseable(code) is expected
+
+
+@pytest.fixture
+def router():
+    return Router(RoutingConfig(simple_model="fast", complex_model="reasoning", starter_code=LARGE))
+
+
+@pytest.mark.parametrize("files, tier, reason", [
+    ([("Main.java", SMALL)], SIMPLE, "small"),
+    ([("Main.java", "   \n")], SIMPLE, "empty"),
+    ([("Main.java", SMALL.replace("}\n}", "}"))], COMPLEX, "does not parse"),
+    ([("Main.java", SMALL), ("Helper.java", "class Helper {}")], COMPLEX, "large"),
+    ([("Main.java", LARGE.replace("field3 = 3", "field3 = 4"))], SIMPLE, "close to starter code"),
+    ([("Main.java", LARGE.replace("int field", "long value"))], COMPLEX, "large"),
+])
+def test_route_picks_a_tier(router, files, tier, reason):
+    decision = router.route(files)
+    assert (decision.tier, decision.reason) == (tier, reason)
+    assert decision.model == ("fast" if tier == SIMPLE else "reasoning")
+
+
+def test_summary_counts_decisions_and_latency(router):
+    for latency in (1.0, 2.0, 3.0):
+        router.record(router.route([("Main.java", SMALL)]), latency)
+    router.record(router.route([("Main.java", "class A {")]), 10.0)
+    assert router.summary().splitlines() == [
+        "Routing:",
+        "  simple: 3 submissions, median 2.0s, max 3.0s",
+        "  complex: 1 submissions, median 10.0s, max 10.0s",
+        "  complex: does not parse: 1",
+        "  simple: small: 3",
+    ]
@@ -0,0 +1,69 @@
+"""Tests for grader.rubric."""
+import re
+
+import pytest
+
+from grader.rubric import Rubric
+from grader.schema import OTHER_DEDUCTION, ResultValidationError
+
+GUIDELINES = "Read two numbers and print their sum. Comment your code."
+
+
+@pytest.fixture
+def rubric():
+    return Rubric.from_items(
+        [
+            {"description": "Reads two integers from standard input", "points": 40},
+            {"description": "Prints their sum", "points": 40},
+            {"description": "Code is commented", "points": 20},
+        ],
+        GUIDELINES,
+        100,
+        deductions=[
+            {"reason": "Missing comments", "points": 5},
+            {"reason": "Does not compile", "points": 50},
+        ],
+    )
+
+
+def _result(requirements, deductions):
+    return {
+        "final_score": 90,
+        "requirements_assessment": requirements,
+        "point_deductions": deductions,
+    }
+
+
+def test_expand_maps_every_id_to_its_text(rubric):
+    expanded = rubric.expand(_result(
+        [
+            {"id": "R1", "met": True},
+            {"id": "R2", "met": True},
+            {"id": "R3", "met": False, "explanation": "No comments at all"},
+        ],
+        [
+            {"id": "D1", "points": 5},
+            {"id": "D2", "points": 50},
+            {"id": OTHER_DEDUCTION, "reason": "Prints extra output", "points": 2},
+        ],
+    ))
+
+    assert [r["requirement"] for r in expanded["requirements_assessment"]] == [
+        "Reads two integers from standard input", "Prints their sum", "Code is commented"
+    ]
+    assert expanded["requirements_assessment"][2]["explanation"] == "No comments at all"
+    assert [d["reason"] for d in expanded["point_deductions"]] == [
+        "Missing comments", "Does not compile", "Prints extra output"
+    ]
+    assert expanded["final_score"] == 90
+
+
+@pytest.mark.parametrize("requirements, deductions, message", [
+    ([{"id": "R4", "met": True}], [], "requirements_assessment[0]"),
+    ([{"id": "R1", "met": True}, {"met": False}], [], "requirements_assessment[1]"),
+    ([{"id": "R1", "met": True}], [{"id": "D3", "points": 1}], "point_deductions[0]"),
+    ([{"id": "R1", "met": True}], [{"id": "D1", "points": 5}, {"id": "R1", "points": 1}], "point_deductions[1]"),
+])
+def test_expand_rejects_unknown_ids(rubric, requirements, deductions, message):
+    with pytest.raises(ResultValidationError, match=re.escape(message)):
+        rubric.expand(_result(requirements, deductions))
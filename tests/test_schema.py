@@ -0,0 +1,108 @@
+"""Tests for grader.schema."""
+import re
+
+import pytest
+
+from grader.schema import (ANALYSIS_SCHEMA, FEEDBACK_SCHEMA, GRADING_SCHEMA, OTHER_DEDUCTION, RUBRIC_SCHEMA,
+                           GradeResult, ResultValidationError, grading_schema, group_schema, response_format,
+                           scores_schema)
+
+RESULT = {
+    "final_score": 85,
+    "code_quality": "Readable",
+    "requirements_assessment": [{"requirement": "Prints a greeting", "met": True, "explanation": ""}],
+    "point_deductions": [{"reason": "No comments", "points": 5}],
+    "extra_credit": {"awarded": False, "points": 0, "reason": ""},
+    "overall_assessment": "Good",
+    "improvement_suggestions": ["Add comments"],
+}
+
+
+def _strict_objects(schema, path="schema"):
+    """Yield every object schema with the path to it."""
+    if schema.get("type") == "object":
+        yield path, schema
+        for key, value in schema["properties"].items():
+            yield from _strict_objects(value, f"{path}.{key}")
+    elif schema.get("type") == "array":
+        yield from _strict_objects(schema["items"], f"{path}[]")
+
+
+@pytest.mark.parametrize("schema", [
+    GRADING_SCHEMA,
+    grading_schema(["R1", "R2"], ["D1"]),
+    scores_schema(["R1"], ["D1"]),
+    group_schema(["R1"], ["D1"]),
+    FEEDBACK_SCHEMA,
+    RUBRIC_SCHEMA,
+    ANALYSIS_SCHEMA,
+])
+def test_schemas_meet_strict_mode_rules(schema):
+    for path, obj in _strict_objects(schema):
+        assert obj["required"] == list(obj["properties"]), path
+        assert obj["additionalProperties"] is False, path
+
+
+def test_rubric_ids_are_enums():
+    properties = grading_schema(["R1", "R2"], ["D1"])["properties"]
+    assessment = properties["requirements_assessment"]["items"]["properties"]
+    deduction = properties["point_deductions"]["items"]["properties"]
+    assert "requirement" not in assessment
+    assert assessment["id"]["enum"] == ["R1", "R2"]
+    assert deduction["id"]["enum"] == ["D1", OTHER_DEDUCTION]
+    assert grading_schema() is GRADING_SCHEMA
+
+
+@pytest.mark.parametrize("model, supported", [
+    ("gpt-4o-mini", True),
+    ("gpt-4o-2024-08-06", True),
+    ("gpt-4o-2024-05-13", False),
+    ("o1-preview", False),
+    ("o3-mini", True),
+])
+def test_response_format_only_for_models_that_support_it(model, supported):
+    fmt = response_format(model, "grading_result", GRADING_SCHEMA)
+    if supported:
+        assert fmt["json_schema"] == {"name": "grading_result", "strict": True, "schema": GRADING_SCHEMA}
+    else:
+        assert fmt is None
+
+
+def test_valid_result_round_trips():
+    result = GradeResult.from_dict(RESULT)
+    assert result.final_score == 85
+    assert result.point_deductions[0].reason == "No comments"
+    data = result.to_dict()
+    assert {key: data[key] for key in RESULT} == {
+        **RESULT,
+        "requirements_assessment": [{**RESULT["requirements_assessment"][0], "id": ""}],
+        "point_deductions": [{**RESULT["point_deductions"][0], "id": ""}],
+    }
+    # Diagnostic sections a free-text answer left out default to empty
+    assert data["syntax_check"] == [] and data["compilation_test"] == {"compiles": True, "errors": []}
+
+
+@pytest.mark.parametrize("score, expected", [("85", 85), (" 8.5 ", 8.5), (90.0, 90)])
+def test_numeric_strings_are_accepted(score, expected):
+    assert GradeResult.from_dict({**RESULT, "final_score": score}).final_score == expected
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"final_score": None}, "final_score should be a number"),
+    ({"final_score": True}, "final_score should be a number"),
+    ({"final_score": "high"}, "final_score should be a number"),
+    ({"point_deductions": [{"reason": "x", "points": 1}, {"reason": "y"}]}, "missing point_deductions[1].points"),
+    ({"requirements_assessment": [{"requirement": "x", "met": "yes"}]}, "requirements_assessment[0].met"),
+    ({"extra_credit": "none"}, "extra_credit should be an object"),
+    ({"improvement_suggestions": "Add comments"}, "improvement_suggestions should be a list"),
+    ({"code_quality": 3}, "code_quality should be a string"),
+])
+def test_invalid_fields_are_rejected(change, message):
+    with pytest.raises(ResultValidationError, match=re.escape(message)):
+        GradeResult.from_dict({**RESULT, **change})
+
+
+def test_missing_keys_are_all_named():
+    data = {key: value for key, value in RESULT.items() if key not in ("final_score", "code_quality")}
+    with pytest.raises(ResultValidationError, match="missing keys: final_score, code_quality"):
+        GradeResult.from_dict(data)
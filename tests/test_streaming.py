@@ -0,0 +1,129 @@
+"""Tests for grader.streaming."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from grader.jsonrepair import load_object
+from grader.streaming import IncrementalJSONParser, MalformedStreamError, stream_completion, stream_completion_async
+
+VALID = '{"final_score": 90, "max_points": 100, "overall_assessment": "Good work"}'
+
+
+def _chunks(text, size=7):
+    return [
+        SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[i:i + size]))])
+        for i in range(0, len(text), size)
+    ] + [SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20))]
+
+
+class _Stream:
+    def __init__(self, text):
+        self.chunks = _chunks(text)
+        self.read = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def _client(text, asynchronous=False):
+    stream = _Stream(text)
+
+    def create(**kwargs):
+        return stream
+
+    async def create_async(**kwargs):
+        return stream
+
+    return SimpleNamespace(stream=stream, chat=SimpleNamespace(completions=SimpleNamespace(
+        create=create_async if asynchronous else create
+    )))
+
+
+def _stream(text, on_field=None, client=None):
+    return stream_completion(
+        client or _client(text), model="gpt-4o-mini", messages=[{"role": "user", "content": "grade"}],
+        on_field=on_field, prompt_tokens=10
+    )
+
+
+def test_valid_stream_reports_every_field():
+    fields = {}
+    content, usage = _stream(VALID, lambda key, value: fields.__setitem__(key, value))
+    assert content == VALID
+    assert usage.completion_tokens == 20
+    assert fields == {"final_score": 90, "max_points": 100, "overall_assessment": "Good work"}
+
+
+@pytest.mark.parametrize("text", [
+    '{"final_score": 90, "max_points": 100, "overall_assessment": "Good work",}',
+    'Here is the grade {as requested}:\n' + VALID,
+    '{"final_score": 90, "max_points": [100, ], "overall_assessment": "Good work"}',
+    '{"final_score": 90, "max_points": 100, "overall_assessment": "Good\nwork"}',
+])
+def test_repairable_stream_reports_every_field(text):
+    fields = {}
+    content, _ = _stream(text, lambda key, value: fields.__setitem__(key, value))
+    assert content == text
+    assert list(fields) == ["final_score", "max_points", "overall_assessment"]
+    assert fields["final_score"] == 90
+
+
+def test_cut_off_stream_returns_text_for_repair():
+    text = '{"final_score": 90, "max_points": 100, "overall_assessment": "Good wo'
+    fields = {}
+    content, _ = _stream(text, lambda key, value: fields.__setitem__(key, value))
+    assert content == text
+    assert fields == {"final_score": 90, "max_points": 100}
+    assert load_object(content).value["overall_assessment"] == "Good wo"
+
+
+@pytest.mark.parametrize("text", [
+    '{"final_score" 90, "max_points": 100, "overall_assessment": "' + "x" * 200 + '"}',
+    '{"final_score": [90}, "max_points": 100, "overall_assessment": "' + "x" * 200 + '"}',
+    '{"final_score": ninety, "max_points": 100, "overall_assessment": "' + "x" * 200 + '"}',
+])
+def test_unrepairable_stream_aborts_early(text):
+    client = _client(text)
+    with pytest.raises(MalformedStreamError):
+        _stream(text, client=client)
+    # The rest of the response is never read
+    assert client.stream.read < len(client.stream.chunks) / 2
+    with pytest.raises(ValueError):
+        load_object(text)
+
+
+def test_parser_is_done_only_once_the_object_closes():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": {"b": [1, 2,],}, ')
+    assert not parser.done
+    assert parser.fields == {"a": {"b": [1, 2]}}
+    parser.feed('"c": true}')
+    assert parser.done
+
+
+def test_async_stream_returns_text_for_repair():
+    text = '{"final_score": 90, "max_points": 100,}'
+    content, _ = asyncio.run(stream_completion_async(
+        _client(text, asynchronous=True), model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "grade"}], prompt_tokens=10
+    ))
+    assert load_object(content).value == {"final_score": 90, "max_points": 100}
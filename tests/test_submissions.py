@@ -0,0 +1,34 @@
+"""Tests for submission discovery in cli."""
+import zipfile
+
+from cli import SubmissionProcessor
+
+JAVA = "public class Main { public static void main(String[] args) {} }"
+
+
+def _zip(path, files):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+
+
+def test_find_submissions(tmp_path):
+    (tmp_path / "Carol_Clark.java").write_text(JAVA)
+    _zip(tmp_path / "Alice_Adams.zip", {"src/Main.java": JAVA, "README.md": "notes"})
+    _zip(tmp_path / "Bob_Brown.zip", {"Main.java": JAVA})
+    # Hidden files, subdirectories and other file types are not submissions
+    (tmp_path / "._Alice_Adams.zip").write_bytes(b"\x00\x05\x16\x07macOS metadata")
+    (tmp_path / ".Scratch.java").write_text(JAVA)
+    (tmp_path / "Dave_Davis.zip").mkdir()
+    (tmp_path / "extras").mkdir()
+    (tmp_path / "extras" / "Erin_Evans.java").write_text(JAVA)
+    (tmp_path / "notes.txt").write_text("not a submission")
+    # An unreadable archive is skipped without affecting the others
+    (tmp_path / "Corrupt_Student.zip").write_bytes(b"not a zip")
+
+    submissions = SubmissionProcessor(workers=4).find_submissions(tmp_path)
+
+    assert [s.student_name for s in submissions] == ["Alice Adams", "Bob Brown", "Carol Clark"]
+    assert [f.filename for f in submissions[0].files] == ["src/Main.java"]
+    assert all(f.content == JAVA for s in submissions for f in s.files)
+    assert submissions[2].original_path == tmp_path / "Carol_Clark.java"